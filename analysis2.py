@@ -15,10 +15,10 @@ from pathlib import Path
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-import argparse, importlib, pprint, sys
+import argparse, importlib, os, pprint, sys
 
 # Load internal libraries
-import database, defs, orders, preload
+import database, defs, loader, orders, preload
 
 # Parse command line arguments
 parser = argparse.ArgumentParser(description="Run the Sunflow Cryptobot Tester with a specified config.")
@@ -35,7 +35,7 @@ if not config_path.exists():
 # Dynamically load the config module
 sys.path.append(str(config_path.parent))
 config_module_name = config_path.stem
-config = importlib.import_module(config_module_name)
+config = loader.defaults(importlib.import_module(config_module_name))
 
 # Debug
 debug = False
@@ -88,20 +88,23 @@ symbol                 = config.symbol
 multiplier             = config.multiplier
 dbase_file             = config.dbase_file
 revenue_file           = config.revenue_file
+record_folder          = os.path.join(config.record_folder, symbol)
 compounding            = {}
 compounding['enabled'] = config.compounding_enabled
 compounding['start']   = config.compounding_start
 compounding['now']     = config.compounding_start
 
 
-# Load all buys
-ticker   = preload.get_ticker(symbol)
+# Load ticker and instrument info from recorded market data, or else from the exchange
+ticker   = preload.get_recorded_ticker(symbol, record_folder) or preload.get_ticker(symbol)
 spot     = ticker['lastPrice']
-info     = preload.get_info(symbol, spot, multiplier, compounding)
+info     = preload.get_recorded_info(record_folder, spot, multiplier, compounding) or preload.get_info(symbol, spot, multiplier, compounding)
+
+# Load all buys
 all_buys = database.load(dbase_file, info)
 
 # Load data into a dataframes
-df_all_buys = pd.DataFrame(all_buys)
+df_all_buys = pd.DataFrame(list(all_buys))
 df_revenue  = pd.read_csv(revenue_file)
 
 # Check if we can run
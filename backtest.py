@@ -0,0 +1,183 @@
+### Sunflow Cryptobot ###
+#
+# Backtest, replay recorded market data through the strategy against a simulated exchange
+
+# Load libraries
+from collections import deque
+from datetime import datetime, timezone
+import json, os, time
+import clock, defs, incremental, logs, marketdata, simulator
+
+# Files of a backtest run, they are removed before every run so a run always starts from scratch
+files = ("buy_orders.json", "buy_orders.json.journal", "exchange.log", "errors.log", "revenue.log", "results.json")
+
+# Time in ms before the first handled message, so indicators and the optimizer have history to start with
+def warmup(config):
+    minutes = 0
+    if config.indicators_enabled:
+        minutes = max(config.interval_1, config.interval_2, config.interval_3) * config.limit
+    milliseconds = minutes * 60 * 1000
+    if config.optimizer_enabled:
+        milliseconds = max(milliseconds, config.optimizer_limit_min)
+    return milliseconds
+
+# Load market data, start the virtual clock and replace the exchange session of the bot context with the simulated
+# exchange. The clock is shared by the process, so backtests in one process run one after the other.
+def setup(bot, path):
+
+    # Config of the bot
+    config = bot.config
+
+    # Load market data and instrument info
+    market = marketdata.Market(marketdata.load(path), config.symbol, config.backtest_push)
+    info   = marketdata.instrument(path) or dict(config.backtest_instrument)
+    info['symbol'] = config.symbol
+
+    # First message after warmup
+    first, last = market.span()
+    start       = first + warmup(config)
+    if start >= last:
+        raise ValueError(f"Market data of {(last - first) / 3600000:.1f} hours is not enough for a warmup of {warmup(config) / 3600000:.1f} hours")
+
+    # Start virtual clock
+    clock.set_time(start)
+
+    # Simulated exchange at the price of the start
+    exchange = simulator.Exchange(market, info, config.backtest_fee, config.backtest_balance)
+    exchange.tick(market.price(start))
+    bot.session = exchange
+
+    # Orders are executed and output is printed right away instead of on the worker threads
+    bot.worker.inline   = True
+    bot.notifier.inline = True
+
+    # Keep the files of the backtest apart and start with an empty database, logs of an earlier run are closed first
+    os.makedirs(config.backtest_folder, exist_ok=True)
+    logs.close(config.backtest_folder)
+    for file in files:
+        if os.path.exists(os.path.join(config.backtest_folder, file)):
+            os.remove(os.path.join(config.backtest_folder, file))
+    config.dbase_file    = os.path.join(config.backtest_folder, "buy_orders.json")
+    config.exchange_file = os.path.join(config.backtest_folder, "exchange.log")
+    config.error_file    = os.path.join(config.backtest_folder, "errors.log")
+    config.revenue_file  = os.path.join(config.backtest_folder, "revenue.log")
+
+    # Nothing is live, no private stream, recording, notifications, exchange log or fsync
+    config.private_stream   = False
+    config.record_enabled   = False
+    config.notify_1_enabled = False
+    config.notify_2_enabled = False
+    config.exchange_log     = False
+    config.dbase_fsync      = "never"
+
+    # Only the results are reported
+    bot.quiet = True
+
+    # Return backtest
+    return {'bot': bot, 'market': market, 'exchange': exchange, 'start': start, 'end': last, 'path': path, 'folder': config.backtest_folder, 'revenue': config.revenue_file}
+
+# Use indicator values a parameter sweep calculated before for the same klines instead of calculating them again
+def reuse_indicators(simulation, streams, limit):
+    for interval in streams:
+        file   = marketdata.indicator_file(simulation['path'], interval, limit, simulation['start'], simulation['market'].push)
+        series = marketdata.load_indicators(file)
+        if series:
+            streams[interval] = incremental.Series(*series)
+    return streams
+
+# Replay messages of the streams in handlers, handle_order gets the completed order commands
+def run(simulation, handlers, handle_order):
+
+    # Initialize variables
+    bot       = simulation['bot']
+    market    = simulation['market']
+    exchange  = simulation['exchange']
+    completed = deque()
+    count     = 0
+    stime     = time.perf_counter()
+    progress  = stime
+
+    # Completed orders are handled after the message that caused them, like the runtime does
+    bot.worker.post = completed.append
+
+    # Replay
+    for moment, name, message in market.messages(list(handlers), simulation['start']):
+
+        # The exchange sees prices and orderbook first
+        clock.set_time(moment)
+        if name == 'ticker':
+            exchange.tick(float(message['data']['lastPrice']))
+        if name == 'orderbook':
+            exchange.book.update(message)
+
+        # Strategy
+        handlers[name](message)
+        while completed:
+            handle_order(completed.popleft())
+
+        # Stop on fatal errors
+        if bot.halt_sunflow:
+            print(f"Backtest halted at {clock.now().strftime('%Y-%m-%d %H:%M:%S')}, see errors in {simulation['folder']}")
+            break
+
+        # Progress
+        count += 1
+        if time.perf_counter() - progress > 10:
+            progress = time.perf_counter()
+            done     = (moment - simulation['start']) / max(simulation['end'] - simulation['start'], 1) * 100
+            print(f"Backtest at {clock.now().strftime('%Y-%m-%d %H:%M:%S')} ({done:.0f} %), {count} messages in {progress - stime:.0f} s")
+
+    # Return results
+    return results(simulation, count, time.perf_counter() - stime)
+
+# Results of a backtest, revenue is taken from the revenue log like analysis does
+def results(simulation, count, seconds):
+
+    # Initialize variables
+    exchange = simulation['exchange']
+    revenue  = 0.0
+
+    # Revenue of all sells
+    logs.flush()
+    with open(simulation['revenue'], 'r', encoding='utf-8') as file:
+        for line in file.readlines()[1:]:
+            fields = line.strip().split(",")
+            if len(fields) == 17 and fields[3] == "Sell":
+                revenue += float(fields[16])
+
+    # Collect results
+    result = {
+        'data'     : simulation['path'],
+        'start'    : simulation['start'],
+        'end'      : simulation['end'],
+        'messages' : count,
+        'seconds'  : seconds,
+        'revenue'  : revenue,
+        'buys'     : exchange.stats['buys'],
+        'sells'    : exchange.stats['sells'],
+        'fees'     : exchange.stats['fees'],
+        'exposure' : exchange.stats['exposure'],
+        'drawdown' : exchange.stats['drawdown'],
+        'equity'   : exchange.equity(),
+        'balance'  : dict(exchange.coins)
+    }
+
+    # Store results next to the revenue log
+    with open(os.path.join(simulation['folder'], "results.json"), 'w', encoding='utf-8') as file:
+        json.dump(result, file, indent=2)
+
+    # Return results
+    return result
+
+# Report results to stdout
+def report(result, info):
+    start = datetime.fromtimestamp(result['start'] / 1000, timezone.utc).strftime('%Y-%m-%d %H:%M')
+    end   = datetime.fromtimestamp(result['end'] / 1000, timezone.utc).strftime('%Y-%m-%d %H:%M')
+    print(f"\n*** Backtest {start} to {end} UTC ***\n")
+    print(f"Messages  : {result['messages']} in {result['seconds']:.1f} s")
+    print(f"Trades    : {result['buys']} buys and {result['sells']} sells")
+    print(f"Revenue   : {defs.format_number(result['revenue'], info['quotePrecision'])} {info['quoteCoin']}")
+    print(f"Fees      : {defs.format_number(result['fees'], info['quotePrecision'])} {info['quoteCoin']}")
+    print(f"Exposure  : {defs.format_number(result['exposure'], info['quotePrecision'])} {info['quoteCoin']} at most in {info['baseCoin']}")
+    print(f"Drawdown  : {defs.format_number(result['drawdown'], info['quotePrecision'])} {info['quoteCoin']} at most")
+    print(f"Equity    : {defs.format_number(result['equity'], info['quotePrecision'])} {info['quoteCoin']}\n")
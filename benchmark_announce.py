@@ -0,0 +1,62 @@
+### Sunflow Cryptobot ###
+#
+# Benchmark the time announce() takes on the calling thread, to stdout only and with a slow messaging service
+#
+# Use with a config file:
+# python benchmark_announce.py -c {optional path/}your_config.py
+
+# Load libraries
+import argparse, contextlib, os, sys, time
+
+# Settings
+lines      = 20000      # Announcements to stdout only
+messages   = 20         # Announcements that also notify, like a burst of adjusted trigger prices
+delay      = 0.3        # Seconds a notification takes, a messaging service across the internet
+
+# Parse command line arguments before the modules load the config
+parser = argparse.ArgumentParser(description="Benchmark the time announce() takes on the calling thread.")
+parser.add_argument('-c', '--config', default='config.py', help='Specify the config file (with .py extension).')
+args     = parser.parse_args()
+sys.argv = [sys.argv[0], '-c', args.config]
+import context, defs
+
+# Messaging service that takes its time
+class Slow:
+    def __init__(self):
+        self.sent = 0
+    def notify(self, body, title, tag):
+        time.sleep(delay)
+        self.sent += 1
+        return True
+
+# Notify the primary group through the slow service
+bot   = context.current()
+slow  = Slow()
+bot.activate()
+bot.apobj = slow
+if hasattr(bot, 'notifier'):
+    bot.notifier.apobj = slow
+context.config.notify_1_enabled = True
+context.config.notify_1_level   = 0
+
+# Average time in ms of announce with message
+def measure(count, message, to_group_1):
+    start = time.perf_counter()
+    for index in range(count):
+        defs.announce(message.format(index), to_group_1, 1)
+    return ((time.perf_counter() - start) / count) * 1000
+
+# Announce to nowhere and wait until everything is out
+with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+    stdout_ms = measure(lines, "Price went up from 0.{0} to 0.{0}", False)
+    notify_ms = measure(messages, "Adjusted trigger price from 0.{0} to 0.{0}", True)
+    start     = time.perf_counter()
+    if hasattr(bot, 'notifier'):
+        bot.notifier.flush(60)
+    flush_ms  = (time.perf_counter() - start) * 1000
+
+# Report
+print(f"announce() on the calling thread, notifications take {delay * 1000:.0f} ms")
+print(f"  stdout only     : {stdout_ms * 1000:8.1f} us per call over {lines} calls")
+print(f"  with notify     : {notify_ms:8.3f} ms per call over {messages} calls, {slow.sent} notifications sent")
+print(f"  flush at the end: {flush_ms:8.1f} ms")
@@ -0,0 +1,72 @@
+### Sunflow Cryptobot ###
+#
+# Benchmark saving the buys database, rewriting the whole file versus appending to the journal
+
+# Load libraries
+import json, os, random, tempfile, time
+import database
+
+# Create fake buy orders
+def fake_buys(count):
+    all_buys = []
+    for index in range(count):
+        price = random.uniform(0.5, 1.5)
+        qty   = random.uniform(1, 100)
+        all_buys.append({
+            'createdTime' : 1700000000000 + index,
+            'updatedTime' : 1700000000000 + index,
+            'orderId'     : 1000000000 + index,
+            'orderLinkId' : 2000000000 + index,
+            'symbol'      : "XRPUSDC",
+            'side'        : "Buy",
+            'orderType'   : "Market",
+            'orderStatus' : "Filled",
+            'price'       : 0.0,
+            'avgPrice'    : price,
+            'qty'         : qty * price,
+            'cumExecQty'  : qty,
+            'cumExecValue': qty * price,
+            'cumExecFee'  : qty * 0.001,
+            'triggerPrice': price,
+            'status'      : "Closed"
+        })
+    return all_buys
+
+# Average time in ms of a function
+def measure(function, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        function()
+    return ((time.perf_counter() - start) / rounds) * 1000
+
+# Benchmark one database size
+def benchmark(count, rounds):
+
+    # Initialize variables
+    all_buys   = fake_buys(count)
+    buy_order  = fake_buys(1)[0]
+    folder     = tempfile.mkdtemp()
+    dbase_file = os.path.join(folder, "buy_orders.json")
+
+    # Old way, rewrite whole file on every change
+    def rewrite():
+        with open(dbase_file, 'w', encoding='utf-8') as json_file:
+            json.dump(all_buys, json_file)
+
+    # New way, append change to journal
+    def append():
+        database.append_journal(dbase_file, [{'op': "add", 'order': buy_order}])
+
+    # Compaction into snapshot
+    def snapshot():
+        database.write_snapshot(dbase_file, all_buys)
+
+    # Run and report
+    print(f"{count:>7} orders, fsync {database.config.dbase_fsync}:")
+    print(f"  rewrite whole file : {measure(rewrite, rounds):10.3f} ms")
+    print(f"  append to journal  : {measure(append, rounds):10.3f} ms")
+    print(f"  snapshot (compact) : {measure(snapshot, rounds):10.3f} ms")
+
+# Run benchmark
+for count, rounds in ((10000, 20), (100000, 5)):
+    benchmark(count, rounds)
@@ -0,0 +1,99 @@
+### Sunflow Cryptobot ###
+#
+# Benchmark the cost per kline message, klines as Python lists versus the kline ring buffer
+#
+# Use with a config file:
+# python benchmark_klines.py -c {optional path/}your_config.py
+
+# Load libraries
+import argparse, random, sys, time
+import pandas as pd
+
+# Settings
+intervals  = 2000       # Kline intervals to stream
+updates    = 30         # Unconfirmed klines per interval, the exchange sends one every second or two
+lookups    = 2000       # Klines to update by time
+
+# Parse command line arguments before the modules load the config
+parser = argparse.ArgumentParser(description="Benchmark the cost per kline message.")
+parser.add_argument('-c', '--config', default='config.py', help='Specify the config file (with .py extension).')
+args     = parser.parse_args()
+sys.argv = [sys.argv[0], '-c', args.config]
+import buffers, context, defs
+
+# Number of klines kept
+limit = context.config.limit
+
+# Old way, add a confirmed kline and drop the oldest one
+def list_new_kline(kline, klines):
+    for column in klines:
+        klines[column].append(kline[column])
+        klines[column].pop(0)
+    return klines
+
+# Old way, replace the last kline
+def list_update_kline(kline, klines):
+    for column in klines:
+        klines[column].pop()
+        klines[column].append(kline[column])
+    return klines
+
+# Old way, update the kline with the same start time
+def list_add_kline(kline, klines):
+    if kline['time'] in klines['time']:
+        index = klines['time'].index(kline['time'])
+        for column in klines:
+            klines[column][index] = kline[column]
+    return klines
+
+# Kline of interval with a random walk price
+def kline(index, price):
+    return {'time': index * 60000, 'open': price, 'high': price * 1.001, 'low': price * 0.999, 'close': price, 'volume': 1000.0, 'turnover': 1000.0 * price}
+
+# Messages of the kline stream, unconfirmed updates of every interval and then its confirmation
+prices   = [1.0]
+messages = []
+for index in range(limit, limit + intervals):
+    for update in range(updates + 1):
+        prices.append(prices[-1] * (1 + random.gauss(0, 0.0005)))
+        messages.append((kline(index, prices[-1]), update == updates))
+
+# Both ways start with limit klines
+def start_lists():
+    klines = {column: [] for column in buffers.KlineBuffer.columns}
+    for index in range(limit):
+        for column, value in kline(index, 1.0).items():
+            klines[column].append(value)
+    return klines
+def start_buffer():
+    klines = buffers.KlineBuffer(limit)
+    for index in range(limit):
+        klines.append(kline(index, 1.0))
+    return klines
+
+# Time per call in us of a loop over items
+def measure(function, items):
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    return (time.perf_counter() - start) / len(items) * 1000000
+
+# Stream messages, confirmed klines are added and unconfirmed ones replace the last, like the kline handler does
+lists  = start_lists()
+buffer = start_buffer()
+list_us   = measure(lambda message: list_new_kline(message[0], lists) if message[1] else list_update_kline(message[0], lists), messages)
+buffer_us = measure(lambda message: defs.new_kline(message[0], buffer) if message[1] else defs.update_kline(message[0], buffer), messages)
+
+# Update klines by start time
+times      = [kline(random.randrange(intervals, limit + intervals), 1.0) for _ in range(lookups)]
+list_add   = measure(lambda item: list_add_kline(item, lists), times)
+buffer_add = measure(lambda item: defs.add_kline(item, buffer), times)
+
+# Build the dataframe the indicators are calculated from
+list_frame   = measure(lambda item: pd.DataFrame(lists), range(200))
+buffer_frame = measure(lambda item: pd.DataFrame(buffer.views()), range(200))
+
+# Report
+print(f"{len(messages)} kline messages with {limit} klines kept")
+print(f"  lists      : {list_us:7.2f} us per message, {list_add:7.2f} us per update by time, {list_frame:7.1f} us per dataframe")
+print(f"  ring buffer: {buffer_us:7.2f} us per message, {buffer_add:7.2f} us per update by time, {buffer_frame:7.1f} us per dataframe")
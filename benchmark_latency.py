@@ -0,0 +1,52 @@
+### Sunflow Cryptobot ###
+#
+# Benchmark the overhead of recording a latency sample and check the percentiles of the histograms
+
+# Load libraries
+import random, time
+import latency
+
+# Settings
+samples    = 200000     # Samples to record
+repeat     = 5          # Best of this many runs
+
+# Empty function to time with the decorator, like the stages of the hot path
+stages = latency.Stages()
+def plain():
+    return None
+def decorated():
+    with stages.time("decorated"):
+        return None
+
+# Best time per call in us of function
+def measure(function):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(samples):
+            function()
+        elapsed = (time.perf_counter() - start) / samples * 1000000
+        best    = elapsed if best is None else min(best, elapsed)
+    return best
+
+# Overhead of the ways to record
+plain_us  = measure(plain)
+record_us = measure(lambda: stages.record("record", 1234)) - plain_us
+timer_us  = measure(decorated) - plain_us
+
+# Percentiles of a lognormal latency against the exact ones
+values    = [random.lognormvariate(7, 1) for _ in range(samples)]
+histogram = latency.Histogram()
+for value in values:
+    histogram.record(value)
+values.sort()
+errors = {}
+for percent in (50, 90, 99):
+    exact           = int(values[int(len(values) * percent / 100)])
+    errors[percent] = abs(histogram.percentile(percent) - exact) / exact * 100
+
+# Report
+print(f"Recording latency over {samples} samples, best of {repeat} runs")
+print(f"  record()        : {record_us:6.3f} us per sample")
+print(f"  with time()     : {timer_us:6.3f} us per sample, timing included")
+print(f"  percentile error: p50 {errors[50]:.2f} %, p90 {errors[90]:.2f} %, p99 {errors[99]:.2f} % of a lognormal latency")
@@ -0,0 +1,68 @@
+### Sunflow Cryptobot ###
+#
+# Benchmark writing log lines, opening the file for every line versus the buffered log writer
+
+# Load libraries
+import glob, json, os, tempfile, time
+import logs
+
+# Settings
+lines      = 20000      # Log lines to write
+line_rate  = 1000       # Log lines per second, a busy process with several symbols at error level 0
+rotate     = 1048576    # Rotation size in bytes to check rotation and reading back
+
+# Exchange log record
+def record(index):
+    return json.dumps({
+        'time'    : "2024-01-31 12:34:56.78",
+        'ms'      : 1706704496780 + index,
+        'symbol'  : "XRPUSDC",
+        'endpoint': "amend_order",
+        'latency' : 12.3,
+        'status'  : 19.0,
+        'limit'   : 20.0,
+        'retCode' : 0,
+        'retMsg'  : "OK",
+        'orderId' : str(1000000000 + index)
+    }) + "\n"
+
+# Old way, open the file for every line
+def append(path, text):
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write(text)
+
+# Write all lines with method, returns time per line in us on the calling thread and until all lines are on disk
+def run(method, flush=None):
+    start = time.perf_counter()
+    for index in range(lines):
+        method(record(index))
+    calling = time.perf_counter() - start
+    if flush:
+        flush()
+    total = time.perf_counter() - start
+    return (calling / lines) * 1000000, (total / lines) * 1000000
+
+# Measure both ways in a temporary folder
+with tempfile.TemporaryDirectory() as folder:
+
+    # Both ways
+    old_path = os.path.join(folder, "old.log")
+    new_path = os.path.join(folder, "new.log")
+    old_us   = run(lambda text: append(old_path, text))
+    new_us   = run(logs.writer(new_path).write, logs.flush)
+
+    # Rotation, every line has to be read back from the log and its compressed backups
+    rotated_path = os.path.join(folder, "rotated.log")
+    rotated      = logs.writer(rotated_path, size=rotate, backups=100)
+    rotated_us   = run(rotated.write, logs.flush)
+    rotated_us   = run(rotated.write, logs.flush)
+    logs.close()
+    records      = sum(1 for _ in logs.records(rotated_path))
+    backups      = len(glob.glob(rotated_path + ".*.gz"))
+    assert records == lines * 2
+
+# Report
+print(f"{lines} exchange log lines of about {len(record(0))} bytes")
+print(f"  open per line  : {old_us[0]:7.2f} us per line, {old_us[0] * line_rate / 10000:6.3f} % of one core at {line_rate} lines/s")
+print(f"  buffered writer: {new_us[0]:7.2f} us per line on the calling thread, {new_us[1]:7.2f} us until on disk, {new_us[1] * line_rate / 10000:6.3f} % of one core at {line_rate} lines/s")
+print(f"  with rotation  : {rotated_us[1]:7.2f} us per line until on disk, {backups} compressed backups, all {records} records read back")
@@ -0,0 +1,70 @@
+### Sunflow Cryptobot ###
+#
+# Benchmark finding sellable buys per tick, walking all buys versus the sell threshold index of the buy book
+
+# Load libraries
+import random, time
+import buybook
+
+# Settings
+buys       = 5000       # Closed buys in the database
+ticks      = 20000      # Ticks to simulate
+tick_rate  = 10         # Realistic ticks per second for a busy pair
+optimize   = 1000       # Profit and distance change every this many ticks, like the optimizer does
+
+# Create fake closed buys around a price of 1.0
+all_buys = []
+for index in range(buys):
+    all_buys.append({
+        'orderId'     : index,
+        'avgPrice'    : random.uniform(0.8, 1.2),
+        'cumExecQty'  : random.uniform(1, 100),
+        'cumExecValue': 0.0,
+        'cumExecFee'  : 0.0,
+        'status'      : "Closed"
+    })
+book = buybook.BuyBook(all_buys)
+
+# Random walk of prices and changing profit and distance
+prices  = [1.0]
+for _ in range(ticks - 1):
+    prices.append(prices[-1] * (1 + random.gauss(0, 0.0005)))
+factors = [1 + ((random.uniform(0.3, 0.6) + random.uniform(0.05, 0.2)) / 100) for _ in range(ticks // optimize + 1)]
+
+# Old way, walk all buys on every tick
+def walk(spot, factor):
+    qty       = 0
+    nearest   = []
+    all_sells = []
+    for transaction in all_buys:
+        if transaction['status'] == 'Closed':
+            profitable_price = transaction['avgPrice'] * factor
+            nearest.append(profitable_price - spot)
+            if spot >= profitable_price:
+                qty = qty + transaction['cumExecQty']
+                all_sells.append(transaction)
+    return all_sells, qty, min(nearest)
+
+# New way, one binary search in the buy book
+def index(spot, factor):
+    return book.sellable(spot, factor)
+
+# Run one method over all ticks, returns average time per tick in ms
+def run(method):
+    start = time.perf_counter()
+    for tick, spot in enumerate(prices):
+        method(spot, factors[tick // optimize])
+    return ((time.perf_counter() - start) / ticks) * 1000
+
+# Check both give the same answer
+for tick in range(0, ticks, 997):
+    old = walk(prices[tick], factors[tick // optimize])
+    new = index(prices[tick], factors[tick // optimize])
+    assert len(old[0]) == len(new[0]) and abs(old[1] - new[1]) < 1e-6 and abs(old[2] - new[2]) < 1e-12
+
+# Report
+walk_ms  = run(walk)
+index_ms = run(index)
+print(f"{buys} closed buys, {ticks} ticks, profit and distance change every {optimize} ticks")
+print(f"  walk all buys : {walk_ms:8.4f} ms per tick, {walk_ms * tick_rate / 10:6.3f} % of one core at {tick_rate} ticks/s")
+print(f"  buy book index: {index_ms:8.4f} ms per tick, {index_ms * tick_rate / 10:6.3f} % of one core at {tick_rate} ticks/s")
@@ -0,0 +1,95 @@
+### Sunflow Cryptobot ###
+#
+# Benchmark ticks per second through handle_ticker, with announcements on like a live bot, and the timestamp and
+# caller lookup of every announcement against the old now_utc() and inspect.stack()
+#
+# Use with a config and recorded market data to prepare the bot from, like a backtest:
+# python benchmark_ticker.py -c {optional path/}your_config.py -b {path/}recorded_data
+
+# Load libraries
+from datetime import datetime, timezone
+import argparse, contextlib, inspect, math, os, pytz, random, sys, time
+import clock, defs, loader, sunflow
+
+# Settings
+ticks      = 20000      # Ticks to handle
+tick_time  = 100        # Ms between ticks, ten per second is a busy pair
+calls      = 20000      # Calls per timestamp and caller lookup
+repeat     = 5          # Best of this many runs
+
+# Parse command line arguments
+parser = argparse.ArgumentParser(description="Benchmark ticks per second through handle_ticker.")
+parser.add_argument('-c', '--config', default='config.py', help='Specify the config file (with .py extension).')
+parser.add_argument('-b', '--backtest', required=True, help='Recorded market data to prepare the bot from.')
+args = parser.parse_args()
+
+# Prepare bot on the simulated exchange, then announce like a live bot does, to nowhere
+with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+    bot = sunflow.SunflowBot(loader.load_file(args.config), args.backtest)
+    bot.prepare()
+bot.context.quiet = False
+
+# Old way, all timestamps of now, of which the callers used one
+def now_utc():
+    current_time = datetime.now(timezone.utc)
+    milliseconds = math.floor(current_time.microsecond / 10000) / 100
+    timestamp_0  = current_time.strftime('%Y-%m-%d %H:%M:%S') + f'.{int(milliseconds * 100):02d}'
+    timestamp_1  = current_time.strftime('%Y-%m-%d %H:%M:%S') + f'.{int(milliseconds * 100):02d}' + " | " + bot.config.symbol + ": "
+    timestamp_2  = milliseconds
+    timestamp_3  = str(milliseconds) + " | "
+    timestamp_4  = int(time.time() * 1000)
+    local_tz     = pytz.timezone(bot.config.timezone_str)
+    local_time   = current_time.astimezone(local_tz)
+    timestamp_5  = local_time.strftime('%Y-%m-%d %H:%M:%S') + f'.{int(milliseconds * 100):02d}'
+    timestamp_6  = local_time.strftime('%Y-%m-%d %H:%M:%S') + f'.{int(milliseconds * 100):02d}' + " | " + bot.config.symbol + ": "
+    return timestamp_0, timestamp_1, timestamp_2, timestamp_3, timestamp_4, timestamp_5, timestamp_6
+
+# Old way, file and function name of the caller
+def stack_caller():
+    call_frame = inspect.stack()[1]
+    return os.path.basename(call_frame.filename), call_frame.function
+
+# New way, file and function name of the caller
+def frame_caller():
+    call_frame = sys._getframe(1)
+    return defs.source_name(call_frame.f_code.co_filename), call_frame.f_code.co_name
+
+# Best time per call in us of function, on the wall clock
+def measure(function, number=calls):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = (time.perf_counter() - start) / number * 1000000
+        best    = elapsed if best is None else min(best, elapsed)
+    return best
+
+# Timestamp and caller lookup of an announcement, the old caller lookup is slow so it gets fewer calls
+clock.reset()
+old_time   = measure(lambda: now_utc()[1])
+new_time   = measure(defs.prefix)
+old_caller = measure(stack_caller, calls // 100)
+new_caller = measure(frame_caller)
+
+# Random walk of prices from the spot price, so the price changes on almost every tick
+prices = [bot.spot]
+for _ in range(ticks - 1):
+    prices.append(round(prices[-1] * (1 + random.gauss(0, 0.0002)), 4))
+
+# Handle all ticks, the virtual clock moves with them
+start_time = clock.milliseconds()
+with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+    start = time.perf_counter()
+    for tick, price in enumerate(prices):
+        moment = start_time + tick * tick_time
+        clock.set_time(moment)
+        bot.handle_ticker({'ts': moment, 'data': {'lastPrice': price}})
+    elapsed = time.perf_counter() - start
+
+# Report
+print(f"{ticks} ticks of {bot.symbol} through handle_ticker in {elapsed:.2f} s")
+print(f"  {ticks / elapsed:8.0f} ticks per second, {elapsed / ticks * 1000:.4f} ms per tick")
+print(f"Per announcement, best of {repeat} runs")
+print(f"  timestamp    : {old_time:8.2f} us with now_utc(), {new_time:8.2f} us with prefix()")
+print(f"  caller lookup: {old_caller:8.2f} us with inspect.stack(), {new_caller:8.2f} us with sys._getframe()")
@@ -0,0 +1,90 @@
+### Sunflow Cryptobot ###
+#
+# Benchmark request latency to the exchange, a pybit session per module versus the shared pooled transport session
+#
+# Use with the config of the simulated exchange, start simserver.py first:
+# python benchmark_transport.py -c {optional path/}your_config.py
+
+# Load libraries
+from pybit.unified_trading import HTTP
+import argparse, statistics, threading, time
+import loader, transport
+
+# Settings
+modules    = 4          # Modules that had a pybit session of their own, preload, orders, trailing and analysis
+requests   = 400        # Requests per steady state measurement
+threads    = 8          # Threads making requests at the same time, like several symbols and their order workers
+
+# Parse command line arguments
+parser = argparse.ArgumentParser(description="Benchmark request latency to the exchange.")
+parser.add_argument('-c', '--config', default='config.py', help='Specify the config file (with .py extension).')
+args   = parser.parse_args()
+config = loader.load_file(args.config)
+
+# Plain pybit session, like every module created before
+def plain():
+    http = HTTP(testnet=False, api_key=config.api_key, api_secret=config.api_secret, return_response_headers=True)
+    if config.exchange_url:
+        http.endpoint = config.exchange_url
+    return http
+
+# Shared transport session without rate limits, requests go to its pybit session directly so identical requests are
+# not coalesced and only the connections are measured
+def shared():
+    transport.sessions.clear()
+    return transport.session(config.api_key, config.api_secret, config.exchange_url, 0, None, config.http_pool, config.http_timeout, config.http_retries)
+
+# Time in ms of one request
+def request(session):
+    start = time.perf_counter()
+    session.get_tickers(category="spot", symbol=config.symbol)
+    return (time.perf_counter() - start) * 1000
+
+# Latencies in ms of requests made one after the other, spread over the sessions
+def sequential(sessions):
+    return [request(sessions[index % len(sessions)]) for index in range(requests)]
+
+# Latencies in ms of requests made by several threads at the same time, spread over the sessions
+def concurrent(sessions):
+    latencies = []
+    def work(number):
+        for index in range(requests // threads):
+            latencies.append(request(sessions[(number + index) % len(sessions)]))
+    workers = [threading.Thread(target=work, args=(number,)) for number in range(threads)]
+    start   = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return latencies, requests / (time.perf_counter() - start)
+
+# Report latencies
+def report(name, latencies, rate=None):
+    latencies = sorted(latencies)
+    message   = f"  {name:<30}: p50 {statistics.median(latencies):7.2f} ms, p99 {latencies[int(len(latencies) * 0.99)]:7.2f} ms, max {latencies[-1]:7.2f} ms"
+    if rate:
+        message = message + f", {rate:6.0f} requests/s"
+    print(message)
+
+# A session per module, every module pays for its own first connection
+sessions = [plain() for _ in range(modules)]
+start    = time.perf_counter()
+first    = [request(session) for session in sessions]
+print(f"{modules} pybit sessions, one per module, against {config.exchange_url or 'Bybit'}")
+print(f"  first request of every module : {', '.join(f'{latency:.2f}' for latency in first)} ms, {(time.perf_counter() - start) * 1000:.2f} ms in total")
+report("steady state, one thread", sequential(sessions))
+report(f"steady state, {threads} threads", *concurrent(sessions))
+
+# The shared session, warmed at startup
+session = shared()
+warmed  = session.warm(config.http_warm)
+first   = [request(session.http) for _ in range(modules)]
+print(f"\nShared transport session, pool of {config.http_pool}, {config.http_warm} connections warmed in {warmed * 1000:.2f} ms")
+print(f"  first request of every module : {', '.join(f'{latency:.2f}' for latency in first)} ms")
+report("steady state, one thread", sequential([session.http]))
+report(f"steady state, {threads} threads", *concurrent([session.http]))
+
+# The shared session without warming, the first order pays for the connection
+session = shared()
+print("\nShared transport session, not warmed")
+print(f"  first request                 : {request(session.http):.2f} ms")
@@ -0,0 +1,230 @@
+### Sunflow Cryptobot ###
+#
+# Preallocated buffers for market data
+
+# Load libraries
+from collections import deque
+import math
+import numpy as np
+
+# Klines of one interval in a ring buffer with a fixed capacity. Every value is written twice, at slot and at
+# slot + capacity, so the klines from oldest to newest are always one contiguous slice that can be handed out
+# as a view without copying.
+class KlineBuffer:
+
+    # Columns of a kline
+    columns = ('time', 'open', 'high', 'low', 'close', 'volume', 'turnover')
+
+    # Initialize empty buffer
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.head     = 0
+        self.count    = 0
+        self.slots    = {}
+        self.data     = {}
+        for column in self.columns:
+            dtype = np.int64 if column == 'time' else np.float64
+            self.data[column] = np.zeros(2 * capacity, dtype=dtype)
+
+    # Number of klines
+    def __len__(self):
+        return self.count
+
+    # Zero-copy view of one column from oldest to newest kline
+    def __getitem__(self, column):
+        return self.data[column][self.head:self.head + self.count]
+
+    # Zero-copy views of all columns, for example for pd.DataFrame()
+    def views(self):
+        return {column: self[column] for column in self.columns}
+
+    # Klines from oldest to newest as dictionaries with Python numbers
+    def rows(self):
+        columns = {column: self[column].tolist() for column in self.columns}
+        for index in range(self.count):
+            yield {column: columns[column][index] for column in self.columns}
+
+    # Start time of the newest kline
+    def last_time(self):
+        if not self.count:
+            return None
+        return int(self.data['time'][self.head + self.count - 1])
+
+    # Index of kline with start time, from oldest (0) to newest
+    def index(self, time):
+        slot = self.slots.get(time)
+        if slot is None:
+            return None
+        return (slot - self.head) % self.capacity
+
+    # Write kline into slot and its mirror
+    def write(self, slot, kline):
+        for column in self.columns:
+            self.data[column][slot]                 = kline[column]
+            self.data[column][slot + self.capacity] = kline[column]
+        self.slots[kline['time']] = slot
+
+    # Add kline as newest, the oldest kline is dropped when full
+    def append(self, kline):
+        if self.count == self.capacity:
+            slot = self.head
+            del self.slots[int(self.data['time'][slot])]
+            self.head = (self.head + 1) % self.capacity
+        else:
+            slot = (self.head + self.count) % self.capacity
+            self.count += 1
+        self.write(slot, kline)
+
+    # Replace the newest kline
+    def replace_last(self, kline):
+        slot = (self.head + self.count - 1) % self.capacity
+        time = int(self.data['time'][slot])
+        if time != kline['time']:
+            del self.slots[time]
+        self.write(slot, kline)
+
+    # Replace the kline with the same start time, returns False when it is not in the buffer
+    def replace(self, kline):
+        slot = self.slots.get(kline['time'])
+        if slot is None:
+            return False
+        self.write(slot, kline)
+        return True
+
+# Prices indexed by time, times never decrease so every lookup is a binary search. Appending is amortized O(1),
+# old prices are evicted by moving the head and the arrays are compacted or grown when the tail hits the end.
+class PriceBuffer:
+
+    # Initialize empty buffer
+    def __init__(self, capacity=1024):
+        self.head  = 0
+        self.tail  = 0
+        self.times = np.zeros(capacity, dtype=np.int64)
+        self.data  = np.zeros(capacity, dtype=np.float64)
+
+    # Number of prices
+    def __len__(self):
+        return self.tail - self.head
+
+    # Zero-copy view of 'time' or 'price' from oldest to newest
+    def __getitem__(self, column):
+        if column == 'time':
+            return self.times[self.head:self.tail]
+        return self.data[self.head:self.tail]
+
+    # Zero-copy views of both columns, for example for pd.DataFrame()
+    def views(self):
+        return {'time': self['time'], 'price': self['price']}
+
+    # Add price, a time older than the newest time is clamped to keep the buffer sorted
+    def append(self, time, price):
+
+        # Make room at the end
+        if self.tail == len(self.times):
+            count = self.tail - self.head
+            if self.head >= len(self.times) // 2:
+                self.times[:count] = self.times[self.head:self.tail]
+                self.data[:count]  = self.data[self.head:self.tail]
+            else:
+                times      = np.zeros(2 * len(self.times), dtype=np.int64)
+                data       = np.zeros(2 * len(self.data), dtype=np.float64)
+                times[:count] = self.times[self.head:self.tail]
+                data[:count]  = self.data[self.head:self.tail]
+                self.times = times
+                self.data  = data
+            self.head = 0
+            self.tail = count
+
+        # Keep times sorted
+        if self.tail > self.head and time < self.times[self.tail - 1]:
+            time = self.times[self.tail - 1]
+
+        # Store price
+        self.times[self.tail] = time
+        self.data[self.tail]  = price
+        self.tail += 1
+
+    # Remove all prices older than time
+    def evict_before(self, time):
+        self.head += int(np.searchsorted(self['time'], time, 'left'))
+
+    # Index of the price closest in time, on a tie the oldest, same as defs.get_closest_index()
+    def index_at(self, time):
+
+        # Nothing to find
+        times = self['time']
+        if not len(times):
+            return None
+
+        # Compare neighbours of the insertion point
+        index = int(np.searchsorted(times, time, 'left'))
+        if index == len(times):
+            index = index - 1
+        if index > 0 and abs(time - times[index - 1]) <= abs(times[index] - time):
+            index = int(np.searchsorted(times, times[index - 1], 'left'))
+
+        # Return index
+        return index
+
+    # Views of all prices newer than time
+    def since(self, time):
+        start = self.head + int(np.searchsorted(self['time'], time, 'right'))
+        return {'time': self.times[start:self.tail], 'price': self.data[start:self.tail]}
+
+    # Views of the prices of the last {timeframe} ms
+    def window(self, timeframe):
+        if self.tail == self.head:
+            return self.since(0)
+        return self.since(self.times[self.tail - 1] - timeframe - 1)
+
+# Trades of the last {timeframe} ms with running buy and sell values. Every trade is parsed once, added to the sums
+# and removed again when it falls out of the timeframe, so the buy and sell ratio cost O(1) amortized per trade.
+class TradeWindow:
+
+    # Initialize empty window
+    def __init__(self, timeframe):
+        self.timeframe = timeframe
+        self.trades    = deque()
+        self.latest    = 0
+        self.buy       = 0.0
+        self.sell      = 0.0
+        self.changes   = 0
+
+    # Number of trades in window
+    def __len__(self):
+        return len(self.trades)
+
+    # Add trade with time in ms, side 'Buy' or 'Sell' and price and size as given by the exchange
+    def add(self, time, side, price, size):
+        value  = float(price) * float(size)
+        is_buy = side == 'Buy'
+        if is_buy:
+            self.buy += value
+        elif side == 'Sell':
+            self.sell += value
+        else:
+            value = 0.0
+        self.trades.append((time, is_buy, value))
+        self.latest = max(self.latest, time)
+
+    # Remove trades older than the timeframe, sums are recalculated once in a while against float drift
+    def evict(self):
+        start = self.latest - self.timeframe
+        while self.trades and self.trades[0][0] < start:
+            _, is_buy, value = self.trades.popleft()
+            if is_buy:
+                self.buy -= value
+            else:
+                self.sell -= value
+            self.changes += 1
+        if self.changes >= 10000 or not self.trades:
+            self.buy     = math.fsum(value for _, is_buy, value in self.trades if is_buy)
+            self.sell    = math.fsum(value for _, is_buy, value in self.trades if not is_buy)
+            self.changes = 0
+
+    # Buy and sell value and their percentages of the total, like defs.calculate_total_values()
+    def totals(self):
+        total = self.buy + self.sell
+        if total <= 0:
+            return self.buy, self.sell, total, 0.0, 0.0
+        return self.buy, self.sell, total, (self.buy / total) * 100, (self.sell / total) * 100
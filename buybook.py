@@ -0,0 +1,144 @@
+### Sunflow Cryptobot ###
+#
+# Indexed database of buy orders
+
+# Load libraries
+import bisect, math
+import numpy as np
+
+# All buys keyed by orderId, in order of registration, with sorted (avgPrice, orderId) indexes of all orders and of
+# the closed orders and running totals. Because the profitable price of a buy is its avgPrice times the same factor
+# for every buy, the avgPrice index also orders buys by profitable price. Iterating gives the transactions like the
+# list of all buys did. For selling, the closed buys are also kept as arrays with the sell thresholds and prefix sums
+# of cumExecQty, rebuilt only when the book or the factor changes, so a tick only costs one binary search.
+class BuyBook:
+
+    # Initialize book, optionally from a list of transactions
+    def __init__(self, transactions=()):
+        self.orders  = {}
+        self.keys    = {}
+        self.prices  = []
+        self.closed  = []
+        self.qty     = 0.0
+        self.value   = 0.0
+        self.fee     = 0.0
+        self.changes = 0
+        self.cache   = None
+        for transaction in transactions:
+            self.add(transaction)
+
+    # Number of buys
+    def __len__(self):
+        return len(self.orders)
+
+    # Transactions in order of registration
+    def __iter__(self):
+        return iter(self.orders.values())
+
+    # Is orderId in book
+    def __contains__(self, orderid):
+        return orderid in self.orders
+
+    # Get transaction by orderId
+    def get(self, orderid):
+        return self.orders.get(orderid)
+
+    # Add transaction or replace the one with the same orderId, keeping its place
+    def add(self, transaction):
+
+        # Remove old version from indexes
+        orderid = transaction['orderId']
+        if orderid in self.orders:
+            self.unindex(orderid)
+
+        # Store and index, remember what was indexed in case the transaction is changed later
+        key    = (transaction['avgPrice'], orderid)
+        closed = transaction['status'] == "Closed"
+        self.orders[orderid] = transaction
+        self.keys[orderid]   = (key, closed, transaction['cumExecQty'], transaction['cumExecValue'], transaction['cumExecFee'])
+        bisect.insort(self.prices, key)
+        if closed:
+            bisect.insort(self.closed, key)
+        self.qty   = self.qty + transaction['cumExecQty']
+        self.value = self.value + transaction['cumExecValue']
+        self.fee   = self.fee + transaction['cumExecFee']
+        self.cache = None
+        self.changed()
+
+    # Remove transaction from indexes and totals
+    def unindex(self, orderid):
+        key, closed, qty, value, fee = self.keys.pop(orderid)
+        del self.prices[bisect.bisect_left(self.prices, key)]
+        if closed:
+            del self.closed[bisect.bisect_left(self.closed, key)]
+        self.qty   = self.qty - qty
+        self.value = self.value - value
+        self.fee   = self.fee - fee
+        self.cache = None
+
+    # Remove transaction by orderId, returns it or None when not found
+    def remove(self, orderid):
+        if orderid not in self.orders:
+            return None
+        self.unindex(orderid)
+        transaction = self.orders.pop(orderid)
+        self.changed()
+        return transaction
+
+    # Remove all transactions with these orderIds
+    def remove_ids(self, orderids):
+        for orderid in orderids:
+            self.remove(orderid)
+
+    # Totals drift when adding and subtracting floats, recalculate them once in a while
+    def changed(self):
+        self.changes = self.changes + 1
+        if self.changes % 1000 == 0 or not self.orders:
+            self.qty   = math.fsum(item[2] for item in self.keys.values())
+            self.value = math.fsum(item[3] for item in self.keys.values())
+            self.fee   = math.fsum(item[4] for item in self.keys.values())
+
+    # Transaction with the highest avgPrice
+    def highest(self):
+        if not self.prices:
+            return None
+        return self.orders[self.prices[-1][1]]
+
+    # Arrays of the closed transactions and sell thresholds for factor, lowest avgPrice first
+    def arrays(self, factor):
+
+        # Rebuild after the book changed
+        if self.cache is None:
+            qty = [self.keys[orderid][2] for _, orderid in self.closed]
+            self.cache = {
+                'transactions': [self.orders[orderid] for _, orderid in self.closed],
+                'prices'      : np.array([price for price, _ in self.closed], dtype=np.float64),
+                'qty'         : np.concatenate(([0.0], np.cumsum(qty))),
+                'factor'      : None,
+                'thresholds'  : None
+            }
+
+        # Thresholds are avgPrice * factor, the same multiplication as done per buy before
+        if self.cache['factor'] != factor:
+            self.cache['thresholds'] = self.cache['prices'] * factor
+            self.cache['factor']     = factor
+
+        # Return arrays
+        return self.cache
+
+    # Closed transactions with avgPrice * factor <= spot, their total quantity and how far spot is below the
+    # lowest threshold (None when there are no closed transactions)
+    def sellable(self, spot, factor):
+        arrays  = self.arrays(factor)
+        count   = int(np.searchsorted(arrays['thresholds'], spot, 'right'))
+        nearest = None
+        if len(arrays['thresholds']):
+            nearest = float(arrays['thresholds'][0]) - spot
+        return arrays['transactions'][:count], float(arrays['qty'][count]), nearest
+
+    # All transactions with min_price <= avgPrice <= max_price, lowest avgPrice first, the bounds are tuples with only a
+    # price, which sort before every key with that price, so the orderIds are never compared with them
+    def between(self, min_price, max_price):
+        start = bisect.bisect_left(self.prices, (min_price,))
+        end   = bisect.bisect_left(self.prices, (math.nextafter(max_price, math.inf),))
+        return [self.orders[orderid] for _, orderid in self.prices[start:end]]
@@ -0,0 +1,66 @@
+### Sunflow Cryptobot ###
+#
+# Wall clock or virtual clock, and cheap timestamps
+
+# Load libraries
+from datetime import datetime, timezone
+import functools, pytz, time
+
+# When virtual is set, time stands still at that moment in ms until it is moved, so a backtest can replay recorded
+# market data as fast as the strategy can handle it. Otherwise the wall clock is used.
+virtual = None
+
+# Move virtual clock to time in ms
+def set_time(milliseconds):
+    global virtual
+    virtual = int(milliseconds)
+
+# Go back to the wall clock
+def reset():
+    global virtual
+    virtual = None
+
+# Current time in ms
+def milliseconds():
+    if virtual is None:
+        return int(time.time() * 1000)
+    return virtual
+
+# Current UTC datetime
+def now():
+    if virtual is None:
+        return datetime.now(timezone.utc)
+    return datetime.fromtimestamp(virtual / 1000, timezone.utc)
+
+# Monotonic time in ms, to measure how long something took, never moves back and ignores the virtual clock
+def monotonic():
+    return time.monotonic_ns() // 1000000
+
+# Timezone by name, loaded once
+@functools.lru_cache(maxsize=None)
+def zone(name):
+    return pytz.timezone(name)
+
+# Second and its text per timezone, a second is formatted once however often it is asked for
+formatted = {}
+
+# Current time as text like 2024-01-31 12:34:56.78 in timezone
+def text(name):
+    current = milliseconds()
+    second  = current // 1000
+    cached  = formatted.get(name)
+    if cached is None or cached[0] != second:
+        moment = datetime.fromtimestamp(second, timezone.utc)
+        if name != "UTC":
+            moment = moment.astimezone(zone(name))
+        cached = (second, moment.strftime('%Y-%m-%d %H:%M:%S'))
+        formatted[name] = cached
+    return f"{cached[1]}.{current % 1000 // 10:02d}"
+
+# Current UTC time as text
+def utc():
+    return text("UTC")
+
+# Current local time as text
+def local(name):
+    return text(name)
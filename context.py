@@ -0,0 +1,101 @@
+### Sunflow Cryptobot ###
+#
+# Bot context, the config and the state of one symbol that the modules share
+
+# Load libraries
+import apprise, functools, threading
+import buffers, clock, execution, latency, loader, notify, ordercache, transport
+
+# Every bot has its own context with its config, exchange session, order worker, order cache and the state the
+# modules keep between calls. The modules use the context of the thread they run on, a bot activates its context on
+# every thread it runs on, so several bots can run in one process. A thread without context uses the default context,
+# loaded at first use from the config on the command line, so scripts that only use the modules keep working.
+class BotContext:
+
+    # Initialize context of config
+    def __init__(self, config):
+
+        # Config and exchange
+        self.config          = config                                      # Config module of the bot
+        self.session         = transport.session(config.api_key, config.api_secret, config.exchange_url, config.http_rate, config.http_limits, config.http_pool, config.http_timeout, config.http_retries)
+        self.worker          = execution.OrderWorker(self.activate)        # Order execution worker
+        self.cache           = ordercache.OrderCache()                     # Order, execution and wallet state of the private websocket
+
+        # Notifications, primary and secondary urls for Apprise, printed and sent on the dispatcher thread
+        self.apobj           = apprise.Apprise()
+        for urls, tag in [(config.notify_1_urls, "primary"), (config.notify_2_urls, "secondary")]:
+            for url in urls:
+                self.apobj.add(url, tag=tag)
+        self.notifier        = notify.Dispatcher(self.apobj, config.notify_interval, config.notify_queue)
+
+        # Latency histograms of the hot path, by stage
+        self.stages          = latency.Stages()
+
+        # General
+        self.df_errors       = 0                                           # Dataframe error counter
+        self.halt_sunflow    = False                                       # Register halt or continue
+        self.quiet           = False                                       # Do not announce anything, used when backtesting
+
+        # Database journal
+        self.journal_records = 0                                           # Changes in the journal since the last snapshot
+
+        # ATR timer and klines of distance
+        self.atr_timer       = {'check': False, 'time': 0, 'interval': 60000}
+        self.atr_klines      = buffers.KlineBuffer(config.limit)
+
+        # Stuck order check of trailing, the private websocket reports fills so then only check as a safety net
+        self.stuck           = {'check': True, 'time': clock.milliseconds(), 'interval': 20000, 'live': 600000}
+
+    # Use this context on the calling thread
+    def activate(self):
+        local.context = self
+
+# Context of the thread
+local   = threading.local()
+default = None
+lock    = threading.Lock()
+
+# Context of the calling thread, or the default context
+def current():
+    global default
+    context = getattr(local, 'context', None)
+    if context is not None:
+        return context
+    with lock:
+        if default is None:
+            default = BotContext(loader.load_config())
+    return default
+
+# Attribute of the context of the calling thread, so a module can keep using config.symbol or session.get_tickers()
+class Proxy:
+
+    # Initialize proxy of attribute
+    def __init__(self, name):
+        object.__setattr__(self, 'name', name)
+
+    # Get from the current context
+    def __getattr__(self, attribute):
+        context = getattr(local, 'context', None) or current()
+        return getattr(getattr(context, self.name), attribute)
+
+    # Set in the current context
+    def __setattr__(self, attribute, value):
+        setattr(getattr(current(), self.name), attribute, value)
+
+# Attributes the modules use
+config  = Proxy('config')
+session = Proxy('session')
+worker  = Proxy('worker')
+cache   = Proxy('cache')
+stages  = Proxy('stages')
+
+# Decorator that records the latency of every call of a function as stage, in the context of the calling thread
+def timed(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            context = getattr(local, 'context', None) or current()
+            with context.stages.time(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
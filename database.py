@@ -3,30 +3,139 @@
 # Do database stuff
 
 # Load libraries
-from loader import load_config
-import defs, json
+import buybook, clock, context, defs, json, os
 
-# Load config
-config = load_config()
+# Config of the bot
+config = context.config
 
-# Create a new all buy database file
+## The database file is a snapshot of all buys. Every change after that is appended as one line to a journal file
+## next to it, so a change costs one small write instead of rewriting all buys. Loading replays the journal on top
+## of the snapshot and writes nothing, so analysis can load the database next to a running bot. Only the bot that
+## owns the database compacts the journal into a new snapshot, at startup and after {dbase_compact} changes, which is
+## written to a temporary file and renamed, so a crash never leaves a half written database behind.
+
+# Journal file that belongs to a database file
+def journal_file(dbase_file):
+    return dbase_file + ".journal"
+
+# Flush file to disk
+def sync(file):
+    file.flush()
+    os.fsync(file.fileno())
+
+# Atomically replace the database file by a snapshot and empty the journal
+def write_snapshot(dbase_file, all_buys):
+
+    # Write to temporary file
+    temp_file = dbase_file + ".tmp"
+    with open(temp_file, 'w', encoding='utf-8') as json_file:
+        json_file.write(json.dumps(list(all_buys)))
+        if config.dbase_fsync != "never": sync(json_file)
+
+    # Rename over the old database file and make the rename durable
+    os.replace(temp_file, dbase_file)
+    if config.dbase_fsync != "never" and hasattr(os, 'O_DIRECTORY'):
+        folder = os.open(os.path.dirname(os.path.abspath(dbase_file)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(folder)
+        finally:
+            os.close(folder)
+
+    # Changes are in the snapshot now, replaying them again would do no harm
+    with open(journal_file(dbase_file), 'w', encoding='utf-8'):
+        pass
+
+# Append changes to the journal
+def append_journal(dbase_file, records):
+    with open(journal_file(dbase_file), 'a', encoding='utf-8') as journal:
+        for record in records:
+            journal.write(json.dumps(record) + "\n")
+        if config.dbase_fsync == "always": sync(journal)
+
+# Apply a change to all buys
+def apply(record, all_buys):
+
+    # Add or replace order
+    if record['op'] == "add":
+        all_buys.add(record['order'])
+
+    # Remove orders
+    if record['op'] == "remove":
+        all_buys.remove_ids(record['ids'])
+
+    # Return all buys
+    return all_buys
+
+# Replay the journal on all buys, returns the number of changes and the line number of a corrupt line, 0 if none
+def replay(dbase_file, all_buys):
+
+    # Initialize variables
+    records = 0
+    torn    = 0
+    corrupt = 0
+
+    # Apply changes, a torn last line of a crash is ignored, a line that can't be read before the last one is corrupt
+    try:
+        with open(journal_file(dbase_file), 'r', encoding='utf-8') as journal:
+            for number, line in enumerate(journal, 1):
+                if not line.strip():
+                    continue
+                if torn:
+                    corrupt = torn
+                    break
+                try:
+                    record = json.loads(line)
+                except json.decoder.JSONDecodeError:
+                    torn = number
+                    continue
+                apply(record, all_buys)
+                records = records + 1
+    except FileNotFoundError:
+        pass
+
+    # Output to stdout
+    if torn and not corrupt:
+        defs.announce("Ignored incomplete last change in database journal")
+
+    # Return number of changes and corrupt line
+    return records, corrupt
+
+# Create a new all buy database file, this is also the compaction of the journal
+@context.timed("database.save")
 def save(all_buys, info):
 
-    # Debug and speed
+    # Debug
     debug = False
-    speed = True
-    stime = defs.now_utc()[4]
 
     # Write the file
-    with open(config.dbase_file, 'w', encoding='utf-8') as json_file:
-        json.dump(all_buys, json_file)
+    write_snapshot(config.dbase_file, all_buys)
+    context.current().journal_records = 0
 
     # Get statistics and output to stdout
     result = order_count(all_buys, info)
     defs.announce(f"Database contains {result[0]} buy transactions and {defs.format_number(result[1], info['basePrecision'])} {info['baseCoin']} was bought")
 
-    # Report execution time
-    if speed: defs.announce(defs.report_exec(stime))
+    # Return
+    return
+
+# Register changes in the journal and compact when it grew too large
+def journal(records, all_buys, info):
+
+    # Changes in the journal since the last snapshot are kept in the context of the bot
+    bot = context.current()
+
+    # Compact into a new snapshot
+    if bot.journal_records + len(records) >= config.dbase_compact:
+        save(all_buys, info)
+        return
+
+    # Append changes
+    append_journal(config.dbase_file, records)
+    bot.journal_records = bot.journal_records + len(records)
+
+    # Get statistics and output to stdout
+    result = order_count(all_buys, info)
+    defs.announce(f"Database contains {result[0]} buy transactions and {defs.format_number(result[1], info['basePrecision'])} {info['baseCoin']} was bought")
 
     # Return
     return
@@ -37,22 +146,31 @@ def load(dbase_file, info):
     # Debug and speed
     debug = False
     speed = True
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
 
     # Initialize variables
-    all_buys = []
+    all_buys = buybook.BuyBook()
 
     # Load existing database file
     try:
         with open(dbase_file, 'r', encoding='utf-8') as json_file:
-            all_buys = json.load(json_file)
+            all_buys = buybook.BuyBook(json.load(json_file))
     except FileNotFoundError:
         defs.announce("Database with all buys not found, exiting...")
-        defs.halt_sunflow = True
+        context.current().halt_sunflow = True
         exit()
     except json.decoder.JSONDecodeError:
         defs.announce("Database with all buys not yet filled, may come soon!")
 
+    # Replay changes since the last snapshot, a corrupt journal is kept as it is and Sunflow stops, compacting would
+    # lose the changes after the corrupt line
+    records, corrupt = replay(dbase_file, all_buys)
+    if corrupt:
+        defs.log_error(f"Database journal {journal_file(dbase_file)} is corrupt at line {corrupt}, repair or remove that line, exiting...")
+        exit()
+    if records:
+        defs.announce(f"Replayed {records} changes from database journal")
+
     # Get statistics and output to stdout
     result = order_count(all_buys, info)
     defs.announce(f"Database contains {result[0]} buy transactions and {defs.format_number(result[1], info['basePrecision'])} {info['baseCoin']} was bought")
@@ -63,23 +181,31 @@ def load(dbase_file, info):
     # Return database
     return all_buys
 
+# Compact the journal into a new snapshot, also drops a torn last line, only the bot that owns the database does this
+def compact(dbase_file, all_buys):
+
+    # Write snapshot when the journal has changes
+    if os.path.exists(journal_file(dbase_file)) and os.path.getsize(journal_file(dbase_file)) > 0:
+        write_snapshot(dbase_file, all_buys)
+    context.current().journal_records = 0
+
+    # Return
+    return
+
 # Remove an order from the all buys database file
 def remove(orderid, all_buys, info):
 
     # Debug and speed
     debug = False
     speed = True
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
 
     # Initialize variables
-    all_buys_new = []
-    found_order  = False
+    record      = {'op': "remove", 'ids': [orderid]}
+    found_order = orderid in all_buys
     
     # Remove the order
-    for loop_buy in all_buys:
-        if loop_buy['orderId'] != orderid:
-            found_order = True
-            all_buys_new.append(loop_buy)
+    all_buys = apply(record, all_buys)
 
     # Output to stdout
     if not found_order:
@@ -88,13 +214,13 @@ def remove(orderid, all_buys, info):
         defs.announce(f"Order with ID {orderid} removed from all buys database!")
     
     # Save to database
-    save(all_buys_new, info)
+    journal([record], all_buys, info)
 
     # Report execution time
     if speed: defs.announce(defs.report_exec(stime))
     
     # Return database
-    return all_buys_new
+    return all_buys
 
 # Register all buys in a database file
 def register_buy(buy_order, all_buys, info):
@@ -102,40 +228,27 @@ def register_buy(buy_order, all_buys, info):
     # Debug
     debug = False
     speed = False
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
 
     # Initialize variables
-    counter       = 0
-    all_buys_new  = []
-    loop_buy      = False
-    loop_appended = False
+    record = {'op': "add", 'order': buy_order}
     
-    # If order already exists in buys dbase, change status
-    for loop_buy in all_buys:
-        if loop_buy['orderId'] == buy_order['orderId']:
-            counter = counter + 1
-            loop_appended = True
-            loop_buy = buy_order
-        all_buys_new.append(loop_buy)
-    
-    # If not found in buy orders, then add new buy order
-    if not loop_appended:
-        all_buys_new.append(buy_order)
-        counter = counter + 1
+    # If order already exists in buys dbase change status, otherwise add new buy order
+    all_buys = apply(record, all_buys)
       
     if debug:
-        defs.announce(f"New database with {counter} buy orders")
-        print(all_buys_new)
+        defs.announce(f"New database with {len(all_buys)} buy orders")
+        print(list(all_buys))
         print()
 
     # Save to database
-    save(all_buys_new, info)    
+    journal([record], all_buys, info)
 
     # Report execution time
     if speed: defs.announce(defs.report_exec(stime))
     
     # Return new buy database
-    return all_buys_new
+    return all_buys
 
 # Remove all sold buy transaction from the database file
 def register_sell(all_buys, all_sells, info):
@@ -143,7 +256,7 @@ def register_sell(all_buys, all_sells, info):
     # Debug
     debug = False
     speed = False
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
     
     # Initialize variables
     unique_ids = 0
@@ -152,13 +265,14 @@ def register_sell(all_buys, all_sells, info):
     sell_order_ids = {sell['orderId'] for sell in all_sells}
 
     # Filter out all_buys entries that have their orderId in sell_order_ids
-    filtered_buys = [buy for buy in all_buys if buy['orderId'] not in sell_order_ids]
+    record        = {'op': "remove", 'ids': list(sell_order_ids)}
+    filtered_buys = apply(record, all_buys)
 
     # Count unique order ids
     unique_ids = len(sell_order_ids)
     
     # Save to database
-    save(filtered_buys, info)
+    journal([record], filtered_buys, info)
     
     if debug:
         print("All sell orders")
@@ -187,12 +301,11 @@ def order_count(all_buys, info):
     # Debug and speed
     debug = False
     speed = True
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
     
-    # Get number of transactions
+    # Get number of transactions and running total
     order_count = len(all_buys)
-    total_qty   = sum(item['cumExecQty'] for item in all_buys)
-    total_qty   = defs.round_number(total_qty, info['basePrecision'], "down")
+    total_qty   = defs.round_number(all_buys.qty, info['basePrecision'], "down")
 
     # Report execution time
     if speed: defs.announce(defs.report_exec(stime))
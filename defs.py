@@ -3,71 +3,44 @@
 # General functions
 
 # Load libraries
-from loader import load_config
 from pathlib import Path
-from datetime import datetime, timezone
-import apprise, defs, indicators, inspect, math, preload, pprint, pytz, time
+import buffers, clock, context, defs, functools, indicators, json, logs, math, preload, pprint, sys, threading
 
-# Load config
-config = load_config()
+# Config of the bot, the Apprise instance and error counters are kept in its context
+config = context.config
 
-# Create an Apprise instance
-apobj = apprise.Apprise()
+# Latency and rate limit status of the last response on this thread, kept by rate_limit() for log_exchange()
+last = threading.local()
 
-# Primary and secondary notification urls for Apprise
-urls_tags = [(config.notify_1_urls, "primary"), (config.notify_2_urls, "secondary")]
-for urls, tag in urls_tags:
-    for url in urls:
-        apobj.add(url, tag=tag)
+# Add new kline and remove the oldest
+def new_kline(kline, klines, stream=None):
 
-# Initialize variables 
-df_errors    = 0        # Dataframe error counter
-halt_sunflow = False    # Register halt or continue
+    # Kline is the confirmation of the last kline, replace it, otherwise add it
+    if klines.last_time() == kline['time']:
+        klines.replace_last(kline)
+    else:
+        klines.append(kline)
 
-# Add new kline and remove the oldest
-def new_kline(kline, klines):
-
-    # Add new kline
-    klines['time'].append(kline['time'])
-    klines['open'].append(kline['open'])
-    klines['high'].append(kline['high'])
-    klines['low'].append(kline['low'])
-    klines['close'].append(kline['close'])
-    klines['volume'].append(kline['volume'])
-    klines['turnover'].append(kline['turnover'])
-    
-    # Remove first kline
-    klines['time'].pop(0)
-    klines['open'].pop(0)
-    klines['high'].pop(0)
-    klines['low'].pop(0)
-    klines['close'].pop(0)
-    klines['volume'].pop(0)
-    klines['turnover'].pop(0)
+    # Update running state of technical indicators
+    if stream:
+        stream.update(kline)
 
     # Return klines
     return klines
 
-# Remove the first kline and replace with fresh kline
-def update_kline(kline, klines): 
-
-    # Remove last kline
-    klines['time'].pop()
-    klines['open'].pop()
-    klines['high'].pop()
-    klines['low'].pop()
-    klines['close'].pop()
-    klines['volume'].pop()
-    klines['turnover'].pop()
-    
-    # Add new kline
-    klines['time'].append(kline['time'])
-    klines['open'].append(kline['open'])
-    klines['high'].append(kline['high'])
-    klines['low'].append(kline['low'])
-    klines['close'].append(kline['close'])
-    klines['volume'].append(kline['volume'])
-    klines['turnover'].append(kline['turnover'])
+# Remove the last kline and replace with fresh kline
+def update_kline(kline, klines, stream=None): 
+
+    # Kline belongs to a new interval, add it
+    if klines.last_time() != kline['time']:
+        return new_kline(kline, klines, stream)
+
+    # Replace last kline
+    klines.replace_last(kline)
+
+    # Update running state of technical indicators
+    if stream:
+        stream.update(kline)
 
     # Return klines
     return klines
@@ -75,17 +48,8 @@ def update_kline(kline, klines):
 # Update matching kline based on time
 def add_kline(kline, klines):
 
-    # Find the index
-    if kline['time'] in klines['time']:
-        index = klines['time'].index(kline['time'])
-        
-        # Override the values
-        klines['open'][index]     = kline['open']
-        klines['high'][index]     = kline['high']
-        klines['low'][index]      = kline['low']
-        klines['close'][index]    = kline['close']
-        klines['turnover'][index] = kline['turnover']
-        klines['volume'][index]   = kline['volume']
+    # Override the values if the kline exists
+    klines.replace(kline)
     
     # Return klines
     return klines
@@ -104,13 +68,12 @@ def check_spread(all_buys, spot, spread):
     min_price = spot * (1 - (spread / 100))
     max_price = spot * (1 + (spread / 100))
 
-    # Loop through the all buys
-    for transaction in all_buys:
-        avg_price = transaction["avgPrice"]
-        if (avg_price >= min_price) and (avg_price <= max_price):
-             can_buy = False
-             near = min(abs((avg_price / min_price * 100) - 100), abs((avg_price / max_price * 100) - 100))
-             break
+    # Find the buy nearest to spot within the boundaries
+    adjacent = all_buys.between(min_price, max_price)
+    if adjacent:
+        avg_price = min(adjacent, key=lambda transaction: abs(transaction['avgPrice'] - spot))['avgPrice']
+        can_buy   = False
+        near      = min(abs((avg_price / min_price * 100) - 100), abs((avg_price / max_price * 100) - 100))
          
     if debug:
         if can_buy:
@@ -121,42 +84,62 @@ def check_spread(all_buys, spot, spread):
     # Return buy advice
     return can_buy, near
 
-# Return timestamp according to UTC and offset
-def now_utc():
-    
-    # Current UTC datetime
-    current_time = datetime.now(timezone.utc)
-    milliseconds = math.floor(current_time.microsecond / 10000) / 100
-    timestamp_0  = current_time.strftime('%Y-%m-%d %H:%M:%S') + f'.{int(milliseconds * 100):02d}'
-    timestamp_1  = current_time.strftime('%Y-%m-%d %H:%M:%S') + f'.{int(milliseconds * 100):02d}' + " | " + config.symbol + ": "
-    timestamp_2  = milliseconds
-    timestamp_3  = str(milliseconds) + " | "
-    timestamp_4  = int(time.time() * 1000)
+# File name of a source file, the caller of every announcement is looked up
+@functools.lru_cache(maxsize=None)
+def source_name(path):
+    return Path(path).name
 
-    # Convert current UTC time to the specified local timezone
-    local_tz = pytz.timezone(config.timezone_str)
-    local_time = current_time.astimezone(local_tz)
-    
-    # Current local time
-    timestamp_5  = local_time.strftime('%Y-%m-%d %H:%M:%S') + f'.{int(milliseconds * 100):02d}'
-    timestamp_6  = local_time.strftime('%Y-%m-%d %H:%M:%S') + f'.{int(milliseconds * 100):02d}' + " | " + config.symbol + ": "
-    
-    return timestamp_0, timestamp_1, timestamp_2, timestamp_3, timestamp_4, timestamp_5, timestamp_6
+# Timestamp and symbol that start every line of output and log, in UTC or in local time
+def prefix(local=False):
+    if local:
+        return clock.local(config.timezone_str) + " | " + config.symbol + ": "
+    return clock.utc() + " | " + config.symbol + ": "
+
+# Buffered writer of a log file, the exchange and error logs are rotated, the revenue log is read by analysis
+def log_file(path, rotate=True):
+    if rotate:
+        return logs.writer(path, config.log_rotate_size * 1048576, config.log_rotate_age * 3600, config.log_backups, config.log_flush)
+    return logs.writer(path, delay=config.log_flush)
 
 # Log all responses from exchange
 def log_exchange(response, message):
-    
-    # Create log message   
-    to_log = now_utc()[1] + message + "\n"
-    
-    # Extend log message based on error level
+
+    # Latency and rate limit status of this response
+    meta = last.__dict__.pop('response', {})
+
+    # Check if we can log
+    if not config.exchange_log:
+        return
+
+    # Create record, one JSON object per line
+    data   = response if isinstance(response, dict) else {}
+    result = data.get('result') if isinstance(data.get('result'), dict) else {}
+    record = {
+        'time'    : clock.utc(),
+        'ms'      : clock.milliseconds(),
+        'symbol'  : config.symbol,
+        'endpoint': str(message).rsplit("session: ", 1)[-1],
+        'latency' : meta.get('latency'),
+        'status'  : meta.get('status'),
+        'limit'   : meta.get('limit'),
+        'retCode' : data.get('retCode'),
+        'retMsg'  : data.get('retMsg')
+    }
+
+    # Orders of the response
+    if 'orderId' in result:
+        record['orderId'] = result['orderId']
+    elif isinstance(result.get('list'), list):
+        order_ids = [item['orderId'] for item in result['list'] if isinstance(item, dict) and 'orderId' in item]
+        if order_ids:
+            record['orderId'] = order_ids
+
+    # Extend record based on error level
     if config.error_level == 0:
-        to_log = message + "\n" + str(response) + "\n\n"
-    
+        record['response'] = response
+
     # Write to exchange log file
-    if config.exchange_log:    
-        with open(config.exchange_file, 'a', encoding='utf-8') as file:
-            file.write(to_log)
+    log_file(config.exchange_file).write(json.dumps(record, default=str) + "\n")
 
 # Log all errors
 def log_error(exception):
@@ -164,9 +147,6 @@ def log_error(exception):
     # Debug
     debug = False
 
-    # Declare global variables
-    global halt_sunflow
-    
     # Output debug
     if debug:
         defs.announce("Debug")
@@ -176,21 +156,16 @@ def log_error(exception):
        
     # Initialize variables
     halt_execution = True
-    stack          = inspect.stack()
-    call_frame     = stack[1]
-    filename       = Path(call_frame.filename).name
-    functionname   = call_frame.function
-    timestamp      = now_utc()[1]
+    call_frame     = sys._getframe(1)
+    filename       = source_name(call_frame.f_code.co_filename)
+    functionname   = call_frame.f_code.co_name
 
     # Safeguard from type errors
     exception = str(exception)
 
-    # Create message
-    message = timestamp + f"{filename}: {functionname}: {exception}"
-
     # Error: Dataframe failure
     if ("(30908)" in exception) or ("Length of values" in exception) or ("All arrays must be of the same length" in exception):
-        defs.announce(f"*** Warning: Dataframe issue for the {df_errors + 1} time! ***", True, 1)
+        defs.announce(f"*** Warning: Dataframe issue for the {context.current().df_errors + 1} time! ***", True, 1)
         halt_execution = False
 
     # Error: Remote disconnected
@@ -203,9 +178,17 @@ def log_error(exception):
         defs.announce("*** Warning: Read time out! ***", True, 1)
         halt_execution = False
     
-    # Write to error log file
-    with open(config.error_file, 'a', encoding='utf-8') as file:
-        file.write(message + "\n")
+    # Write to error log file, one JSON object per line
+    record = {
+        'time'    : clock.utc(),
+        'ms'      : clock.milliseconds(),
+        'symbol'  : config.symbol,
+        'file'    : filename,
+        'function': functionname,
+        'error'   : exception,
+        'halt'    : halt_execution
+    }
+    log_file(config.error_file).write(json.dumps(record) + "\n")
     
     # Output to stdout
     defs.announce(f"Exception: {exception}")
@@ -214,7 +197,7 @@ def log_error(exception):
     if halt_execution:
         defs.announce("*** Error: Terminating Sunflow! ***", True, 1)
         defs.announce(exception, True, 1)
-        halt_sunflow = True
+        context.current().halt_sunflow = True
 
 # Log revenue data
 def log_revenue(active_order, transaction, revenue, info, sides=True, extended=False):
@@ -226,7 +209,7 @@ def log_revenue(active_order, transaction, revenue, info, sides=True, extended=F
     message   = "Something went wrong while logging revenue..."
     divider   = "================================================================================\n"
     seperator = "\n----------------------------------------\n"
-    timestamp = defs.now_utc()[0]
+    timestamp = clock.utc()
     revenue   = defs.round_number(revenue, info['quotePrecision'])
 
     # Check if we can log
@@ -257,8 +240,7 @@ def log_revenue(active_order, transaction, revenue, info, sides=True, extended=F
         print(message)
     
     # Write to revenue log file
-    with open(config.revenue_file, 'a', encoding='utf-8') as file:
-        file.write(message + "\n")
+    log_file(config.revenue_file, False).write(message + "\n")
         
     # Return
     return
@@ -279,7 +261,7 @@ def report_buy(result):
     return pafa
 
 # Give an advice via the buy matrix
-def advice_buy(indicators_advice, orderbook_advice, trade_advice, pricelimit_advice, use_indicators, use_spread, use_orderbook, use_trade, use_pricelimit, spot, klines, all_buys, interval):
+def advice_buy(indicators_advice, orderbook_advice, trade_advice, pricelimit_advice, use_indicators, use_spread, use_orderbook, use_trade, use_pricelimit, spot, klines, streams, all_buys, interval):
 
     # Initialize variables
     spread_advice          = {}
@@ -291,7 +273,7 @@ def advice_buy(indicators_advice, orderbook_advice, trade_advice, pricelimit_adv
     
     if use_indicators['enabled']:
         indicators_advice[interval]['filled'] = True
-        technical_indicators                  = indicators.calculate(klines[interval], spot)
+        technical_indicators                  = indicators.calculate(klines[interval], spot, streams.get(interval))
         result                                = indicators.advice(technical_indicators)
         indicators_advice[interval]['value']  = result[0]
         indicators_advice[interval]['level']  = result[1]
@@ -539,14 +521,13 @@ def decide_buy(indicators_advice, use_indicators, spread_advice, use_spread, ord
     # Return result
     return can_buy, message, indicators_advice
 
-# Deal with API rate limit
+# Deal with API rate limit, the exchange session keeps requests within the limits, so this only warns and never waits
 def rate_limit(response):
     
     # Debug
     debug = False
     
     # Initialize variables
-    delay  = 0
     status = 0
     limit  = 0
     skip   = False
@@ -563,32 +544,30 @@ def rate_limit(response):
     # Continue when API Rate Limit is presence
     if not skip:
    
-        # Delay logic
+        # Used part of the limit
         ratio = (limit - status) / limit
-        if ratio > 0.5:
-            delay = delay + 0.1
-        if ratio > 0.7:
-            delay = delay + 0.3
-        if ratio > 0.8:
-            delay = delay + 0.6
-        if ratio > 0.9:
-            delay = delay + 1
 
         # Debug
         if debug:
-            defs.announce(f"Status is {status} and limit is {limit}, therefore API delay is set to {delay:.1f} seconds\n")
+            defs.announce(f"Status is {status} and limit is {limit}, {ratio * 100:.0f} % of the limit is used\n")
         
         # Hard exit
         if ratio > 1:
             defs.announce("f*** ERROR: API RATE LIMIT EXCEED, STOPPED TO PREVENT PERMANENT BAN! ***", True, 0)
-            defs.halt_sunflow = True
+            context.current().halt_sunflow = True
             exit()
         
-        # Inform of delay
-        if delay:
-            defs.announce(f"*** WARNING: API RATE LIMIT HIT, DELAYING SUNFLOW {delay} SECONDS! ***", True, 1)
-            time.sleep(delay)
+        # Inform when the limit is used up, the exchange session holds back requests of this kind until it is reset
+        if status < 1:
+            defs.announce("*** Warning: API rate limit reached, requests of this kind wait until it is reset! ***")
     
+    # Keep latency and rate limit status for the exchange log
+    try:
+        latency = round(response[1].total_seconds() * 1000, 1)
+    except (AttributeError, IndexError, TypeError):
+        latency = None
+    last.response = {'latency': latency, 'status': None if skip else status, 'limit': None if skip else limit}
+
     # Clean response data
     data = response[0]
 
@@ -628,7 +607,7 @@ def calc_compounding(info, spot, compounding):
     # Debug and speed
     debug = False
     speed = True
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
     
     # Calculate ratio
     compounding_ratio = compounding['now'] / compounding['start']
@@ -661,29 +640,25 @@ def announce_helper(enabled, config_level, message_level, tag, message):
     
     # Do logic
     if enabled and message_level >= config_level:
-        apobj.notify(
-            body  = message,
-            title = "Sunflow Cryptobot",
-            tag   = tag
-        )
+        context.current().notifier.notify(tag, message)
     
     # Close function and return
     return
 
 # Send out a notification via stdout or Apprise
 def announce(message, to_group_1=False, level_1=1, to_group_2=False, level_2=1):
+
+    # Stay silent, for example when backtesting
+    if context.current().quiet:
+        return str(message)
    
     # Initialize variables
-    stack        = inspect.stack()
-    call_frame   = stack[1]
-    filename     = Path(call_frame.filename).name
-    functionname = call_frame.function
+    call_frame   = sys._getframe(1)
+    filename     = source_name(call_frame.f_code.co_filename)
+    functionname = call_frame.f_code.co_name
     
     # Local or UTC time
-    if config.timeutc_std:
-        timestamp = now_utc()[1]
-    else:
-        timestamp = now_utc()[6]
+    timestamp = prefix(not config.timeutc_std)
 
     # Safeguard from type errors
     message = str(message)
@@ -705,7 +680,7 @@ def announce(message, to_group_1=False, level_1=1, to_group_2=False, level_2=1):
     
     # Output to stdout, we do not display group 2 active messages 
     if not to_group_2:
-        print(screen_message + "\n")
+        context.current().notifier.write(screen_message + "\n")
     
     # Output to Apprise Group 1 (Usually Telegram)
     if to_group_1:
@@ -785,6 +760,10 @@ def scientific_to_decimal_str(number):
     
 # Calculates the closest index
 def get_closest_index(data, span):
+
+    # Binary search on time indexed buffers
+    if isinstance(data, buffers.PriceBuffer):
+        return data.index_at(span)
     
     # Find the closest index in the time {timeframe}
     closest_index = None
@@ -911,7 +890,7 @@ def report_exec(start_time, supplement = "", always_display = False):
     message    = ""
     mess_delay = config.func_norm_delay
     warn_delay = config.func_warn_delay
-    end_time   = now_utc()[4]
+    end_time   = clock.monotonic()
     exec_time  = end_time - start_time
     
     # Overrule always_display
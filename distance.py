@@ -3,21 +3,11 @@
 # Calculate trigger price distance
 
 # Load libraries
-from loader import load_config
-import defs, math, preload
+import clock, context, defs, math, preload
 import pandas as pd, pandas_ta as ta
 
-# Load config
-config = load_config()
-
-# Initialize ATR timer
-atr_timer             = {}
-atr_timer['check']    = False
-atr_timer['time']     = 0
-atr_timer['interval'] = 60000
-
-# Initialize ATR Klines
-atr_klines = {'time': [], 'open': [], 'high': [], 'low': [], 'close': [], 'volume': [], 'turnover': []}
+# Config of the bot
+config = context.config
 
 # Calculate ATR as percentage
 def calculate_atr():
@@ -25,14 +15,15 @@ def calculate_atr():
     # Debug
     debug = False
 
-    # Declare ATR timer and klines variables global
-    global atr_timer, atr_klines
+    # ATR timer and klines are kept in the context of the bot
+    bot       = context.current()
+    atr_timer = bot.atr_timer
 
     # Initialize variables
     get_atr_klines = False
 
     # Check every interval
-    current_time = defs.now_utc()[4]
+    current_time = clock.milliseconds()
     if atr_timer['check']:
         atr_timer['check'] = False
         atr_timer['time']  = current_time
@@ -44,22 +35,22 @@ def calculate_atr():
 
     # Get ATR klines if required
     if get_atr_klines:
-        start_time = defs.now_utc()[4]
-        atr_klines = preload.get_klines(config.symbol, 1, config.limit)
-        end_time   = defs.now_utc()[4]
+        start_time = clock.monotonic()
+        bot.atr_klines = preload.get_klines(config.symbol, 1, config.limit)
+        end_time   = clock.monotonic()
         defs.announce(f"Received {config.limit} ATR klines in {end_time - start_time}ms")
     
     # Initialize dataframe
-    df = pd.DataFrame(atr_klines)
+    df = pd.DataFrame(bot.atr_klines.views())
     
     # Calculate ATR and ATR percentage
-    start_time     = defs.now_utc()[4]
+    start_time     = clock.monotonic()
     df['ATR']      = ta.atr(df['high'], df['low'], df['close'], length=14)
     df['ATRP']     = (df['ATR'] / df['close']) * 100
     atr_percentage = df['ATRP'].iloc[-1]
     atr_perc_avg   = df['ATRP'].mean()
     atr_multiplier = atr_percentage / atr_perc_avg
-    end_time       = defs.now_utc()[4]
+    end_time       = clock.monotonic()
 
     # Report ATR data
     if get_atr_klines:
@@ -325,12 +316,11 @@ def distance_atr(active_order, prices, price_distance):
     return active_order
 
 # Calculate trigger price distance
+@context.timed("distance")
 def calculate(active_order, prices):
 
-    # Debug and speed
+    # Debug
     debug = False
-    speed = True
-    stime = defs.now_utc()[4]
 
     # Store previous fluctuation
     previous_fluctuation = active_order['fluctuation']
@@ -369,8 +359,5 @@ def calculate(active_order, prices):
     if previous_fluctuation != active_order['fluctuation']:
         defs.announce(f"Adviced trigger price distance is now {active_order['fluctuation']:.4f} %")
 
-    # Report execution time
-    if speed: defs.announce(defs.report_exec(stime))
-
     # Return modified data
     return active_order
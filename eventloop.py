@@ -0,0 +1,155 @@
+### Sunflow Cryptobot ###
+#
+# Event loop that feeds websocket messages to the strategy
+
+# Load external libraries
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio, itertools, time, traceback
+
+# Load internal libraries
+import defs
+
+# Websocket threads only put messages on a bounded queue per stream. One strategy task takes the messages out in
+# order of arrival and runs the handlers one at a time on a single worker thread, so handlers never run at the same
+# time. Handlers do not wait for the exchange, orders are order flows that continue when the order worker is done and
+# orderbook snapshots are loaded on a thread of their own, so market data keeps being handled meanwhile. Timers run on
+# the same worker thread, between two messages.
+class Runtime:
+
+    # Initialize runtime, initializer runs first on the worker thread, stages records the latency of the handlers
+    def __init__(self, maxsize=1000, initializer=None, stages=None):
+        self.maxsize  = maxsize
+        self.stages   = stages
+        self.streams  = {}
+        self.timers   = []
+        self.tasks    = []
+        self.sequence = itertools.count()
+        self.dropped  = 0
+        self.received = None
+        self.loop     = None
+        self.wakeup   = None
+        self.finished = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="strategy", initializer=initializer)
+
+    # Register a stream, when coalesce is set only the newest waiting message is handled and skip() gets the others
+    def stream(self, name, handler, coalesce=False, skip=None):
+        self.streams[name] = {'handler': handler, 'coalesce': coalesce, 'skip': skip, 'queue': deque(), 'wait': f"receive.{name}", 'run': f"handler.{name}", 'handled': 0, 'skipped': 0, 'dropped': 0}
+
+    # Register a timer
+    def every(self, seconds, callback):
+        self.timers.append((seconds, callback))
+
+    # Callback for a websocket subscription
+    def callback(self, name):
+        return lambda message: self.post(name, message)
+
+    # Post message to a stream, can be called from any thread
+    def post(self, name, message):
+        self.loop.call_soon_threadsafe(self.put, name, message)
+
+    # Put message on the queue of a stream, drops the oldest message when full
+    def put(self, name, message):
+        stream = self.streams[name]
+        queue  = stream['queue']
+        if len(queue) >= self.maxsize:
+            queue.popleft()
+            self.dropped      += 1
+            stream['dropped'] += 1
+            if self.dropped % 100 == 1:
+                defs.announce(f"*** Warning: Strategy can't keep up, dropped {self.dropped} messages so far! ***")
+        queue.append((next(self.sequence), time.perf_counter(), message))
+        self.wakeup.set()
+
+    # Take the oldest message of all streams
+    def take(self):
+
+        # Find stream with the oldest message
+        waiting = [stream for stream in self.streams.values() if stream['queue']]
+        if not waiting:
+            return None
+        stream = min(waiting, key=lambda stream: stream['queue'][0][0])
+
+        # Get message, or the newest when coalescing
+        skipped = []
+        _, received, message = stream['queue'].popleft()
+        if stream['coalesce']:
+            while stream['queue']:
+                skipped.append(message)
+                _, received, message = stream['queue'].popleft()
+
+        # Return message
+        return stream, skipped, received, message
+
+    # Run on the worker thread, errors are reported and never stop the runtime
+    def execute(self, function, *args):
+        try:
+            function(*args)
+        except Exception as e:
+            tb_info = traceback.extract_tb(e.__traceback__)
+            frame_summary = tb_info[-1]
+            line = frame_summary.lineno
+            defs.announce(f"*** Error: Failure at line {line}: {e} ***")
+
+    # Handle message, skipped messages first, received is the perf_counter() time the message was queued
+    def handle(self, stream, skipped, received, message):
+        self.received      = received
+        stream['handled'] += 1
+        stream['skipped'] += len(skipped)
+        if self.stages is not None:
+            self.stages.record(stream['wait'], (time.perf_counter() - received) * 1000000)
+        if stream['skip']:
+            for item in skipped:
+                stream['skip'](item)
+        if self.stages is None:
+            stream['handler'](message)
+            return
+        with self.stages.time(stream['run']):
+            stream['handler'](message)
+
+    # Strategy task
+    async def strategy(self):
+        while True:
+            item = self.take()
+            if item is None:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            await self.loop.run_in_executor(self.executor, self.execute, self.handle, *item)
+
+    # Timer task
+    async def timer(self, seconds, callback):
+        while True:
+            await asyncio.sleep(seconds)
+            await self.loop.run_in_executor(self.executor, self.execute, callback)
+
+    # Start tasks and wait until stopped
+    async def main(self, start):
+
+        # Initialize loop
+        self.loop     = asyncio.get_running_loop()
+        self.wakeup   = asyncio.Event()
+        self.finished = asyncio.Event()
+
+        # Start, for example connect websockets
+        await self.loop.run_in_executor(self.executor, start)
+
+        # Run strategy and timers
+        self.tasks = [asyncio.create_task(self.strategy())]
+        for seconds, callback in self.timers:
+            self.tasks.append(asyncio.create_task(self.timer(seconds, callback)))
+        await self.finished.wait()
+
+        # Stop tasks
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    # Run until stopped
+    def run(self, start):
+        asyncio.run(self.main(start))
+        self.executor.shutdown(wait=True)
+
+    # Stop runtime, can be called from any thread
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.finished.set)
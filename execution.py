@@ -0,0 +1,179 @@
+### Sunflow Cryptobot ###
+#
+# Order execution worker
+
+# Load libraries
+from collections import deque
+import threading, time
+
+# Request of an order flow, yield from it inside a flow to run function on the worker. The flow continues with the
+# result when the worker is done, an error is raised again inside the flow.
+def request(name, function, *args, **kwargs):
+    command = yield name, lambda: function(*args, **kwargs)
+    if command['error'] is not None:
+        raise command['error']
+    return command['result']
+
+# All REST calls for orders run in order on one worker thread. Amends are submitted and the strategy continues, the
+# completed command is posted back to the strategy. An amend that is still waiting is replaced by a newer amend with
+# the same key, so only the latest trigger price is sent. Placing, cancelling and checking orders are order flows,
+# generators that yield their REST calls with request(). begin() runs a flow on the strategy thread up to its first
+# request and resume() continues it when the worker posts the request back, so the strategy never waits for the
+# exchange. One flow runs at a time, complete() runs a flow to the end and waits for every request. When inline is
+# set, for example when backtesting, commands are executed right away on the calling thread and flows run to the end.
+class OrderWorker:
+
+    # Initialize worker, initializer runs first on the worker thread
+    def __init__(self, initializer=None):
+        self.post      = None                    # Gets completed commands, for example runtime.callback('orders')
+        self.tick      = None                    # Time the ticker that is handled now was received
+        self.inline    = False                   # Execute commands right away instead of on the worker thread
+        self.commands  = deque()
+        self.pending   = {}
+        self.condition = threading.Condition()
+        self.latencies = deque(maxlen=1000)
+        self.counts    = {}                      # Executed commands by name and result
+        self.replaced  = 0                       # Waiting amends replaced by a newer one
+        self.thread    = None
+        self.flow      = None                    # Order flow that waits for the worker
+        self.init      = initializer
+
+    # Start worker thread
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="orders", daemon=True)
+        self.thread.start()
+
+    # Queue command, the result is posted when done
+    def submit(self, name, function, *args, key=None, wait=False, flow=False):
+
+        # Create command
+        command = {
+            'name'    : name,
+            'function': function,
+            'args'    : args,
+            'key'     : key,
+            'received': self.tick,
+            'result'  : None,
+            'error'   : None,
+            'wait'    : wait,
+            'flow'    : flow,
+            'done'    : threading.Event()
+        }
+
+        # Execute right away
+        if self.inline:
+            self.execute(command)
+            return command
+
+        # Replace a waiting command with the same key, keep its place and the time of the first ticker
+        with self.condition:
+            if self.thread is None:
+                self.start()
+            if key is not None and key in self.pending:
+                waiting             = self.pending[key]
+                waiting['function'] = function
+                waiting['args']     = args
+                self.replaced      += 1
+                return waiting
+            if key is not None:
+                self.pending[key] = command
+            self.commands.append(command)
+            self.condition.notify()
+
+        # Return command
+        return command
+
+    # Run flow up to its first request, the rest follows in resume(), when inline it runs to the end right away
+    def begin(self, flow):
+        if self.inline:
+            self.complete(flow)
+            return
+        self.flow = flow
+        self.resume(None)
+
+    # Continue the flow with its completed request and submit the next request, errors of the flow are raised again
+    def resume(self, command):
+        try:
+            name, function = self.flow.send(command)
+        except StopIteration:
+            self.flow = None
+            return
+        except Exception:
+            self.flow = None
+            raise
+        self.submit(name, function, flow=True)
+
+    # Run flow to the end and return its result, waits for every request
+    def complete(self, flow):
+        command = None
+        while True:
+            try:
+                name, function = flow.send(command)
+            except StopIteration as stop:
+                return stop.value
+            command = self.submit(name, function, wait=True)
+            command['done'].wait()
+
+    # Worker thread
+    def run(self):
+        if self.init:
+            self.init()
+        while True:
+
+            # Get next command
+            with self.condition:
+                while not self.commands:
+                    self.condition.wait()
+                command = self.commands.popleft()
+                if command['key'] is not None:
+                    del self.pending[command['key']]
+
+            # Execute command
+            self.execute(command)
+
+    # Execute command and report back
+    def execute(self, command):
+
+        # Execute command
+        try:
+            command['result'] = command['function'](*command['args'])
+        except Exception as e:
+            command['error'] = e
+
+        # Count command
+        counted = (command['name'], "ok" if command['error'] is None else "error")
+        with self.condition:
+            self.counts[counted] = self.counts.get(counted, 0) + 1
+
+        # Measure ticker to amend latency
+        if command['received'] is not None and command['name'].startswith("amend"):
+            with self.condition:
+                self.latencies.append((time.perf_counter() - command['received']) * 1000)
+
+        # Report back
+        command['done'].set()
+        if not command['wait'] and self.post:
+            self.post(command)
+
+    # Percentiles of ticker to amend latency in ms
+    def percentiles(self):
+        with self.condition:
+            values = sorted(self.latencies)
+        if not values:
+            return {}
+        return {
+            'count': len(values),
+            'p50'  : values[int(0.50 * (len(values) - 1))],
+            'p90'  : values[int(0.90 * (len(values) - 1))],
+            'p99'  : values[int(0.99 * (len(values) - 1))],
+            'max'  : values[-1]
+        }
+
+    # Report ticker to amend latency
+    def report(self):
+        latency = self.percentiles()
+        if not latency:
+            return "No amends measured yet"
+        message = f"Ticker to amend latency over {latency['count']} amends: p50 {latency['p50']:.0f} ms, "
+        message = message + f"p90 {latency['p90']:.0f} ms, p99 {latency['p99']:.0f} ms, max {latency['max']:.0f} ms"
+        return message
@@ -0,0 +1,466 @@
+### Sunflow Cryptobot ###
+#
+# Incremental technical indicators, keeps running state per indicator so a new kline costs O(1)
+
+# Load libraries
+from collections import deque
+import math, sys
+
+# Initialize variables
+nan     = math.nan
+epsilon = sys.float_info.epsilon
+
+# Divide like pandas does, no exceptions but inf or nan
+def divide(numerator, denominator):
+
+    # Logic
+    if denominator == 0:
+        if numerator == 0 or math.isnan(numerator):
+            return nan
+        return math.copysign(math.inf, numerator)
+
+    # Return result
+    return numerator / denominator
+
+# Range that never is zero, same as non_zero_range() of pandas_ta
+def non_zero(value):
+
+    # Logic
+    if value == 0:
+        value = epsilon
+
+    # Return value
+    return value
+
+# Wilder smoothing, equals pandas_ta rma() which is ewm(alpha=1/length, min_periods=length) with adjust
+class Rma:
+
+    # Initialize running state
+    def __init__(self, length):
+        self.length = length
+        self.decay  = 1 - (1 / length)
+        self.num    = 0.0
+        self.den    = 0.0
+        self.count  = 0
+
+    # Value including x, only store x when commit is True
+    def step(self, x, commit=False):
+
+        # Missing values only decay older values
+        if math.isnan(x):
+            if commit and self.count:
+                self.num = self.decay * self.num
+                self.den = self.decay * self.den
+            if self.count < self.length:
+                return nan
+            return self.num / self.den
+
+        # Add value to recurrence
+        num   = x + self.decay * self.num
+        den   = 1 + self.decay * self.den
+        count = self.count + 1
+        if commit:
+            self.num   = num
+            self.den   = den
+            self.count = count
+
+        # Return smoothed value
+        if count < self.length:
+            return nan
+        return num / den
+
+# Exponential moving average seeded with a simple moving average, equals pandas_ta ema()
+class Ema:
+
+    # Initialize running state
+    def __init__(self, length):
+        self.length = length
+        self.alpha  = 2 / (length + 1)
+        self.total  = 0.0
+        self.value  = nan
+        self.count  = 0
+
+    # Value including x, only store x when commit is True
+    def step(self, x, commit=False):
+
+        # Leading missing values are skipped
+        if math.isnan(x):
+            return self.value
+
+        # Seed with average or continue recurrence
+        count = self.count + 1
+        total = self.total
+        value = nan
+        if count < self.length:
+            total = total + x
+        elif count == self.length:
+            value = (total + x) / self.length
+        else:
+            value = self.alpha * x + (1 - self.alpha) * self.value
+
+        # Store state
+        if commit:
+            self.count = count
+            self.total = total
+            self.value = value
+
+        # Return average
+        return value
+
+# Exponential moving average over exactly the last {window} values, pandas_ta seeds it with the average of
+# the first {length} values of the window, so with long lengths the seed still matters. Keeps a weighted sum
+# that can be shifted in O(1) when the window slides.
+class WindowEma:
+
+    # Initialize running state
+    def __init__(self, length, window):
+        self.length  = length
+        self.window  = window
+        self.alpha   = 2 / (length + 1)
+        self.decay   = 1 - self.alpha
+        self.values  = deque(maxlen=max(window - 1, 0))
+        self.seed    = 0.0
+        self.sum     = 0.0
+        self.shifts  = 0
+        self.f_seed  = self.decay ** max(window - length, 0)
+        self.f_drop  = self.decay ** max(window - 2 - length, 0)
+
+    # Recalculate seed and weighted sum from the stored values
+    def rebuild(self):
+        values      = list(self.values)
+        self.seed   = sum(values[:self.length])
+        self.sum    = 0.0
+        for value in values[self.length:]:
+            self.sum = self.decay * self.sum + value
+        self.shifts = 0
+
+    # Value including x as last value of the window, only store x when commit is True
+    def step(self, x, commit=False):
+
+        # Calculate average
+        value = nan
+        if len(self.values) == self.window - 1 and self.length < self.window:
+            value = self.f_seed * (self.seed / self.length) + self.alpha * (self.decay * self.sum + x)
+
+        # Store state and slide window
+        if commit:
+            if len(self.values) == self.values.maxlen and self.length < self.window - 1:
+                self.seed = self.seed - self.values[0] + self.values[self.length]
+                self.sum  = self.decay * (self.sum - self.f_drop * self.values[self.length]) + x
+                self.values.append(x)
+                self.shifts += 1
+                if self.shifts >= self.window:
+                    self.rebuild()
+            else:
+                self.values.append(x)
+                if len(self.values) == self.values.maxlen:
+                    self.rebuild()
+
+        # Return average
+        return value
+
+# Last {length - 1} committed values, so that together with the provisional value a full window is formed
+class Window:
+
+    # Initialize running state
+    def __init__(self, length):
+        self.length = length
+        self.values = deque(maxlen=length - 1)
+        self.total  = 0.0
+        self.nans   = 0
+        self.pushes = 0
+
+    # Is the window including one more value complete and valid
+    def valid(self, x):
+        return len(self.values) == self.length - 1 and not self.nans and not math.isnan(x)
+
+    # Sum including x
+    def sum(self, x):
+        if not self.valid(x):
+            return nan
+        return self.total + x
+
+    # Average including x
+    def mean(self, x):
+        return self.sum(x) / self.length
+
+    # Maximum including x
+    def max(self, x):
+        if not self.valid(x):
+            return nan
+        return max(max(self.values, default=x), x)
+
+    # Minimum including x
+    def min(self, x):
+        if not self.valid(x):
+            return nan
+        return min(min(self.values, default=x), x)
+
+    # Store x
+    def push(self, x):
+
+        # Nothing to store
+        if self.length == 1:
+            return
+
+        # Remove oldest value
+        if len(self.values) == self.values.maxlen:
+            oldest = self.values[0]
+            if math.isnan(oldest):
+                self.nans -= 1
+            else:
+                self.total -= oldest
+
+        # Add newest value
+        self.values.append(x)
+        if math.isnan(x):
+            self.nans += 1
+        else:
+            self.total += x
+
+        # Prevent drift of the running total
+        self.pushes += 1
+        if self.pushes >= 1000:
+            self.pushes = 0
+            self.total  = sum(value for value in self.values if not math.isnan(value))
+
+# All technical indicators used by indicators.py for one interval
+class Indicators:
+
+    # Initialize from preloaded klines buffer, the last kline is the provisional (unconfirmed) one
+    def __init__(self, klines):
+
+        # Window length equals number of klines pandas_ta would see
+        window = len(klines)
+
+        # Previous committed kline, provisional kline and cached output
+        self.window      = window
+        self.previous    = None
+        self.provisional = None
+        self.cache       = None
+        self.last        = {'ao': nan, 'momentum': nan, 'macd_histogram': nan}
+
+        # Relative Strength Index and Stochastic RSI
+        self.rsi_pos     = Rma(14)
+        self.rsi_neg     = Rma(14)
+        self.rsi_values  = Window(14)
+        self.srsi_k      = Window(3)
+        self.srsi_d      = Window(3)
+
+        # Commodity Channel Index
+        self.cci         = deque(maxlen=19)
+
+        # Awesome Oscillator and Momentum
+        self.ao_fast     = Window(5)
+        self.ao_slow     = Window(34)
+        self.momentum    = deque(maxlen=10)
+
+        # Williams %R and Stochastic
+        self.highs       = Window(14)
+        self.lows        = Window(14)
+        self.stoch_k     = Window(3)
+        self.stoch_d     = Window(3)
+
+        # Ultimate Oscillator
+        self.uo_bp       = {7: Window(7), 14: Window(14), 28: Window(28)}
+        self.uo_tr       = {7: Window(7), 14: Window(14), 28: Window(28)}
+
+        # MACD
+        self.macd_fast   = Ema(12)
+        self.macd_slow   = Ema(26)
+        self.macd_signal = Ema(9)
+
+        # Average Directional Index
+        self.adx_tr      = Rma(14)
+        self.adx_pos     = Rma(14)
+        self.adx_neg     = Rma(14)
+        self.adx_dx      = Rma(14)
+
+        # Moving averages
+        self.lengths     = [10, 20, 30, 50, 100, 200]
+        self.ema         = {length: WindowEma(length, window) for length in self.lengths}
+        self.sma         = {length: Window(length) for length in self.lengths}
+
+        # Feed the klines
+        for kline in klines.rows():
+            self.update(kline)
+
+    # New kline from websocket, same start time replaces the provisional kline, a later one commits it
+    def update(self, kline):
+
+        # Commit provisional kline when a new one starts
+        if self.provisional is not None:
+            if kline['time'] < self.provisional['time']:
+                return
+            if kline['time'] > self.provisional['time']:
+                self.step(self.provisional, True)
+                self.previous = self.provisional
+
+        # Replace provisional kline
+        self.provisional = kline
+        self.cache       = None
+
+    # Technical indicator values including the provisional kline
+    def values(self):
+        if self.cache is None:
+            self.cache = self.step(self.provisional, False)
+        return self.cache
+
+    # Calculate all indicators for kline, and store it into the running state when commit is True
+    def step(self, kline, commit):
+
+        # Initialize variables
+        values   = {}
+        high     = kline['high']
+        low      = kline['low']
+        close    = kline['close']
+        previous = self.previous
+
+        # Relative Strength Index
+        if previous is None:
+            change = nan
+            pos    = nan
+            neg    = nan
+        else:
+            change = close - previous['close']
+            pos    = max(change, 0.0)
+            neg    = -min(change, 0.0)
+        pos_avg = self.rsi_pos.step(pos, commit)
+        neg_avg = self.rsi_neg.step(neg, commit)
+        rsi     = 100 * divide(pos_avg, pos_avg + abs(neg_avg))
+        values['rsi'] = rsi
+
+        # Stochastic RSI Fast
+        rsi_high  = self.rsi_values.max(rsi)
+        rsi_low   = self.rsi_values.min(rsi)
+        srsi      = 100 * (rsi - rsi_low) / non_zero(rsi_high - rsi_low)
+        srsi_k    = self.srsi_k.mean(srsi)
+        srsi_d    = self.srsi_d.mean(srsi_k)
+        values['stochrsi_k'] = srsi_k
+        values['stochrsi_d'] = srsi_d
+
+        # Commodity Channel Index
+        typical = (high + low + close) / 3
+        cci     = nan
+        if len(self.cci) == 19:
+            window = [*self.cci, typical]
+            mean   = sum(window) / 20
+            mad    = sum(abs(value - mean) for value in window) / 20
+            cci    = divide(typical - mean, 0.015 * mad)
+        values['cci'] = cci
+
+        # Awesome Oscillator
+        median = (high + low) / 2
+        values['ao']      = self.ao_fast.mean(median) - self.ao_slow.mean(median)
+        values['ao_prev'] = self.last['ao']
+
+        # Momentum
+        momentum = nan
+        if len(self.momentum) == 10:
+            momentum = close - self.momentum[0]
+        values['momentum']      = momentum
+        values['momentum_prev'] = self.last['momentum']
+
+        # Williams %R
+        highest = self.highs.max(high)
+        lowest  = self.lows.min(low)
+        values['williamsr'] = 100 * (divide(close - lowest, highest - lowest) - 1)
+
+        # Stochastic % K
+        stoch   = 100 * (close - lowest) / non_zero(highest - lowest)
+        stoch_k = self.stoch_k.mean(stoch)
+        stoch_d = self.stoch_d.mean(stoch_k)
+        values['stoch_k'] = stoch_k
+        values['stoch_d'] = stoch_d
+
+        # Ultimate Oscillator
+        if previous is None:
+            max_high = high
+            min_low  = low
+        else:
+            max_high = max(high, previous['close'])
+            min_low  = min(low, previous['close'])
+        buying   = close - min_low
+        true_uo  = max_high - min_low
+        average  = {length: divide(self.uo_bp[length].sum(buying), self.uo_tr[length].sum(true_uo)) for length in (7, 14, 28)}
+        values['uo'] = 100 * (4 * average[7] + 2 * average[14] + average[28]) / 7
+
+        # MACD
+        fast      = self.macd_fast.step(close, commit)
+        slow      = self.macd_slow.step(close, commit)
+        macd      = fast - slow
+        signal    = self.macd_signal.step(macd, commit)
+        histogram = macd - signal
+        values['macd']                = macd
+        values['macd_signal']         = signal
+        values['macd_histogram']      = histogram
+        values['macd_histogram_prev'] = self.last['macd_histogram']
+
+        # Average Directional Index
+        if previous is None:
+            true_range = nan
+            dm_pos     = nan
+            dm_neg     = nan
+        else:
+            true_range = max(high - low, abs(high - previous['close']), abs(previous['close'] - low))
+            up         = high - previous['high']
+            down       = previous['low'] - low
+            dm_pos     = up if (up > down and up > 0) else 0.0
+            dm_neg     = down if (down > up and down > 0) else 0.0
+            if abs(dm_pos) < epsilon: dm_pos = 0.0
+            if abs(dm_neg) < epsilon: dm_neg = 0.0
+        atr = self.adx_tr.step(true_range, commit)
+        dmp = divide(100, atr) * self.adx_pos.step(dm_pos, commit)
+        dmn = divide(100, atr) * self.adx_neg.step(dm_neg, commit)
+        dx  = 100 * divide(abs(dmp - dmn), dmp + dmn)
+        values['adx'] = self.adx_dx.step(dx, commit)
+        values['dmp'] = dmp
+        values['dmn'] = dmn
+
+        # Moving averages
+        for length in self.lengths:
+            values[f"EMA{length}"] = self.ema[length].step(close, commit)
+            values[f"SMA{length}"] = self.sma[length].mean(close)
+
+        # Store kline in running state
+        if commit:
+            self.rsi_values.push(rsi)
+            self.srsi_k.push(srsi)
+            self.srsi_d.push(srsi_k)
+            self.cci.append(typical)
+            self.ao_fast.push(median)
+            self.ao_slow.push(median)
+            self.momentum.append(close)
+            self.highs.push(high)
+            self.lows.push(low)
+            self.stoch_k.push(stoch)
+            self.stoch_d.push(stoch_k)
+            for length in (7, 14, 28):
+                self.uo_bp[length].push(buying)
+                self.uo_tr[length].push(true_uo)
+            for length in self.lengths:
+                self.sma[length].push(close)
+            self.last['ao']             = values['ao']
+            self.last['momentum']       = momentum
+            self.last['macd_histogram'] = histogram
+
+        # Return indicator values
+        return values
+
+# Indicator values that were calculated before, one row per kline update, used instead of Indicators when many
+# backtests replay the same klines
+class Series:
+
+    # Initialize from names and rows of values, the first row is the state before the first update
+    def __init__(self, names, rows):
+        self.names = names
+        self.rows  = rows
+        self.index = 0
+
+    # Next kline update
+    def update(self, kline):
+        self.index += 1
+
+    # Technical indicator values of the current kline update
+    def values(self):
+        return dict(zip(self.names, self.rows[self.index].tolist()))
@@ -3,22 +3,22 @@
 # Calculate technical indicators
 
 # Load libraries
-import defs
+import clock, context, defs
 import pandas as pd, pandas_ta as ta
 
-# Calculcate indicators based on klines
-def calculate(klines, spot):
+# Calculcate indicator values based on klines via pandas_ta
+def calculate_pandas(klines):
     
     # Debug
     debug = False
     
     # Initialize variables
-    indicators = {}
-    df = pd.DataFrame(klines)
+    values = {}
+    df     = pd.DataFrame(klines.views())
 
     # Calculate start and end times    
     if debug:
-        start_time = defs.now_utc()[4]
+        start_time = clock.monotonic()
         defs.announce("Calculating indicators")
         
     # Indicators: Calculate various Oscillators
@@ -85,10 +85,88 @@ def calculate(klines, spot):
         print("Average Directional Index")
         print(adx_result)
 
+    ## Collect last values, the same as incremental.Indicators.values() returns
+    values['rsi']                 = df['RSI'].iloc[-1]
+    values['stoch_k']             = stoch_k['k'].iloc[-1]
+    values['stoch_d']             = stoch_k['d'].iloc[-1]
+    values['cci']                 = df['CCI'].iloc[-1]
+    values['adx']                 = adx['adx'].iloc[-1]
+    values['dmp']                 = adx['dmp'].iloc[-1]
+    values['dmn']                 = adx['dmn'].iloc[-1]
+    values['ao']                  = df['AO'].iloc[-1]
+    values['ao_prev']             = df['AO'].iloc[-2]
+    values['momentum']            = df['Momentum'].iloc[-1]
+    values['momentum_prev']       = df['Momentum'].iloc[-2]
+    values['macd']                = macd['macd'].iloc[-1]
+    values['macd_signal']         = macd['signal'].iloc[-1]
+    values['macd_histogram']      = macd['histogram'].iloc[-1]
+    values['macd_histogram_prev'] = macd['histogram'].iloc[-2]
+    values['stochrsi_k']          = stoch_rsi['k'].iloc[-1]
+    values['stochrsi_d']          = stoch_rsi['d'].iloc[-1]
+    values['williamsr']           = df['WilliamsR'].iloc[-1]
+    values['uo']                  = df['UO'].iloc[-1]
+    for average in ['EMA10', 'SMA10', 'EMA20', 'SMA20', 'EMA30', 'SMA30', 'EMA50', 'SMA50', 'EMA100', 'SMA100', 'EMA200', 'SMA200']:
+        values[average] = df[average].iloc[-1]
+
+    # Output to stdout
+    if debug:
+        end_time = clock.monotonic()
+        defs.announce(f"Pandas_ta spent {end_time - start_time}ms calculating indicators")
+
+    # Return values
+    return values
+
+# Compare incremental indicators to pandas_ta and report differences
+def compare(klines, values, tolerance=1e-6):
+
+    # Initialize variables
+    reference   = calculate_pandas(klines)
+    differences = []
+
+    # Compare every indicator value
+    for key, value in reference.items():
+        if pd.isna(value) and pd.isna(values[key]):
+            continue
+        error = abs(value - values[key]) / max(1, abs(value))
+        if not error <= tolerance:
+            differences.append(f"{key} {values[key]} instead of {value}")
+
+    # Output to stdout
+    if differences:
+        defs.announce(f"*** Warning: Incremental indicators differ from pandas_ta: {', '.join(differences)} ***")
+    else:
+        defs.announce("Incremental indicators match pandas_ta")
+
+    # Return differences
+    return differences
+
+# Calculcate indicators based on klines, when stream is given its running state is used instead of pandas_ta
+@context.timed("indicators")
+def calculate(klines, spot, stream=None):
+    
+    # Debug
+    debug = False
+    
+    # Initialize variables
+    indicators = {}
+
+    # Calculate start and end times    
+    if debug:
+        start_time = clock.monotonic()
+        defs.announce("Calculating indicators")
+
+    # Get indicator values from running state or recalculate all of them
+    if stream:
+        values = stream.values()
+        if debug:
+            compare(klines, values)
+    else:
+        values = calculate_pandas(klines)
+
     ## Determine advice per indicator
 
     # RSI Oscillator
-    rsi = df['RSI'].iloc[-1]
+    rsi = values['rsi']
     bsn = 'N'
     if rsi > 70:bsn = 'S'
     if rsi < 30:bsn = 'B'
@@ -96,14 +174,14 @@ def calculate(klines, spot):
 
     # Stochastic % K Oscillator
     bsn = 'N'
-    if stoch_k['k'].iloc[-1] < 20:
-        if stoch_k['k'].iloc[-1] > stoch_k['d'].iloc[-1]: bsn = 'B'
-    if stoch_k['k'].iloc[-1] > 80:
-        if stoch_k['k'].iloc[-1] < stoch_k['d'].iloc[-1]: bsn = 'S'
-    indicators['stochk'] = [{stoch_k['k'].iloc[-1], stoch_k['d'].iloc[-1]}, bsn, 'O']
+    if values['stoch_k'] < 20:
+        if values['stoch_k'] > values['stoch_d']: bsn = 'B'
+    if values['stoch_k'] > 80:
+        if values['stoch_k'] < values['stoch_d']: bsn = 'S'
+    indicators['stochk'] = [{values['stoch_k'], values['stoch_d']}, bsn, 'O']
 
     # CCI Oscillator
-    cci = df['CCI'].iloc[-1]
+    cci = values['cci']
     bsn = 'N'
     if rsi < -100:bsn = 'S'
     if rsi > 100 :bsn = 'B'
@@ -111,91 +189,69 @@ def calculate(klines, spot):
     
     # ADX Oscillator
     bsn = 'N'
-    if adx['adx'].iloc[-1] > 25:
-        if adx['dmp'].iloc[-1] > adx['dmn'].iloc[-1]: bsn = 'B'
-        if adx['dmp'].iloc[-1] < adx['dmn'].iloc[-1]: bsn = 'S'
-    indicators['adx'] = [{adx['dmp'].iloc[-1], adx['dmn'].iloc[-1], adx['adx'].iloc[-1]}, bsn, 'O']
+    if values['adx'] > 25:
+        if values['dmp'] > values['dmn']: bsn = 'B'
+        if values['dmp'] < values['dmn']: bsn = 'S'
+    indicators['adx'] = [{values['dmp'], values['dmn'], values['adx']}, bsn, 'O']
 
     # Awesome Oscillator
-    ao = df['AO']
+    ao = values['ao']
     bsn = 'N'
-    if ao.iloc[-1] >= 0:
-        if high_low(ao):bsn = 'B'
-    if ao.iloc[-1] < 0:
-        if high_low(ao, True):bsn = 'S'
-    indicators['ao'] = [ao.iloc[-1], bsn, 'O']
+    if ao >= 0:
+        if high_low(ao, values['ao_prev']):bsn = 'B'
+    if ao < 0:
+        if high_low(ao, values['ao_prev'], True):bsn = 'S'
+    indicators['ao'] = [ao, bsn, 'O']
 
     # Momentum Oscillator
-    momentum = df['Momentum']
+    momentum = values['momentum']
     bsn = 'N'
-    if momentum.iloc[-1] >= 0:
-        if high_low(momentum):bsn = 'B'
-    if momentum.iloc[-1] < 0:
-        if high_low(momentum, True):bsn = 'S'
-    indicators['momentum'] = [momentum.iloc[-1], bsn, 'O']
+    if momentum >= 0:
+        if high_low(momentum, values['momentum_prev']):bsn = 'B'
+    if momentum < 0:
+        if high_low(momentum, values['momentum_prev'], True):bsn = 'S'
+    indicators['momentum'] = [momentum, bsn, 'O']
     
     # MACD Oscillator
     bsn = 'N'
-    if macd['histogram'].iloc[-1] >= 0:
-        if high_low(macd['histogram']):bsn = 'B'
-    if macd['histogram'].iloc[-1] < 0:
-        if high_low(macd['histogram'], True): bsn = 'S'
-    indicators['macd'] = [{macd['histogram'].iloc[-1], macd['macd'].iloc[-1], macd['signal'].iloc[-1]}, bsn, 'O']
+    if values['macd_histogram'] >= 0:
+        if high_low(values['macd_histogram'], values['macd_histogram_prev']):bsn = 'B'
+    if values['macd_histogram'] < 0:
+        if high_low(values['macd_histogram'], values['macd_histogram_prev'], True): bsn = 'S'
+    indicators['macd'] = [{values['macd_histogram'], values['macd'], values['macd_signal']}, bsn, 'O']
 
     # Stochastic RSI Fast Oscillator
     bsn = 'N'
-    if stoch_rsi['k'].iloc[-1] < 20:
-        if stoch_rsi['k'].iloc[-1] > stoch_rsi['d'].iloc[-1]: bsn = 'B'
-    if stoch_rsi['k'].iloc[-1] > 80:
-        if stoch_rsi['k'].iloc[-1] < stoch_rsi['d'].iloc[-1]: bsn = 'S'
-    indicators['stochrsi'] = [{stoch_rsi['k'].iloc[-1], stoch_rsi['d'].iloc[-1]}, bsn, 'O']
+    if values['stochrsi_k'] < 20:
+        if values['stochrsi_k'] > values['stochrsi_d']: bsn = 'B'
+    if values['stochrsi_k'] > 80:
+        if values['stochrsi_k'] < values['stochrsi_d']: bsn = 'S'
+    indicators['stochrsi'] = [{values['stochrsi_k'], values['stochrsi_d']}, bsn, 'O']
 
     # WilliamsR Oscillator
-    williams_r = df['WilliamsR'].iloc[-1]
+    williams_r = values['williamsr']
     bsn = 'N'
     if williams_r < 30:bsn = 'B'
     if williams_r > 70:bsn = 'S'
     indicators['williamsr'] = [williams_r, bsn, 'O']   
 
     # Ultimate Oscillator
-    uo = df['UO'].iloc[-1]
+    uo = values['uo']
     bsn = 'N'
     if uo < 30:bsn = 'B'
     if uo > 70:bsn = 'S'
     indicators['uo'] = [uo, bsn, 'O']
 
     # EMA and SMA Moving Averages
-    ema10 = df['EMA10'].iloc[-1]
-    sma10 = df['SMA10'].iloc[-1]
-    ema20 = df['EMA20'].iloc[-1]
-    sma20 = df['SMA20'].iloc[-1]
-    ema30 = df['EMA30'].iloc[-1]
-    sma30 = df['SMA30'].iloc[-1]
-    ema50 = df['EMA50'].iloc[-1]
-    sma50 = df['SMA50'].iloc[-1]
-    ema100 = df['EMA100'].iloc[-1]
-    sma100 = df['SMA100'].iloc[-1]
-    ema200 = df['EMA200'].iloc[-1]
-    sma200 = df['SMA200'].iloc[-1]    
-    indicators['EMA10'] = [ema10, hesma(ema10, spot), 'A']
-    indicators['SMA10'] = [sma10, hesma(sma10, spot), 'A']
-    indicators['EMA20'] = [ema20, hesma(ema20, spot), 'A']
-    indicators['SMA20'] = [sma20, hesma(sma20, spot), 'A']
-    indicators['EMA30'] = [ema30, hesma(ema30, spot), 'A']
-    indicators['SMA30'] = [sma30, hesma(sma30, spot), 'A']
-    indicators['EMA50'] = [ema50, hesma(ema50, spot), 'A']
-    indicators['SMA50'] = [sma50, hesma(sma50, spot), 'A']
-    indicators['EMA100'] = [ema100, hesma(ema100, spot), 'A']
-    indicators['SMA100'] = [sma100, hesma(sma100, spot), 'A']
-    indicators['EMA200'] = [ema200, hesma(ema200, spot), 'A']
-    indicators['SMA200'] = [sma200, hesma(sma200, spot), 'A']
+    for average in ['EMA10', 'SMA10', 'EMA20', 'SMA20', 'EMA30', 'SMA30', 'EMA50', 'SMA50', 'EMA100', 'SMA100', 'EMA200', 'SMA200']:
+        indicators[average] = [values[average], hesma(values[average], spot), 'A']
 
     # Output to stdout
     if debug:
         defs.announce("Advice calculated:")
         print(indicators)
-        end_time = defs.now_utc()[4]
-        defs.announce(f"Pandas_ta spent {end_time - start_time}ms calculating indicators and advice")
+        end_time = clock.monotonic()
+        defs.announce(f"Spent {end_time - start_time}ms calculating indicators and advice")
     
     # Return technicals
     return indicators
@@ -212,14 +268,10 @@ def hesma(hesma, spot):
     return bsn
 
 # Check if the previous value was lower (default) or higher
-def high_low(values, invert = False):
+def high_low(last_value, single_last, invert = False):
     
     # Initialize variables
     check = False
-       
-    # Get the last and single last value
-    last_value  = values.iloc[-1]
-    single_last = values.iloc[-2]
 
     # Compare the two
     if last_value >= single_last:
@@ -0,0 +1,139 @@
+### Sunflow Cryptobot ###
+#
+# Latency histograms of the hot path
+
+# Load libraries
+import threading, time
+
+# Latencies in microseconds are counted in log-linear buckets, like an HDR histogram. Below 32 us every microsecond
+# has its own bucket, above that every power of two is split into 16 buckets, so a bucket is at most 6.25 % wide. The
+# buckets are a preallocated list, recording is a few integer operations and never allocates, and percentiles are
+# read from the counts at any time without keeping the samples.
+class Histogram:
+
+    # Initialize histogram
+    def __init__(self):
+        self.counts = [0] * buckets
+        self.count  = 0
+        self.total  = 0
+        self.max    = 0
+        self.lock   = threading.Lock()
+
+    # Record a latency in us
+    def record(self, us):
+        us = int(us)
+        if us < 32:
+            index = us if us > 0 else 0
+        else:
+            shift = us.bit_length() - 5
+            index = min((shift << 4) + (us >> shift), buckets - 1)
+        with self.lock:
+            self.counts[index] += 1
+            self.count         += 1
+            self.total         += us
+            if us > self.max:
+                self.max = us
+
+    # Latency in us at percentile, the middle of its bucket and never more than the maximum
+    def percentile(self, percent):
+        with self.lock:
+            counts, count, largest = list(self.counts), self.count, self.max
+        if not count:
+            return 0
+        rank = max(int(count * percent / 100 + 0.5), 1)
+        seen = 0
+        for index, number in enumerate(counts):
+            seen += number
+            if seen >= rank:
+                return min(middle(index), largest)
+        return largest
+
+    # Count, mean, p50, p90, p99 and max in us
+    def summary(self):
+        with self.lock:
+            count, total, largest = self.count, self.total, self.max
+        return {'count': count, 'mean': total / count if count else 0, 'p50': self.percentile(50), 'p90': self.percentile(90), 'p99': self.percentile(99), 'max': largest}
+
+    # Start over
+    def reset(self):
+        with self.lock:
+            self.counts = [0] * buckets
+            self.count  = 0
+            self.total  = 0
+            self.max    = 0
+
+# Middle of the bucket at index in us
+def middle(index):
+    if index < 32:
+        return index
+    shift = (index >> 4) - 1
+    return ((index - (shift << 4)) << shift) + (1 << shift) // 2
+
+# Buckets of a histogram, up to 2 ** 35 us which is more than nine hours
+buckets = 512
+
+# Time the code in a with block, on a histogram
+class Timer:
+    __slots__ = ('histogram', 'start')
+
+    # Initialize timer
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start     = 0
+
+    # Start
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    # Stop and record, also when the block raised
+    def __exit__(self, *exception):
+        self.histogram.record((time.perf_counter_ns() - self.start) // 1000)
+        return False
+
+# Histograms by stage, created at first use
+class Stages:
+
+    # Initialize stages
+    def __init__(self):
+        self.histograms = {}
+        self.lock       = threading.Lock()
+
+    # Histogram of stage
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    # Record a latency in us of stage
+    def record(self, name, us):
+        self.histogram(name).record(us)
+
+    # Time a with block as stage
+    def time(self, name):
+        return Timer(self.histogram(name))
+
+    # Summaries of all stages that have samples, by name
+    def summary(self):
+        with self.lock:
+            current = sorted(self.histograms.items())
+        return {name: histogram.summary() for name, histogram in current if histogram.count}
+
+    # Start all stages over
+    def reset(self):
+        with self.lock:
+            current = list(self.histograms.values())
+        for histogram in current:
+            histogram.reset()
+
+    # Report p50, p99 and max of all stages
+    def report(self, title="Latency"):
+        summary = self.summary()
+        if not summary:
+            return f"{title}: nothing measured yet"
+        message = f"{title} in ms over the samples (p50 / p99 / max):"
+        for name, stats in summary.items():
+            message = message + f"\n{name}: {stats['count']} samples, {stats['p50'] / 1000:.3f} / {stats['p99'] / 1000:.3f} / {stats['max'] / 1000:.3f}"
+        return message
@@ -4,7 +4,7 @@
 
 # Load external libraries
 from pathlib import Path
-import importlib, sys, argparse
+import importlib, importlib.util, sys, argparse
 
 # Load configuration file
 def load_config():
@@ -13,7 +13,7 @@ def load_config():
     parser = argparse.ArgumentParser()
     parser.add_argument('-c', '--config', default='config.py')
     parser.add_argument('-d', '--days', type=int, default=30,)
-    args = parser.parse_args()
+    args = parser.parse_known_args()[0]
 
     # Resolve config file path
     config_path = Path(args.config).resolve()
@@ -27,4 +27,101 @@ def load_config():
     config = importlib.import_module(config_module_name)
     
     # Return config
-    return config
\ No newline at end of file
+    return defaults(config)
+
+# Load configuration file by path, without the command line. Every call gives a new config module, so several bots
+# can each have their own config in one process, even when the files have the same name.
+def load_file(config_file):
+    config_path = Path(config_file).resolve()
+    spec        = importlib.util.spec_from_file_location(config_path.stem, config_path)
+    config      = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    return defaults(config)
+
+# Set config keys that were added after the first release and are missing, so a config of an older version keeps
+# working, new keys are documented with these defaults in config.py.txt
+def defaults(config):
+
+    # Default values
+    values = {
+
+        # Database
+        'dbase_fsync'         : "always",
+        'dbase_compact'       : 1000,
+
+        # Private websocket
+        'private_stream'      : True,
+
+        # Backtest
+        'backtest_folder'     : config.data_suffix + "backtest/",
+        'backtest_balance'    : 1000,
+        'backtest_fee'        : 0.1,
+        'backtest_push'       : 5000,
+        'backtest_instrument' : {'baseCoin': "XRP", 'quoteCoin': "USDC", 'basePrecision': 0.01, 'quotePrecision': 0.000001, 'minOrderQty': 0.01, 'maxOrderQty': 1000000, 'minOrderAmt': 1, 'maxOrderAmt': 200000, 'tickSize': 0.0001},
+
+        # Parameter sweep
+        'sweep_space'         : {},
+        'sweep_search'        : "grid",
+        'sweep_samples'       : 50,
+        'sweep_seed'          : 1,
+        'sweep_workers'       : 0,
+        'sweep_folder'        : config.data_suffix + "sweep/",
+        'sweep_file'          : config.data_suffix + "sweep.csv",
+
+        # Market data recorder
+        'record_enabled'      : False,
+        'record_folder'       : config.data_suffix + "market/",
+        'record_queue'        : 10000,
+        'record_flush'        : 60,
+
+        # Simulated exchange
+        'exchange_url'        : "",
+        'simulator_port'      : 8090,
+        'simulator_data'      : "",
+        'simulator_warmup'    : 86400000,
+        'simulator_hours'     : 24,
+        'simulator_price'     : 0.5,
+        'simulator_volatility': 0.0005,
+        'simulator_seed'      : 1,
+        'simulator_limit'     : 20,
+        'simulator_latency'   : 0,
+        'simulator_jitter'    : 0,
+        'simulator_errors'    : 0.0,
+
+        # Exchange session
+        'http_rate'           : 10,
+        'http_limits'         : {'trade': 10, 'query': 10, 'account': 5, 'market': 20},
+        'http_pool'           : 10,
+        'http_timeout'        : (3, 10),
+        'http_retries'        : 2,
+        'http_warm'           : 2,
+        'http_keepalive'      : 30,
+
+        # Notifications
+        'notify_interval'     : 10,
+        'notify_queue'        : 1000,
+
+        # Log files
+        'log_flush'           : 1,
+        'log_rotate_size'     : 10,
+        'log_rotate_age'      : 24,
+        'log_backups'         : 10,
+
+        # Latency, metrics and profiler
+        'latency_report'      : 300,
+        'metrics_port'        : 0,
+        'metrics_host'        : "127.0.0.1",
+        'metrics_file'        : "",
+        'metrics_interval'    : 15,
+        'profile_seconds'     : 30,
+        'profile_interval'    : 0.01,
+        'profile_folder'      : config.data_suffix + "profile/"
+    }
+
+    # Set missing keys
+    for name, value in values.items():
+        if not hasattr(config, name):
+            setattr(config, name, value)
+
+    # Return config
+    return config
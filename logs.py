@@ -0,0 +1,150 @@
+### Sunflow Cryptobot ###
+#
+# Buffered log writer with rotation
+
+# Load libraries
+from datetime import datetime, timezone
+import atexit, glob, gzip, json, os, shutil, threading, time
+
+# Every log file has one writer in the process, shared by all modules and all bots, that keeps the file open. Lines
+# are added to a buffer and a writer thread writes the buffers of all files to disk every delay seconds, or sooner
+# when a buffer gets long. When a file is larger than its maximum size or older than its maximum age it is renamed
+# with the time it was rotated, compressed with gzip and a new file is started, only the newest backups are kept.
+class LogWriter:
+
+    # Initialize writer, size in bytes and age in seconds, 0 is no rotation
+    def __init__(self, path, size=0, age=0, backups=10, delay=1.0):
+        self.path    = path
+        self.delay   = delay
+        self.size    = size
+        self.age     = age
+        self.backups = backups
+        self.lines   = []
+        self.lock    = threading.Lock()          # Buffer
+        self.writing = threading.Lock()          # File
+        self.file    = None
+        self.started = 0.0
+        self.stats   = {'lines': 0, 'writes': 0, 'bytes': 0, 'rotations': 0, 'errors': 0}
+
+    # Add line to buffer, wake the writer thread when the buffer is long
+    def write(self, line):
+        with self.lock:
+            self.lines.append(line)
+            full = len(self.lines) >= batch
+        if full:
+            wake.set()
+
+    # Write buffer to disk and rotate when needed
+    def flush(self):
+        with self.writing:
+
+            # Take buffer
+            with self.lock:
+                lines, self.lines = self.lines, []
+            if not lines:
+                return
+
+            # Write lines, a file that was removed is started again
+            try:
+                if self.file is not None and not os.path.exists(self.path):
+                    self.file.close()
+                    self.file = None
+                if self.file is None:
+                    self.file    = open(self.path, 'a', encoding='utf-8')
+                    self.started = time.time()
+                text = "".join(lines)
+                self.file.write(text)
+                self.file.flush()
+                self.stats['lines']  += len(lines)
+                self.stats['writes'] += 1
+                self.stats['bytes']  += len(text)
+                if (self.size and self.file.tell() >= self.size) or (self.age and time.time() - self.started >= self.age):
+                    self.rotate()
+            except OSError:
+                self.stats['errors'] += 1
+
+    # Rename, compress and start a new file, remove the oldest backups
+    def rotate(self):
+        self.file.close()
+        self.file = None
+        target    = f"{self.path}.{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S-%f')}"
+        os.replace(self.path, target)
+        with open(target, 'rb') as source, gzip.open(target + ".gz", 'wb') as compressed:
+            shutil.copyfileobj(source, compressed)
+        os.remove(target)
+        self.stats['rotations'] += 1
+        for backup in sorted(glob.glob(glob.escape(self.path) + ".*.gz"))[:-self.backups or None]:
+            os.remove(backup)
+
+    # Write buffer and close file
+    def close(self):
+        self.flush()
+        with self.writing:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+# Writers by path and the writer thread
+writers = {}
+lock    = threading.Lock()
+wake    = threading.Event()
+thread  = None
+batch   = 1000                                   # Lines in a buffer that wake the writer thread
+
+# Get the writer of path, created at first use
+def writer(path, size=0, age=0, backups=10, delay=1.0):
+    global thread
+    key = os.path.abspath(path)
+    with lock:
+        if key not in writers:
+            writers[key] = LogWriter(path, size, age, backups, delay)
+        if thread is None:
+            thread = threading.Thread(target=run, name="logs", daemon=True)
+            thread.start()
+            atexit.register(flush)
+        return writers[key]
+
+# Writer thread
+def run():
+    while True:
+        with lock:
+            delay = min((log.delay for log in writers.values()), default=1.0)
+        wake.wait(delay)
+        wake.clear()
+        flush()
+
+# Write the buffers of all files to disk
+def flush():
+    with lock:
+        current = list(writers.values())
+    for log in current:
+        log.flush()
+
+# Write and close the files in folder, or all files, for example before they are removed
+def close(folder=""):
+    with lock:
+        current = [log for key, log in writers.items() if key.startswith(os.path.abspath(folder))] if folder else list(writers.values())
+        for log in current:
+            del writers[os.path.abspath(log.path)]
+    for log in current:
+        log.close()
+
+# Records of a log of JSON lines, the compressed backups first
+def records(path):
+    for name in sorted(glob.glob(glob.escape(path) + ".*.gz")) + [path]:
+        opener = gzip.open if name.endswith(".gz") else open
+        if os.path.exists(name):
+            with opener(name, 'rt', encoding='utf-8') as file:
+                for line in file:
+                    if line.startswith("{"):
+                        yield json.loads(line)
+
+# Report writers
+def report():
+    with lock:
+        current = list(writers.values())
+    lines = sum(log.stats['lines'] for log in current)
+    size  = sum(log.stats['bytes'] for log in current)
+    message = f"Log writer wrote {lines} lines ({size / 1024:.0f} kB) to {len(current)} files in "
+    message = message + f"{sum(log.stats['writes'] for log in current)} writes, {sum(log.stats['rotations'] for log in current)} rotations and {sum(log.stats['errors'] for log in current)} errors"
+    return message
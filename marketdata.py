@@ -0,0 +1,370 @@
+### Sunflow Cryptobot ###
+#
+# Recorded market data, loaded from disk and replayed as websocket messages
+
+# Load libraries
+import glob, json, os
+import numpy as np
+import pandas as pd
+import buffers, incremental
+
+# Fields of the records of each stream. Sides are 0 for bids and buys and 1 for asks and sells, orderbook levels of
+# one message share time and update ID.
+streams = {
+    'ticker'   : [('time', 'i8'), ('price', 'f8')],
+    'kline'    : [('time', 'i8'), ('interval', 'i4'), ('start', 'i8'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'),
+                  ('close', 'f8'), ('volume', 'f8'), ('turnover', 'f8'), ('confirm', '?')],
+    'orderbook': [('time', 'i8'), ('update', 'i8'), ('snapshot', '?'), ('side', 'i1'), ('price', 'f8'), ('qty', 'f8')],
+    'trade'    : [('time', 'i8'), ('side', 'i1'), ('price', 'f8'), ('size', 'f8')]
+}
+
+# Instrument info is stored next to the streams
+info_file = "info.json"
+
+# Read one file into records of a stream
+def read_file(path, stream):
+
+    # Read by extension, Parquet needs pyarrow or fastparquet. Records are memory mapped, so processes that read the
+    # same file share it
+    extension = os.path.splitext(path)[1]
+    if extension == ".npy":
+        table = np.load(path, mmap_mode='r')
+        if table.dtype == np.dtype(streams[stream]):
+            return table
+    elif extension == ".npz":
+        table = np.load(path)[stream]
+    elif extension == ".parquet":
+        table = pd.read_parquet(path)
+    elif extension == ".csv":
+        table = pd.read_csv(path)
+    else:
+        raise ValueError(f"Unknown market data format {extension} of {path}")
+
+    # Copy columns into records, missing columns stay zero
+    columns = table.dtype.names if isinstance(table, np.ndarray) else table.columns
+    records = np.zeros(len(table), dtype=streams[stream])
+    for name in records.dtype.names:
+        if name in columns:
+            records[name] = np.asarray(table[name])
+
+    # Return records
+    return records
+
+# Load market data, either one file with ticker prices or a folder with a file or a subfolder of chunks per stream,
+# names limits the streams that are loaded from a folder
+def load(path, names=None):
+
+    # Initialize variables
+    data = {}
+
+    # Folder with streams
+    if os.path.isdir(path):
+        for stream in names or streams:
+            files = sorted(glob.glob(os.path.join(path, stream + ".*")) + glob.glob(os.path.join(path, stream, "*.*")))
+            files = [file for file in files if not file.endswith(".tmp")]
+            if len(files) == 1:
+                data[stream] = read_file(files[0], stream)
+            elif files:
+                data[stream] = np.concatenate([read_file(file, stream) for file in files])
+
+    # Single file with prices
+    else:
+        data['ticker'] = read_file(path, 'ticker')
+
+    # Sort by time when needed, keep the order of records with the same time
+    for stream in data:
+        if np.any(np.diff(data[stream]['time']) < 0):
+            data[stream] = data[stream][np.argsort(data[stream]['time'], kind='stable')]
+
+    # We can not do without prices
+    if len(data.get('ticker', ())) == 0:
+        raise ValueError(f"No ticker prices found in {path}")
+
+    # Return market data
+    return data
+
+# Store market data as one file per stream, to be memory mapped by load()
+def save(data, path, info=None):
+    os.makedirs(path, exist_ok=True)
+    for stream, records in data.items():
+        np.save(os.path.join(path, stream + ".npy"), np.ascontiguousarray(records))
+    if info:
+        with open(os.path.join(path, info_file), 'w', encoding='utf-8') as json_file:
+            json.dump(info, json_file)
+
+# Indicator values of a parameter sweep are stored with the market data, one file per klines that were replayed
+def indicator_file(path, interval, limit, start, push):
+    return os.path.join(path, "indicators", f"{interval}_{limit}_{start}_{push}")
+
+# Store indicator values
+def save_indicators(file, names, rows):
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    np.save(file + ".npy", rows)
+    with open(file + ".json", 'w', encoding='utf-8') as json_file:
+        json.dump(names, json_file)
+
+# Load indicator values memory mapped, None when there are none
+def load_indicators(file):
+    if not os.path.isfile(file + ".json"):
+        return None
+    with open(file + ".json", 'r', encoding='utf-8') as json_file:
+        names = json.load(json_file)
+    return names, np.load(file + ".npy", mmap_mode='r')
+
+# Load instrument info that was recorded with the streams, None when there is none
+def instrument(path):
+    file = os.path.join(path, info_file)
+    if not os.path.isfile(file):
+        return None
+    with open(file, 'r', encoding='utf-8') as json_file:
+        return json.load(json_file)
+
+# Kline updates of one interval built from ticker prices: the kline so far at most once every push ms and the
+# finished kline confirmed when its interval is over, like the websocket does
+def synthesize(ticks, interval, push):
+
+    # Initialize variables
+    step   = interval * 60 * 1000
+    times  = ticks['time']
+    prices = ticks['price']
+    bars   = times // step
+
+    # Running open, high and low within each kline
+    frame = pd.DataFrame({'bar': bars, 'price': prices})
+    group = frame.groupby('bar', sort=False)['price']
+    opens = group.transform('first').to_numpy()
+    highs = group.cummax().to_numpy()
+    lows  = group.cummin().to_numpy()
+
+    # First tick of every push period and last tick of every finished kline
+    slots             = times // push
+    update            = np.ones(len(times), dtype=bool)
+    update[1:]        = slots[1:] != slots[:-1]
+    finished          = np.zeros(len(times), dtype=bool)
+    finished[:-1]     = bars[1:] != bars[:-1]
+    rows              = np.concatenate((np.flatnonzero(update), np.flatnonzero(finished)))
+    confirm           = np.concatenate((np.zeros(update.sum(), dtype=bool), np.ones(finished.sum(), dtype=bool)))
+
+    # Build kline records, confirmations are sent at the end of their interval
+    klines             = np.zeros(len(rows), dtype=streams['kline'])
+    klines['time']     = np.where(confirm, (bars[rows] + 1) * step, times[rows])
+    klines['interval'] = interval
+    klines['start']    = bars[rows] * step
+    klines['open']     = opens[rows]
+    klines['high']     = highs[rows]
+    klines['low']      = lows[rows]
+    klines['close']    = prices[rows]
+    klines['confirm']  = confirm
+
+    # Return in order of time, a confirmation goes before the first update of the next kline
+    return klines[np.lexsort((~confirm, klines['time']))]
+
+# Recorded market data of one symbol
+class Market:
+
+    # Initialize market, unconfirmed klines built from ticker prices are pushed every push ms
+    def __init__(self, data, symbol, push=5000):
+        self.data   = data
+        self.symbol = symbol
+        self.push   = push
+        self.ticks  = data['ticker']
+        self.klines = {}
+        self.built  = {}
+        if 'kline' in data:
+            for interval in np.unique(data['kline']['interval']).tolist():
+                self.klines[interval] = data['kline'][data['kline']['interval'] == interval]
+
+    # First and last time with a price
+    def span(self):
+        return int(self.ticks['time'][0]), int(self.ticks['time'][-1])
+
+    # Last price at or before time, None when there is none
+    def price(self, time):
+        index = int(np.searchsorted(self.ticks['time'], time, 'right')) - 1
+        if index < 0:
+            return None
+        return float(self.ticks['price'][index])
+
+    # Klines of interval up to time, oldest first, as (start, open, high, low, close, volume, turnover)
+    def kline_list(self, interval, time, limit):
+
+        # Recorded klines, the last record of every kline is the most recent state of it
+        if interval in self.klines:
+            records = self.klines[interval]
+            records = records[:int(np.searchsorted(records['time'], time, 'right'))]
+            starts  = records['start']
+            last    = np.ones(len(records), dtype=bool)
+            last[:-1] = starts[1:] != starts[:-1]
+            records = records[last][-limit:]
+            return list(zip(records['start'].tolist(), records['open'].tolist(), records['high'].tolist(), records['low'].tolist(),
+                            records['close'].tolist(), records['volume'].tolist(), records['turnover'].tolist()))
+
+        # Ticker prices of the klines
+        step   = interval * 60 * 1000
+        first  = (time // step - limit + 1) * step
+        begin  = int(np.searchsorted(self.ticks['time'], first, 'left'))
+        end    = int(np.searchsorted(self.ticks['time'], time, 'right'))
+        times  = self.ticks['time'][begin:end]
+        prices = self.ticks['price'][begin:end]
+
+        # Klines with prices, klines without prices repeat the previous close
+        bars   = (times - first) // step
+        opens  = np.full(limit, np.nan)
+        highs  = np.full(limit, np.nan)
+        lows   = np.full(limit, np.nan)
+        closes = np.full(limit, np.nan)
+        if len(bars):
+            starts               = np.flatnonzero(np.r_[True, bars[1:] != bars[:-1]])
+            ends                 = np.r_[starts[1:], len(prices)] - 1
+            opens[bars[starts]]  = prices[starts]
+            highs[bars[starts]]  = np.maximum.reduceat(prices, starts)
+            lows[bars[starts]]   = np.minimum.reduceat(prices, starts)
+            closes[bars[starts]] = prices[ends]
+        previous = self.price(first - 1)
+        closes   = pd.Series(closes).ffill().to_numpy()
+        if previous is not None:
+            closes = np.where(np.isnan(closes), previous, closes)
+        empty        = np.isnan(opens)
+        opens[empty] = closes[empty]
+        highs[empty] = closes[empty]
+        lows[empty]  = closes[empty]
+
+        # Leave out klines before the first price
+        keep   = ~np.isnan(closes)
+        starts = first + np.arange(limit)[keep] * step
+        zeros  = [0.0] * int(keep.sum())
+        return list(zip(starts.tolist(), opens[keep].tolist(), highs[keep].tolist(), lows[keep].tolist(), closes[keep].tolist(), zeros, zeros))
+
+    # Kline records of interval, recorded or built from ticker prices
+    def kline_records(self, interval):
+        if interval in self.klines:
+            return self.klines[interval]
+        if interval not in self.built:
+            self.built[interval] = synthesize(self.ticks, interval, self.push)
+        return self.built[interval]
+
+    # Technical indicator values handle_kline() gets for every kline message of interval from start on, the first row
+    # is the state after preloading the klines. Returns names and one row of values per message.
+    def indicators(self, interval, limit, start):
+
+        # Preloaded klines
+        def preload(time):
+            klines = buffers.KlineBuffer(limit)
+            for item in self.kline_list(interval, time, limit):
+                klines.append(dict(zip(buffers.KlineBuffer.columns, item)))
+            return klines
+
+        # Initialize variables
+        records = self.kline_records(interval)
+        records = records[int(np.searchsorted(records['time'], start, 'left')):]
+        klines  = preload(start)
+        stream  = incremental.Indicators(klines)
+        first   = stream.values()
+        names   = list(first)
+        rows    = np.empty((len(records) + 1, len(names)), dtype=np.float64)
+        rows[0] = [first[name] for name in names]
+
+        # Follow handle_kline(), a finished kline reloads the klines when there are not enough of them
+        for index, record in enumerate(records):
+            kline = {'time': int(record['start']), 'open': float(record['open']), 'high': float(record['high']), 'low': float(record['low']),
+                     'close': float(record['close']), 'volume': float(record['volume']), 'turnover': float(record['turnover'])}
+            if record['confirm'] and len(klines) != limit:
+                klines = preload(int(record['time']))
+                stream = incremental.Indicators(klines)
+            if klines.last_time() == kline['time']:
+                klines.replace_last(kline)
+            else:
+                klines.append(kline)
+            stream.update(kline)
+            values = stream.values()
+            rows[index + 1] = [values[name] for name in names]
+
+        # Return names and values
+        return names, rows
+
+    # Websocket message of a ticker record
+    def ticker_message(self, records, index):
+        record = records[index]
+        return {'topic': f"tickers.{self.symbol}", 'ts': int(record['time']), 'type': "snapshot", 'data': {'symbol': self.symbol, 'lastPrice': str(float(record['price']))}}
+
+    # Websocket message of a kline record
+    def kline_message(self, records, index):
+        record = records[index]
+        step   = int(record['interval']) * 60 * 1000
+        kline  = {
+            'start'    : int(record['start']),
+            'end'      : int(record['start']) + step - 1,
+            'interval' : str(int(record['interval'])),
+            'open'     : str(float(record['open'])),
+            'close'    : str(float(record['close'])),
+            'high'     : str(float(record['high'])),
+            'low'      : str(float(record['low'])),
+            'volume'   : str(float(record['volume'])),
+            'turnover' : str(float(record['turnover'])),
+            'confirm'  : bool(record['confirm']),
+            'timestamp': int(record['time'])
+        }
+        return {'topic': f"kline.{int(record['interval'])}.{self.symbol}", 'ts': int(record['time']), 'type': "snapshot", 'data': [kline]}
+
+    # Websocket message of the orderbook records between two indexes
+    def orderbook_message(self, records, begin, end):
+        group = records[begin:end]
+        data  = {'s': self.symbol, 'b': [], 'a': [], 'u': int(group['update'][0]), 'seq': int(group['update'][0])}
+        for side, price, qty in zip(group['side'].tolist(), group['price'].tolist(), group['qty'].tolist()):
+            data['a' if side else 'b'].append([str(price), str(qty)])
+        kind = "snapshot" if group['snapshot'][0] else "delta"
+        return {'topic': f"orderbook.200.{self.symbol}", 'ts': int(group['time'][0]), 'type': kind, 'data': data}
+
+    # Websocket message of the trade records between two indexes
+    def trade_message(self, records, begin, end):
+        group  = records[begin:end]
+        trades = []
+        for time, side, price, size in zip(group['time'].tolist(), group['side'].tolist(), group['price'].tolist(), group['size'].tolist()):
+            trades.append({'T': time, 's': self.symbol, 'S': "Sell" if side else "Buy", 'p': str(price), 'v': str(size)})
+        return {'topic': f"publicTrade.{self.symbol}", 'ts': int(group['time'][0]), 'type': "snapshot", 'data': trades}
+
+    # Times of the messages of one stream and a function that builds message number i
+    def source(self, name):
+
+        # Ticker
+        if name == 'ticker':
+            records = self.ticks
+            return records['time'], lambda index: self.ticker_message(records, index)
+
+        # Klines of one interval, recorded or built from ticker prices
+        if name.startswith("kline."):
+            records = self.kline_records(int(name.split(".")[1]))
+            return records['time'], lambda index: self.kline_message(records, index)
+
+        # Orderbook and trades are grouped into messages
+        records = self.data.get(name)
+        if records is None or len(records) == 0:
+            return np.array([], dtype=np.int64), None
+        if name == 'orderbook':
+            keys = (records['time'], records['update'])
+        else:
+            keys = (records['time'],)
+        change = np.zeros(len(records), dtype=bool)
+        change[0] = True
+        for key in keys:
+            change[1:] |= key[1:] != key[:-1]
+        starts = np.flatnonzero(change)
+        ends   = np.r_[starts[1:], len(records)]
+        build  = self.orderbook_message if name == 'orderbook' else self.trade_message
+        return records['time'][starts], lambda index: build(records, starts[index], ends[index])
+
+    # Messages of the named streams from start on in order of time as (time, name, message), at the same time
+    # the streams keep the order of names
+    def messages(self, names, start=0):
+
+        # Times of all messages
+        sources = [self.source(name) for name in names]
+        times   = np.concatenate([times for times, _ in sources])
+        kinds   = np.concatenate([np.full(len(times), kind, dtype=np.int32) for kind, (times, _) in enumerate(sources)])
+        indexes = np.concatenate([np.arange(len(times)) for times, _ in sources])
+
+        # Merge streams
+        order = np.lexsort((kinds, times))
+        order = order[times[order] >= start]
+        for time, kind, index in zip(times[order].tolist(), kinds[order].tolist(), indexes[order].tolist()):
+            yield time, names[kind], sources[kind][1](index)
@@ -0,0 +1,132 @@
+### Sunflow Cryptobot ###
+#
+# Metrics in the Prometheus text format, served over HTTP or written to a file
+
+# Load libraries
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os, threading, time
+
+# Bots and sessions register a collector, a function that returns metric families. Nothing is counted for the metrics
+# themselves, the collectors read the counters the bots keep anyway, only when metrics are asked for. A family is a
+# dict with name, type, help and samples, a sample is a name suffix, a dict of labels and a value. Families with the
+# same name, for example of several symbols, are merged into one.
+collectors = {}
+lock       = threading.Lock()
+server     = None
+exporter   = None
+errors     = 0
+
+# Family of metrics
+def family(name, kind, text, samples=None):
+    return {'name': name, 'type': kind, 'help': text, 'samples': samples or []}
+
+# Family of one counter or gauge per labels, values is a dict of label tuples and values
+def simple(name, kind, text, keys, values):
+    return family(name, kind, text, [("", dict(zip(keys, labels)), value) for labels, value in values.items()])
+
+# Summary family of latency histograms in seconds, summaries is a list of labels with the summary of a histogram
+def latencies(name, text, summaries):
+    samples = []
+    for labels, stats in summaries:
+        for quantile, key in (("0.5", 'p50'), ("0.9", 'p90'), ("0.99", 'p99')):
+            samples.append(("", {**labels, 'quantile': quantile}, stats[key] / 1000000))
+        samples.append(("_sum", labels, stats['mean'] * stats['count'] / 1000000))
+        samples.append(("_count", labels, stats['count']))
+    return family(name, "summary", text, samples)
+
+# Register collector under key, a key that is registered again replaces the old collector
+def register(key, collector):
+    with lock:
+        collectors[key] = collector
+
+# Remove collector
+def unregister(key):
+    with lock:
+        collectors.pop(key, None)
+
+# Escape label value
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+# Format value, Prometheus knows NaN and infinity as text
+def number(value):
+    if value is None:
+        return "NaN"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float) and value in (float('inf'), float('-inf')):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+# All metrics in the text format, a collector that fails is counted and skipped
+def collect():
+    global errors
+    with lock:
+        current = list(collectors.values())
+    families = {}
+    for collector in current:
+        try:
+            for item in collector():
+                if item['name'] in families:
+                    families[item['name']]['samples'].extend(item['samples'])
+                else:
+                    families[item['name']] = family(item['name'], item['type'], item['help'], list(item['samples']))
+        except Exception:
+            errors += 1
+    families['sunflow_metrics_errors_total'] = family("sunflow_metrics_errors_total", "counter", "Collectors and metric file writes that failed", [("", {}, errors)])
+    lines = []
+    for name, item in families.items():
+        lines.append(f"# HELP {name} {item['help']}")
+        lines.append(f"# TYPE {name} {item['type']}")
+        for suffix, labels, value in item['samples']:
+            text = ",".join(f"{key}=\"{escape(label)}\"" for key, label in labels.items())
+            lines.append(f"{name}{suffix}{{{text}}} {number(value)}" if text else f"{name}{suffix} {number(value)}")
+    return "\n".join(lines) + "\n"
+
+# Serve /metrics
+class Handler(BaseHTTPRequestHandler):
+
+    # Get metrics
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = collect().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Requests are not printed
+    def log_message(self, *args):
+        pass
+
+# Write metrics to path, replaced at once so a textfile collector never reads half a file
+def write(path):
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as file:
+        file.write(collect())
+    os.replace(temporary, path)
+
+# Write metrics to path every interval seconds
+def export(path, interval):
+    global errors
+    while True:
+        try:
+            write(path)
+        except OSError:
+            errors += 1
+        time.sleep(interval)
+
+# Start the server and the file exporter once per process, port 0 and an empty path are off
+def start(port=0, host="127.0.0.1", path="", interval=15):
+    global server, exporter
+    with lock:
+        if port and server is None:
+            server = ThreadingHTTPServer((host, port), Handler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        if path and exporter is None:
+            exporter = threading.Thread(target=export, args=(path, interval), name="metrics_file", daemon=True)
+            exporter.start()
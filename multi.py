@@ -0,0 +1,160 @@
+### Sunflow Cryptobot ###
+#
+# Run several symbols in one process, sharing libraries, exchange session and websockets
+#
+# Use with one config file per symbol, all with the same API key:
+# python multi.py -c config_xrp.py -c config_btc.py
+
+
+### Initialize ###
+
+# Load external libraries
+from pathlib import Path
+from pybit.unified_trading import WebSocket
+import argparse, os, resource, sys, threading, time
+
+# Load internal libraries
+import defs, loader, sunflow, transport
+
+
+### Symbols ###
+
+# Resident memory of the process in MB
+def rss():
+    try:
+        with open("/proc/self/statm", 'r', encoding='utf-8') as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# Public websocket of all symbols. Multi.py owns it, a symbol that lost the connection asks for a reconnect, which
+# happens once after 5 s on a thread of its own, the old websocket is closed and every symbol subscribes again.
+class SharedPublic:
+
+    # Initialize and connect
+    def __init__(self, bots):
+        self.bots         = bots
+        self.ws           = WebSocket(testnet=False, channel_type="spot")
+        self.lock         = threading.Lock()
+        self.reconnecting = False
+
+    # Websocket for a symbol to subscribe to
+    def connect(self):
+        return self.ws
+
+    # Reconnect for all symbols, a reconnect that is running already is not started again
+    def reconnect(self):
+        with self.lock:
+            if self.reconnecting:
+                return
+            self.reconnecting = True
+        threading.Thread(target=self.run, name="reconnect", daemon=True).start()
+
+    # Replace the websocket and subscribe the streams of all symbols
+    def run(self):
+        try:
+            time.sleep(5)
+            self.ws.exit()
+            self.ws = WebSocket(testnet=False, channel_type="spot")
+            for bot in self.bots:
+                bot.context.activate()
+                bot.ws = self.ws
+                bot.subscribe_streams(self.ws)
+        except Exception as e:
+            defs.announce(f"*** Warning: Reconnecting shared websocket failed: {e} ***", True, 1)
+        finally:
+            with self.lock:
+                self.reconnecting = False
+
+# Connect a symbol to the shared private websocket
+def shared_private(bot, private):
+    def connect_private():
+        bot.context.cache.live = True
+        return private
+    return connect_private
+
+# Run symbols
+def main():
+
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description="Run the Sunflow Cryptobot for several symbols in one process.")
+    parser.add_argument('-c', '--config', action='append', required=True, help='Config file of a symbol (with .py extension), once per symbol.')
+    parser.add_argument('--profile', type=float, default=0, help='Sample all threads for this many seconds from the start.')
+    args = parser.parse_args()
+
+    # Check configs
+    for config_file in args.config:
+        if not Path(config_file).resolve().exists():
+            print(f"Config file not found at {Path(config_file).resolve()}, aborting...\n")
+            sys.exit()
+
+    # All symbols trade with the same account
+    configs = [loader.load_file(config_file) for config_file in args.config]
+    keys    = {(config.api_key, config.api_secret, config.exchange_url) for config in configs}
+    if len(keys) > 1:
+        print("All configs need the same api_key, api_secret and exchange_url, aborting...\n")
+        sys.exit()
+    symbols = [config.symbol for config in configs]
+    if len(set(symbols)) < len(symbols):
+        print(f"Every symbol can only run once, got {', '.join(symbols)}, aborting...\n")
+        sys.exit()
+
+    # Create and preload a bot per symbol and report the memory each one adds
+    bots   = []
+    before = rss()
+    print(f"\n*** Loading {len(configs)} symbols, {before:.0f} MB in use ***\n")
+    for config_file, config in zip(args.config, configs):
+        start = rss()
+        bot   = sunflow.SunflowBot(config)
+        if not bot.prepare():
+            sys.exit()
+        bots.append(bot)
+        print(f"\n*** Loaded {bot.symbol} from {config_file}, it added {rss() - start:.0f} MB, {rss():.0f} MB in use ***\n")
+
+    # One public websocket for the topics of all symbols, reconnected for all of them at once
+    public = SharedPublic(bots)
+    for bot in bots:
+        bot.connect_websocket = public.connect
+        bot.reconnect         = public.reconnect
+
+    # One private websocket, order, execution and wallet updates go to all symbols, each keeps the orders it knows
+    if any(bot.config.private_stream for bot in bots):
+        config  = bots[0].config
+        private = WebSocket(testnet=False, channel_type="private", api_key=config.api_key, api_secret=config.api_secret)
+        def forward(message):
+            for bot in bots:
+                if bot.config.private_stream and bot.runtime.loop:
+                    bot.runtime.post('private', message)
+        private.order_stream(callback=forward)
+        private.execution_stream(callback=forward)
+        private.wallet_stream(callback=forward)
+        for bot in bots:
+            bot.connect_private = shared_private(bot, private)
+
+    # Run every symbol on its own runtime, latency is reported with kill -USR2 {pid} and profiled with kill -USR1 {pid}
+    sunflow.on_demand(bots)
+    if args.profile:
+        sunflow.profile(bots, args.profile)
+    threads = [threading.Thread(target=bot.run, name=bot.symbol) for bot in bots]
+    for thread in threads:
+        thread.start()
+    print(f"\n*** Running {', '.join(symbols)}, {rss():.0f} MB in use, {(rss() - before) / len(bots):.0f} MB per symbol ***\n")
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        for bot in bots:
+            bot.runtime.stop()
+        for thread in threads:
+            thread.join()
+    for bot in bots:
+        bot.goodbye()
+
+    # Report
+    print(f"\n*** Stopped {', '.join(symbols)} ***\n")
+    for session in transport.sessions.values():
+        print(session.report())
+
+# Start
+if __name__ == "__main__":
+    main()
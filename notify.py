@@ -0,0 +1,156 @@
+### Sunflow Cryptobot ###
+#
+# Notification dispatcher
+
+# Load libraries
+from collections import deque
+import atexit, re, threading, time
+
+# Announcements are printed and sent on one background thread, so a slow messaging service never holds up the
+# strategy. Every group of messaging clients gets at most one notification per interval, messages in between are sent
+# together as one digest, where messages that only differ in their numbers are collapsed into the latest one. The
+# queue is bounded, when it is full new lines to print are dropped and counted, notifications are always kept as
+# they are collapsed anyway. Everything still waiting is flushed when the bot stops or the process exits.
+class Dispatcher:
+
+    # Initialize dispatcher
+    def __init__(self, apobj, interval=10, size=1000):
+        self.apobj     = apobj                   # Apprise instance with the urls of all groups
+        self.interval  = interval                # Seconds between notifications per group
+        self.size      = size                    # Lines waiting to be printed at most
+        self.inline    = False                   # Print and send right away instead of on the dispatcher thread
+        self.lines     = deque()
+        self.groups    = {}
+        self.condition = threading.Condition()
+        self.busy      = False
+        self.thread    = None
+        self.stats     = {'printed': 0, 'dropped': 0, 'messages': 0, 'sent': 0, 'collapsed': 0, 'failed': 0, 'send_time': 0.0}
+
+    # Start dispatcher thread
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="notify", daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    # Queue line for stdout
+    def write(self, line):
+        if self.inline:
+            print(line)
+            return
+        with self.condition:
+            if self.thread is None:
+                self.start()
+            if len(self.lines) >= self.size:
+                self.stats['dropped'] += 1
+                return
+            if not self.lines:
+                self.condition.notify()
+            self.lines.append(line)
+
+    # Queue message for group of messaging clients
+    def notify(self, tag, message):
+        if self.inline:
+            self.send(tag, [message])
+            return
+        with self.condition:
+            if self.thread is None:
+                self.start()
+            group = self.groups.setdefault(tag, {'messages': [], 'last': 0.0})
+            group['messages'].append(message)
+            self.stats['messages'] += 1
+            self.condition.notify()
+
+    # Groups with messages that may be sent at moment
+    def due(self, moment, everything=False):
+        return [tag for tag, group in self.groups.items() if group['messages'] and (everything or moment - group['last'] >= self.interval)]
+
+    # Seconds until the next group may be sent, None when nothing waits
+    def wait_time(self, moment):
+        waiting = [group['last'] + self.interval - moment for group in self.groups.values() if group['messages']]
+        return max(min(waiting), 0.0) if waiting else None
+
+    # Dispatcher thread
+    def run(self):
+        while True:
+
+            # Wait for lines or groups that are due, and for a flush to finish
+            with self.condition:
+                while self.busy or (not self.lines and not self.due(time.monotonic())):
+                    self.condition.wait(self.wait_time(time.monotonic()))
+                self.busy = True
+                self.dispatch(time.monotonic())
+
+    # Print all lines and send the groups that are due, called holding the condition which is released while working
+    def dispatch(self, moment, everything=False):
+
+        # Take the work
+        lines   = list(self.lines)
+        batches = {}
+        self.lines.clear()
+        for tag in self.due(moment, everything):
+            batches[tag]                 = self.groups[tag]['messages']
+            self.groups[tag]['messages'] = []
+            self.groups[tag]['last']     = moment
+        self.condition.release()
+
+        # Print and send
+        try:
+            if lines:
+                print("\n".join(lines), flush=True)
+            for tag, messages in batches.items():
+                self.send(tag, messages)
+        finally:
+            self.condition.acquire()
+            self.stats['printed'] += len(lines)
+            self.busy = False
+            self.condition.notify_all()
+
+    # Send messages to group, several messages go as one digest
+    def send(self, tag, messages):
+        body  = digest(messages) if len(messages) > 1 else messages[0]
+        start = time.perf_counter()
+        try:
+            sent = self.apobj.notify(body=body, title="Sunflow Cryptobot", tag=tag)
+        except Exception:
+            sent = False
+        self.stats['send_time'] += time.perf_counter() - start
+        self.stats['sent']      += 1
+        self.stats['collapsed'] += len(messages) - len({kind(message) for message in messages})
+        if sent is False:
+            self.stats['failed'] += 1
+
+    # Print and send everything that waits, also the groups that are not due yet
+    def flush(self, timeout=10):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.busy and time.monotonic() < deadline:
+                self.condition.wait(deadline - time.monotonic())
+            if self.lines or self.due(0, True):
+                self.busy = True
+                self.dispatch(time.monotonic(), True)
+
+    # Report dispatcher
+    def report(self):
+        with self.condition:
+            stats = dict(self.stats)
+        message = f"Notifier printed {stats['printed']} lines ({stats['dropped']} dropped), got {stats['messages']} messages and sent "
+        message = message + f"{stats['sent']} notifications ({stats['collapsed']} messages collapsed, {stats['failed']} failed) in {stats['send_time']:.1f} s"
+        return message
+
+# Messages that only differ in numbers are alike
+def kind(message):
+    return re.sub(r"[0-9.,]+", "#", message)
+
+# Digest with the latest message of every kind in order of first appearance
+def digest(messages):
+    kinds = {}
+    for message in messages:
+        key = kind(message)
+        if key in kinds:
+            kinds[key] = (message, kinds[key][1] + 1)
+        else:
+            kinds[key] = (message, 1)
+    lines = []
+    for message, count in kinds.values():
+        lines.append(message if count == 1 else f"{message} (last of {count})")
+    return "\n".join(lines)
@@ -3,12 +3,11 @@
 # Find optimal trigger price distance and profit percentage
 
 # Load libraries
-from loader import load_config
-import defs, math, pprint
+import clock, context, defs, math, pprint
 import pandas as pd
 
-# Load config
-config = load_config()
+# Config of the bot
+config = context.config
 
 # Resample and create dataframe for optimizer
 def resample_optimzer(prices, interval):
@@ -17,7 +16,7 @@ def resample_optimzer(prices, interval):
     debug = False
   
     # Convert the time and price data into a DataFrame
-    df = pd.DataFrame(prices)
+    df = pd.DataFrame(prices.views())
     
     # Convert the 'time' column to datetime format
     df['time'] = pd.to_datetime(df['time'], unit='ms')
@@ -48,10 +47,10 @@ def optimize(prices, profit, active_order, use_spread, optimizer):
     # Debug and speed
     debug = False
     speed = True
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
     
-    # Global error counter
-    global df_errors, halt_sunflow
+    # Error counter is kept in the context of the bot
+    bot = context.current()
   
     # Initialize variables
     volatility   = 0                                    # Volatility
@@ -63,7 +62,7 @@ def optimize(prices, profit, active_order, use_spread, optimizer):
     distance_new = optimizer['distance']                # New distance to be
     spread       = optimizer['spread']                  # Initial spread
     spread_new   = optimizer['spread']                  # New spread to be
-    start_time   = defs.now_utc()[4]                    # Current time
+    start_time   = clock.milliseconds()                 # Current time
 
     # Optimize only on desired sides
     if active_order['side'] not in optimizer['sides']:
@@ -93,10 +92,7 @@ def optimize(prices, profit, active_order, use_spread, optimizer):
         last_timestamp = int(df.index[-1].timestamp() * 1000)
         
         # Which prices are not yet in the resampled data since last timestamp of dataframe
-        prices_new = {
-            'price': [price for price, time in zip(prices['price'], prices['time']) if time > last_timestamp],
-            'time': [time for time in prices['time'] if time > last_timestamp]
-        }
+        prices_new = prices.since(last_timestamp)
 
         # Create a dataframe from the new prices
         df_new         = pd.DataFrame(prices_new)
@@ -166,17 +162,17 @@ def optimize(prices, profit, active_order, use_spread, optimizer):
     except Exception as e:
         
         # Count the errors and log
-        df_errors  = df_errors + 1
+        bot.df_errors = bot.df_errors + 1
         defs.log_error(e)
         
         # After three consecutive errors halt
-        if df_errors > 2:
-            halt_sunflow = True
+        if bot.df_errors > 2:
+            bot.halt_sunflow = True
         if speed: defs.announce(defs.report_exec(stime, "early return due to error"))    
         return profit, active_order, optimizer
    
     # Reset error counter
-    df_errors = 0
+    bot.df_errors = 0
   
     # Rework to original variable
     use_spread['distance']   = spread_new
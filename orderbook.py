@@ -0,0 +1,116 @@
+### Sunflow Cryptobot ###
+#
+# Local orderbook maintained from websocket snapshots and deltas
+
+# Load libraries
+import bisect
+
+# Bids and asks of one symbol as sorted price lists with the quantity at each price. A snapshot replaces the book,
+# a delta changes single levels with a binary search and a quantity of zero removes the level. Update IDs must
+# follow each other, after a gap the book is out of sync until a new snapshot arrives. While a snapshot is loaded the
+# deltas wait, and the ones newer than the snapshot are applied when it arrives. The quantity between two prices
+# is two binary searches to the edges of the band and a sum of only the levels inside it, nothing is rebuilt when a
+# level changes.
+class OrderBook:
+
+    # Initialize empty book
+    def __init__(self):
+        self.sides     = {'b': {'prices': [], 'qty': []}, 'a': {'prices': [], 'qty': []}}
+        self.update_id = 0
+        self.synced    = False
+        self.baseline  = False
+        self.loading   = False                   # Snapshot is loaded after a missed update
+        self.waiting   = []                      # Deltas received while loading
+
+    # Replace book, baseline is set when the next update ID may skip ahead, for example after a REST snapshot
+    def snapshot(self, data, baseline=False):
+        for side in self.sides:
+            levels = sorted((float(price), float(qty)) for price, qty in data[side] if float(qty) > 0)
+            self.sides[side]['prices'] = [price for price, _ in levels]
+            self.sides[side]['qty']    = [qty for _, qty in levels]
+        self.update_id = int(data['u'])
+        self.synced    = True
+        self.baseline  = baseline
+
+    # Set quantity of one price level
+    def level(self, side, price, qty):
+        prices = self.sides[side]['prices']
+        index  = bisect.bisect_left(prices, price)
+        found  = index < len(prices) and prices[index] == price
+        if found and qty == 0:
+            del prices[index]
+            del self.sides[side]['qty'][index]
+        elif found:
+            self.sides[side]['qty'][index] = qty
+        elif qty > 0:
+            prices.insert(index, price)
+            self.sides[side]['qty'].insert(index, qty)
+
+    # Apply delta, returns False when an update was missed
+    def delta(self, data):
+
+        # Check sequence, older updates are already in the book
+        update_id = int(data['u'])
+        if update_id <= self.update_id:
+            return True
+        if update_id != self.update_id + 1 and not self.baseline:
+            self.synced = False
+            return False
+
+        # Change levels
+        for side in self.sides:
+            for price, qty in data[side]:
+                self.level(side, float(price), float(qty))
+        self.update_id = update_id
+        self.baseline  = False
+        return True
+
+    # Snapshot that was loaded after a missed update, None when loading failed, returns False when the book is out of sync
+    def resync(self, data):
+
+        # A snapshot from the websocket came first
+        if not self.loading:
+            return True
+        self.loading = False
+        waiting      = self.waiting
+        self.waiting = []
+        if data is None:
+            return False
+
+        # Replace book and apply the deltas that came after the snapshot
+        self.snapshot(data, True)
+        for delta in waiting:
+            if not self.delta(delta):
+                return False
+        return True
+
+    # Handle websocket message or loaded snapshot, returns False when the book is out of sync and a snapshot must be loaded
+    def update(self, message):
+
+        # Loaded snapshot
+        if message['type'] == "resync":
+            return self.resync(message['data'])
+
+        # Snapshot, an update ID of 1 means the exchange restarted and also sends a snapshot
+        if message['type'] == "snapshot" or int(message['data']['u']) == 1:
+            self.snapshot(message['data'])
+            self.loading = False
+            self.waiting = []
+            return True
+
+        # Delta, waits while a snapshot is loaded
+        if not self.synced and self.loading:
+            self.waiting.append(message['data'])
+            return True
+        if not self.synced:
+            return False
+        return self.delta(message['data'])
+
+    # Total quantity of one side with low <= price <= high
+    def depth(self, side, low, high):
+
+        # Sum only the levels inside the band
+        prices = self.sides[side]['prices']
+        start  = bisect.bisect_left(prices, low)
+        end    = bisect.bisect_right(prices, high)
+        return float(sum(self.sides[side]['qty'][start:end]))
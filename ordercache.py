@@ -0,0 +1,130 @@
+### Sunflow Cryptobot ###
+#
+# Order, execution and wallet state from the private websocket
+
+# Load libraries
+import threading
+
+# Keeps the latest state of orders, executions and wallet coins as pushed by the private websocket. Orders and wallet
+# are returned in the same format as the REST API returns them, so the callers do not have to know where they came
+# from. REST responses are stored too, so a miss only costs one REST call. Nothing is served before the private
+# websocket is live, otherwise the cache would never learn about changes, and everything is forgotten when it
+# disconnects, as changes are missed until it is back. Used on the strategy thread and the wallet report threads, a
+# lock guards the state.
+class OrderCache:
+
+    # Initialize empty cache
+    def __init__(self):
+        self.live       = False
+        self.orders     = {}
+        self.executions = {}
+        self.coins      = {}
+        self.wallet     = {}
+        self.hits       = 0
+        self.misses     = 0
+        self.lock       = threading.Lock()
+
+    # Store order if it is newer than what we have, called holding the lock
+    def store_order(self, item):
+        orderid = str(item['orderId'])
+        current = self.orders.get(orderid)
+        if current is None or int(item['updatedTime']) >= int(current['updatedTime']):
+            self.orders[orderid] = item
+
+    # Store wallet account and coins, called holding the lock
+    def store_wallet(self, account):
+        self.wallet = {key: value for key, value in account.items() if key != 'coin'}
+        for coin in account.get('coin', []):
+            self.coins[coin['coin']] = coin
+
+    # Handle message from private websocket, returns the order IDs that changed
+    def update(self, message):
+
+        # Initialize variables
+        changed = set()
+        topic   = message.get('topic', "")
+
+        with self.lock:
+
+            # Order updates, also filled and cancelled orders
+            if topic == "order":
+                for item in message['data']:
+                    self.store_order(item)
+                    changed.add(str(item['orderId']))
+
+            # Executions, one per (partial) fill
+            if topic == "execution":
+                for item in message['data']:
+                    self.executions.setdefault(str(item['orderId']), []).append(item)
+                    changed.add(str(item['orderId']))
+
+            # Wallet updates
+            if topic == "wallet":
+                for account in message['data']:
+                    if account.get('accountType') == "UNIFIED":
+                        self.store_wallet(account)
+
+            # The stream works
+            self.live = True
+
+        # Return changed orders
+        return changed
+
+    # Private websocket disconnected, forget all states as changes are missed until it is back
+    def lost(self):
+        with self.lock:
+            self.live = False
+            self.orders.clear()
+            self.executions.clear()
+            self.coins.clear()
+            self.wallet = {}
+
+    # Order in REST format, or None when not cached
+    def order(self, orderid):
+        with self.lock:
+            item = self.orders.get(str(orderid))
+            if item is None or not self.live:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return {'retCode': 0, 'retMsg': "OK", 'result': {'list': [item]}}
+
+    # Order state, or an empty string when not cached
+    def status(self, orderid):
+        with self.lock:
+            item = self.orders.get(str(orderid))
+            if item is None or not self.live:
+                return ""
+            return item['orderStatus']
+
+    # Wallet in REST format for comma separated coins, or None when not all coins are cached
+    def balance(self, coins):
+        names = coins.split(",")
+        with self.lock:
+            if not self.live or not self.wallet or any(name not in self.coins for name in names):
+                self.misses += 1
+                return None
+            self.hits += 1
+            account         = dict(self.wallet)
+            account['coin'] = [self.coins[name] for name in names]
+        return {'retCode': 0, 'retMsg': "OK", 'result': {'list': [account]}}
+
+    # Store REST response of an order query
+    def store_orders(self, response):
+        with self.lock:
+            for item in response.get('result', {}).get('list', []):
+                self.store_order(item)
+
+    # Store REST response of a wallet query
+    def store_balance(self, response):
+        with self.lock:
+            for account in response.get('result', {}).get('list', []):
+                self.store_wallet(account)
+
+    # Report use of cache
+    def report(self):
+        with self.lock:
+            hits, misses, live = self.hits, self.misses, self.live
+        total = hits + misses
+        ratio = (hits / total) * 100 if total > 0 else 0
+        return f"Order cache served {hits} of {total} requests ({ratio:.0f} %), private stream live is {live}"
@@ -3,20 +3,11 @@
 # Order functions
 
 # Load libraries
-from loader import load_config
-from pybit.unified_trading import HTTP
-import database, defs, distance, pprint, preload
+import clock, context, database, defs, distance, execution, pprint, preload
 
-# Load config
-config = load_config()
-
-# Connect to exchange
-session = HTTP(
-    testnet                 = False,
-    api_key                 = config.api_key,
-    api_secret              = config.api_secret,
-    return_response_headers = True
-)
+# Config and exchange session of the bot
+config  = context.config
+session = context.session
 
 # Get orderId from exchange order
 def order_id(order):
@@ -25,22 +16,28 @@ def order_id(order):
     id = order['result']['orderId']
     return id
 
-# Get order history
+# Get order history, an order flow, see execution.py
 def history(orderId):
     
     # Debug and speed
     debug = False
     speed = True
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
     
     # Initialize error code
     error_code = 0 
     
-    # First try realtime
+    # First try the private websocket
+    order = context.cache.order(orderId)
+    if order:
+        if speed: defs.announce(defs.report_exec(stime))
+        return order, error_code
+
+    # Then try realtime
     order   = {}
     message = defs.announce("session: get_open_orders")
     try:
-        order = session.get_open_orders(
+        order = yield from execution.request("query", session.get_open_orders,
             category = "spot",
             orderId  = str(orderId)
         )
@@ -51,12 +48,13 @@ def history(orderId):
     if order:
         order = defs.rate_limit(order)
         defs.log_exchange(order, message)
+        context.cache.store_orders(order)
       
     # If realtime fails, get it from history
     if order['result']['list'] == []:
         message = defs.announce("session: get_order_history") 
         try:
-            order = session.get_order_history(
+            order = yield from execution.request("query", session.get_order_history,
                 category = "spot",
                 orderId  = str(orderId)
             )
@@ -67,6 +65,7 @@ def history(orderId):
         if order:
             order = defs.rate_limit(order)
             defs.log_exchange(order, message)
+            context.cache.store_orders(order)
 
     # If realtime and history fails, throw an error
     if order['result']['list'] == []:
@@ -108,13 +107,13 @@ def decode(order):
     # Return order
     return transaction
 
-# Cancel an order at the exchange
+# Cancel an order at the exchange, an order flow
 def cancel(symbol, orderid):
 
     # Debug and speed
     debug = False
     speed = True
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
     
     # Initialize
     error_code = 0
@@ -124,7 +123,7 @@ def cancel(symbol, orderid):
     order   = {}
     message = defs.announce("session: cancel_order")
     try:
-        order = session.cancel_order(
+        order = yield from execution.request("cancel", session.cancel_order,
             category = "spot",
             symbol   = symbol,
             orderId  = str(orderid)
@@ -149,7 +148,7 @@ def cancel(symbol, orderid):
     # Return error code
     return error_code, exception    
 
-# Turn an order from the exchange into a properly formatted transaction after placing or amending an order
+# Turn an order from the exchange into a properly formatted transaction after placing or amending an order, an order flow
 def transaction_from_order(order):
 
     # Initialize variables
@@ -162,7 +161,7 @@ def transaction_from_order(order):
     orderId       = order_id(order)
 
     # Get order history and status
-    result        = history(orderId)
+    result        = yield from history(orderId)
     order_history = result[0]
     error_code    = result[1] 
 
@@ -173,11 +172,11 @@ def transaction_from_order(order):
     # Return transaction
     return transaction, error_code
 
-# Turn an order from the exchange into a properly formatted transaction after the order already exists
+# Turn an order from the exchange into a properly formatted transaction after the order already exists, an order flow
 def transaction_from_id(orderId):
     
     # Do logic
-    order_history = history(orderId)[0]
+    order_history = (yield from history(orderId))[0]
     transaction   = decode(order_history)
 
     # Return transaction
@@ -197,7 +196,8 @@ def set_trigger(spot, active_order, info):
         active_order['trigger'] = defs.round_number(spot * (1 - (active_order['fluctuation'] / 100)), info['tickSize'], "down")
         
     # Set initial trigger price so we can remember
-    active_order['trigger_ini'] = active_order['trigger']
+    active_order['trigger_ini']   = active_order['trigger']
+    active_order['trigger_amend'] = active_order['trigger']
 
     # Return active_order
     return active_order
@@ -234,19 +234,18 @@ def sell_matrix(spot, use_pricelimit, pricelimit_advice, info):
     return pricelimit_advice, message    
 
 # What orders and how much can we sell with profit
+@context.timed("check_sell")
 def check_sell(spot, profit, active_order, all_buys, use_pricelimit, pricelimit_advice, info):
 
-    # Debug and speed
+    # Debug
     debug = False
-    speed = True
-    stime = defs.now_utc()[4]
 
     # Initialize variables
     qty       = 0
     counter   = 0
     message   = ""
     rise_to   = ""
-    nearest   = []
+    nearest   = None
     distance  = active_order['distance']
     pre_sell  = False
     can_sell  = False
@@ -258,19 +257,13 @@ def check_sell(spot, profit, active_order, all_buys, use_pricelimit, pricelimit_
     pricelimit_advice = result[0]
     message           = result[1]
     
-    # Walk through buy database and find profitable buys
-    for transaction in all_buys:
-
-        # Only walk through closed buy orders
-        if transaction['status'] == 'Closed':
-                    
-            # Check if a transaction is profitable
-            profitable_price = transaction['avgPrice'] * (1 + ((profit + distance) / 100))
-            nearest.append(profitable_price - spot)
-            if spot >= profitable_price:
-                qty = qty + transaction['cumExecQty']
-                all_sells.append(transaction)
-                counter = counter + 1
+    # Find profitable closed buys, the nearest is the one with the lowest profitable price
+    factor    = 1 + ((profit + distance) / 100)
+    result    = all_buys.sellable(spot, factor)
+    all_sells = result[0]
+    qty       = result[1]
+    nearest   = result[2]
+    counter   = len(all_sells)
     
     # Adjust quantity to exchange regulations
     qty = defs.round_number(qty, info['basePrecision'], "down")
@@ -284,27 +277,24 @@ def check_sell(spot, profit, active_order, all_buys, use_pricelimit, pricelimit_
         can_sell = True
         defs.announce(f"Trying to sell {counter} orders for a total of {defs.format_number(qty, info['basePrecision'])} {info['baseCoin']}")
     else:
-        if nearest:
-            rise_to = f"{defs.format_number(min(nearest), info['tickSize'])} {info['quoteCoin']}"
+        if nearest is not None:
+            rise_to = f"{defs.format_number(nearest, info['tickSize'])} {info['quoteCoin']}"
 
     # We have orders to sell, but sell price limit is blocking
     if pre_sell and not pricelimit_advice['sell_result']:
         message = f"We could sell {counter} orders, but " + message
         defs.announce(message)        
 
-    # Report execution time
-    if speed: defs.announce(defs.report_exec(stime))
-
     # Return data
     return all_sells, qty, can_sell, rise_to
         
-# New buy order
+# New buy order, an order flow
 def buy(symbol, spot, compounding, active_order, all_buys, prices, info):
 
     # Debug and speed
     debug = False
     speed = True
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
     
     # Initialize variables
     order      = {}
@@ -334,7 +324,7 @@ def buy(symbol, spot, compounding, active_order, all_buys, prices, info):
     order   = {}
     message = defs.announce("session: place_order")
     try:
-        order = session.place_order(
+        order = yield from execution.request("place", session.place_order,
             category     = "spot",
             symbol       = symbol,
             side         = "Buy",
@@ -367,7 +357,7 @@ def buy(symbol, spot, compounding, active_order, all_buys, prices, info):
     defs.announce(message, True)
 
     # Get the transaction
-    result      = transaction_from_order(order)
+    result      = yield from transaction_from_order(order)
     transaction = result[0]
     error_code  = result[1]
     
@@ -391,13 +381,13 @@ def buy(symbol, spot, compounding, active_order, all_buys, prices, info):
     # Return trailing order and new buy order database
     return active_order, all_buys, info
     
-# New sell order
+# New sell order, an order flow
 def sell(symbol, spot, active_order, prices, info):
 
     # Debug and speed
     debug = False
     speed = True
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
 
     # Output to stdout
     defs.announce("*** SELL SELL SELL! ***")
@@ -419,7 +409,7 @@ def sell(symbol, spot, active_order, prices, info):
     order   = {}
     message = defs.announce("session: place_order")
     try:
-        order = session.place_order(
+        order = yield from execution.request("place", session.place_order,
             category     = "spot",
             symbol       = symbol,
             side         = "Sell",
@@ -463,7 +453,13 @@ def get_wallet(coins):
     # Debug
     debug = False
 
+    # First try the private websocket
+    wallet = context.cache.balance(coins)
+    if wallet:
+        return wallet
+
     # Get wallet
+    wallet  = {}
     message = defs.announce("session: get_wallet_balance")
     try:
         wallet = session.get_wallet_balance(
@@ -477,6 +473,7 @@ def get_wallet(coins):
     if wallet:
         wallet = defs.rate_limit(wallet)
         defs.log_exchange(wallet, message)
+        context.cache.store_balance(wallet)
 
     # Debug
     if debug:
@@ -498,13 +495,13 @@ def equity_safe(equity):
     # Return equity
     return equity
 
-# Rebalances the database vs exchange by removing orders with the highest price
+# Rebalances the database vs exchange by removing orders with the highest price, an order flow
 def rebalance(all_buys, info):
 
     # Debug and speed
     debug = False
     speed = True
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
 
     # Initialize variables
     wallet         = ()
@@ -520,13 +517,13 @@ def rebalance(all_buys, info):
         defs.announce("Trying to rebalance buys database with exchange data")
 
     # Get wallet for base coin
-    wallet = get_wallet(info['baseCoin'])
+    wallet = yield from execution.request("wallet", get_wallet, info['baseCoin'])
     
     # Get equity from wallet for basecoin
     equity_wallet = equity_safe(wallet['result']['list'][0]['coin'][0]['equity'])
   
     # Get equity from all buys for basecoin
-    equity_dbase  = float(sum(order['cumExecQty'] for order in all_buys))
+    equity_dbase  = float(all_buys.qty)
     equity_remind = float(equity_dbase)
     equity_diff   = equity_wallet - equity_dbase
 
@@ -542,13 +539,13 @@ def rebalance(all_buys, info):
         dbase_changed = True
         
         # Find the item with the highest avgPrice
-        highest_avg_price_item = max(all_buys, key=lambda x: x['avgPrice'])
+        highest_avg_price_item = all_buys.highest()
 
-        # Remove this item from the list
-        all_buys.remove(highest_avg_price_item)
+        # Remove this item from the book
+        all_buys.remove(highest_avg_price_item['orderId'])
         
-        # Recalculate all buys
-        equity_dbase = sum(order['cumExecQty'] for order in all_buys)    
+        # Running total of all buys
+        equity_dbase = all_buys.qty
 
     # Report
     if debug:
@@ -576,7 +573,7 @@ def report_wallet(spot, all_buys, info):
     # Debug and speed
     debug = False
     speed = True
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
 
     # Initialize variables
     coins     = ""
@@ -3,18 +3,11 @@
 # Preload ticker, klines, instrument info and other data
 
 # Load external libraries
-from loader import load_config
-from pybit.unified_trading import HTTP
-import database, defs, orders, os, pprint
+import buffers, buybook, clock, context, database, defs, marketdata, orders, os, pprint
 
-# Load config
-config = load_config()
-
-# Connect to exchange
-session = HTTP(
-    testnet = False,
-    return_response_headers = True
-)
+# Config and exchange session of the bot
+config  = context.config
+session = context.session
 
 # Preload ticker
 def get_ticker(symbol):
@@ -55,6 +48,31 @@ def get_ticker(symbol):
     # Return ticker
     return ticker
 
+# Get orderbook snapshot, used when the local orderbook missed an update
+def get_orderbook(symbol, limit):
+
+    # Initialize variables
+    data = {}
+
+    # Load orderbook via normal session
+    message = defs.announce("session: get_orderbook")
+    try:
+        data = session.get_orderbook(
+            category = "spot",
+            symbol   = symbol,
+            limit    = limit
+        )
+    except Exception as e:
+        defs.log_error(e)
+
+    # Check API rate limit and log data if possible
+    if data:
+        data = defs.rate_limit(data)
+        defs.log_exchange(data, message)
+
+    # Return orderbook
+    return data['result']
+
 # Preload klines
 def get_klines(symbol, interval, limit):
    
@@ -63,8 +81,8 @@ def get_klines(symbol, interval, limit):
     
     # Initialize variables
     data            = {}
-    klines          = {'time': [], 'open': [], 'high': [], 'low': [], 'close': [], 'volume': [], 'turnover': []}
-    end_timestamp   = defs.now_utc()[4]
+    klines          = buffers.KlineBuffer(limit)
+    end_timestamp   = clock.milliseconds()
     start_timestamp = end_timestamp - (interval * (limit - 1) * 60 * 1000)
 
     # Load klines via normal session
@@ -84,19 +102,17 @@ def get_klines(symbol, interval, limit):
         data = defs.rate_limit(data)
         defs.log_exchange(data, message)
     
-    # Transform klines into required format
-    for item in data['result']['list']:
-        klines['time'].append(int(item[0]))         # Time
-        klines['open'].append(float(item[1]))       # Open prices
-        klines['high'].append(float(item[2]))       # High prices
-        klines['low'].append(float(item[3]))        # Low prices
-        klines['close'].append(float(item[4]))      # Close prices
-        klines['volume'].append(float(item[5]))     # Volume
-        klines['turnover'].append(float(item[6]))   # Turnover
-        
-    # Reverse the items in the lists of the dictionary klines (thank you Bybit!)
-    for key in klines:
-        klines[key].reverse()
+    # Transform klines into required format, reverse the items (thank you Bybit!)
+    for item in reversed(data['result']['list']):
+        kline             = {}
+        kline['time']     = int(item[0])            # Time
+        kline['open']     = float(item[1])          # Open prices
+        kline['high']     = float(item[2])          # High prices
+        kline['low']      = float(item[3])          # Low prices
+        kline['close']    = float(item[4])          # Close prices
+        kline['volume']   = float(item[5])          # Volume
+        kline['turnover'] = float(item[6])          # Turnover
+        klines.append(kline)
         
     # Output to stdout
     defs.announce(f"Initial {limit} klines with {interval}m interval loaded from exchange")
@@ -119,14 +135,12 @@ def get_prices(symbol, interval, limit):
     debug = False
        
     # Initialize prices
-    prices = {}
+    prices = buffers.PriceBuffer(2 * limit)
 
     # Get kline with the lowest interval (1 minute)
     kline_prices = get_klines(symbol, interval, limit)
-    prices       = {
-        'time' : kline_prices['time'],
-        'price': kline_prices['close']
-    }
+    for time, price in zip(kline_prices['time'].tolist(), kline_prices['close'].tolist()):
+        prices.append(time, price)
 
     # Report to stdout
     defs.announce(f"Initial {limit} prices with {interval}m interval extracted from klines")
@@ -134,11 +148,66 @@ def get_prices(symbol, interval, limit):
     # Return prices
     return prices
 
+# Preload prices since time from recorded market data, None when less than minimum ms was recorded
+def get_recorded_prices(folder, since, minimum=0):
+
+    # Load recorded ticker prices
+    try:
+        ticks = marketdata.load(folder, ['ticker'])['ticker']
+    except (OSError, ValueError):
+        return None
+    ticks = ticks[ticks['time'] >= since]
+    if len(ticks) == 0 or ticks['time'][-1] - ticks['time'][0] < minimum:
+        return None
+
+    # Store in a buffer
+    prices = buffers.PriceBuffer(2 * len(ticks))
+    for time, price in zip(ticks['time'].tolist(), ticks['price'].tolist()):
+        prices.append(time, price)
+
+    # Report to stdout
+    defs.announce(f"Initial {len(ticks)} prices loaded from recorded market data")
+
+    # Return prices
+    return prices
+
+# Preload last recorded ticker, None when nothing was recorded
+def get_recorded_ticker(symbol, folder):
+
+    # Load recorded ticker prices
+    try:
+        ticks = marketdata.load(folder, ['ticker'])['ticker']
+    except (OSError, ValueError):
+        return None
+
+    # Transform ticker into required format
+    ticker = {'time': int(ticks['time'][-1]), 'symbol': symbol, 'lastPrice': float(ticks['price'][-1])}
+
+    # Output to stdout
+    defs.announce(f"Initial ticker price set to {ticker['lastPrice']} {ticker['symbol']} via recorded market data")
+
+    # Return ticker
+    return ticker
+
+# Preload instrument info that was recorded with the market data, None when there is none
+def get_recorded_info(folder, spot, multiplier, compounding):
+
+    # Load recorded instrument info
+    info = marketdata.instrument(folder)
+    if not info:
+        return None
+
+    # Calculate additional values
+    info = calc_info(info, spot, multiplier, compounding)
+
+    # Return instrument info
+    return info
+
 # Combine two lists of prices
 def combine_prices(prices_1, prices_2):
     
     # Combine and sort by 'time'
-    prices = sorted(zip(prices_1['time'] + prices_2['time'], prices_1['price'] + prices_2['price']))
+    prices = sorted(zip(prices_1['time'].tolist() + prices_2['time'].tolist(), prices_1['price'].tolist() + prices_2['price'].tolist()))
 
     # Use a dictionary to remove duplicates, keeping the first occurrence of each 'time'
     unique_prices = {}
@@ -146,11 +215,10 @@ def combine_prices(prices_1, prices_2):
         if t not in unique_prices:
             unique_prices[t] = p
 
-    # Separate into 'time' and 'price' lists
-    combined_prices = {
-        'time': list(unique_prices.keys()),
-        'price': list(unique_prices.values())
-    }
+    # Store in a new buffer
+    combined_prices = buffers.PriceBuffer(2 * len(unique_prices))
+    for t, p in unique_prices.items():
+        combined_prices.append(t, p)
     
     # Return combined list
     return combined_prices
@@ -284,7 +352,7 @@ def check_orders(transactions, info):
     
     # Initialize variables
     message          = ""
-    all_buys         = []
+    all_buys         = buybook.BuyBook()
     transaction      = {}
     temp_transaction = {}
     quick            = config.quick_check
@@ -302,16 +370,16 @@ def check_orders(transactions, info):
             temp_transaction = transaction
             if transaction['status'] != "Closed":
                 defs.announce("Performing an additional check on order status via exchange")
-                temp_transaction = orders.transaction_from_id(transaction['orderId'])
+                temp_transaction = context.worker.complete(orders.transaction_from_id(transaction['orderId']))
         else:
             # Check all order on exchange regardless of status
             defs.announce(f"Checking order on exchange: {transaction['orderId']}")
-            temp_transaction = orders.transaction_from_id(transaction['orderId'])
+            temp_transaction = context.worker.complete(orders.transaction_from_id(transaction['orderId']))
 
         # Assign status
         if "Filled" in temp_transaction['orderStatus']:
             temp_transaction['status'] = "Closed"
-            all_buys.append(temp_transaction)
+            all_buys.add(temp_transaction)
         
     # Save refreshed database
     database.save(all_buys, info)
@@ -0,0 +1,129 @@
+### Sunflow Cryptobot ###
+#
+# Sampling profiler of all threads and a deterministic profiler for backtests
+
+# Load libraries
+import cProfile, io, os, pstats, sys, threading, time
+
+# The sampler looks at the stacks of all threads every interval seconds from a thread of its own, it never changes
+# what the other threads do, so it can be started and stopped on a live bot. A sample costs about as much as a few
+# function calls per thread, at the default interval of 10 ms that is well under one percent of a core. At the end
+# the stacks are written in the collapsed format of flame graphs, one line per stack with the number of samples, and a
+# summary of the functions with the most samples, on top of the stack (self) and anywhere in it (total). A sample is
+# taken when the sampler gets the GIL, so C functions that release it, like socket reads and some of numpy, get more
+# than their share of samples, the cProfile mode gives exact numbers of a backtest.
+class Sampler:
+
+    # Initialize sampler
+    def __init__(self, seconds, interval=0.01, folder="", done=None):
+        self.seconds  = seconds
+        self.interval = interval
+        self.folder   = folder
+        self.done     = done                     # Gets the summary when finished
+        self.stacks   = {}
+        self.samples  = 0
+        self.cost     = 0.0
+        self.thread   = None
+
+    # Start sampling on a thread of its own
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="profiler", daemon=True)
+        self.thread.start()
+
+    # Take one sample of every other thread
+    def sample(self):
+        start = time.perf_counter()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own   = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            stack.append(names.get(ident, "unknown"))
+            stack.reverse()
+            key = ";".join(stack)
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.samples += 1
+        self.cost    += time.perf_counter() - start
+
+    # Sample until done, write the files and report
+    def run(self):
+        deadline = time.monotonic() + self.seconds
+        moment   = time.monotonic()
+        while moment < deadline:
+            self.sample()
+            moment = moment + self.interval
+            time.sleep(max(moment - time.monotonic(), 0))
+        message = self.write()
+        if self.done:
+            self.done(message)
+
+    # Functions with the most samples on top of the stack and anywhere in the stack
+    def top(self, count=20):
+        own, total, threads = {}, {}, {}
+        for key, number in self.stacks.items():
+            frames = key.split(";")
+            threads[frames[0]] = threads.get(frames[0], 0) + number
+            if len(frames) > 1:
+                own[frames[-1]] = own.get(frames[-1], 0) + number
+            for frame in set(frames[1:]):
+                total[frame] = total.get(frame, 0) + number
+        ranked = lambda counts: sorted(counts.items(), key=lambda item: item[1], reverse=True)[:count]
+        return ranked(own), ranked(total), ranked(threads)
+
+    # Write collapsed stacks and summary to the folder, returns the summary
+    def write(self):
+        os.makedirs(self.folder or ".", exist_ok=True)
+        name = os.path.join(self.folder, f"profile-{time.strftime('%Y%m%d-%H%M%S')}")
+        with open(name + ".collapsed", 'w', encoding='utf-8') as file:
+            for key, number in sorted(self.stacks.items()):
+                file.write(f"{key} {number}\n")
+        own, total, threads = self.top()
+        lines = [f"Sampled {self.samples} times in {self.seconds} s, every {self.interval * 1000:.0f} ms, sampling took {self.cost / max(self.samples, 1) * 1000000:.0f} us per sample"]
+        lines.append("\nSamples per thread:")
+        lines.extend(f"{number:8d}  {thread}" for thread, number in threads)
+        for title, ranking in (("self, on top of the stack", own), ("total, anywhere in the stack", total)):
+            lines.append(f"\nTop functions by {title}:")
+            lines.extend(f"{number:8d} {number / max(self.samples, 1) * 100:6.1f} %  {frame}" for frame, number in ranking)
+        summary = "\n".join(lines) + "\n"
+        with open(name + ".txt", 'w', encoding='utf-8') as file:
+            file.write(summary)
+        return f"Profile written to {name}.collapsed and {name}.txt\n" + summary
+
+# The sampler that runs, only one at a time
+current = None
+lock    = threading.Lock()
+
+# Start sampling, returns False when a sampler is running already
+def sample(seconds, interval=0.01, folder="", done=None):
+    global current
+    with lock:
+        if current is not None and current.thread.is_alive():
+            return False
+        current = Sampler(seconds, interval, folder, done)
+        current.start()
+    return True
+
+# Run function under cProfile, write the statistics and a summary of the functions that took the most time to the
+# folder, returns the result of function and the summary
+def deterministic(function, folder="", count=30):
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        result = function()
+    finally:
+        profile.disable()
+    os.makedirs(folder or ".", exist_ok=True)
+    name = os.path.join(folder, f"cprofile-{time.strftime('%Y%m%d-%H%M%S')}")
+    profile.dump_stats(name + ".prof")
+    text = io.StringIO()
+    stats = pstats.Stats(profile, stream=text).strip_dirs()
+    stats.sort_stats("cumulative").print_stats(count)
+    stats.sort_stats("tottime").print_stats(count)
+    with open(name + ".txt", 'w', encoding='utf-8') as file:
+        file.write(text.getvalue())
+    return result, f"Profile written to {name}.prof and {name}.txt"
@@ -0,0 +1,172 @@
+### Sunflow Cryptobot ###
+#
+# Market data recorder, writes the websocket streams to disk for backtests and analysis
+
+# Load libraries
+from datetime import datetime, timezone
+import glob, json, os, queue, threading, time
+import numpy as np
+import marketdata
+
+# Messages of the websocket callbacks are put on a bounded queue and never wait, when the queue is full the message
+# is dropped and counted. A writer thread turns the messages into records of marketdata.streams and writes them as
+# compressed NumPy record blocks, one folder per stream and one chunk file per flush, named after the hour of the
+# records. A chunk is written to a temporary file first and renamed when complete, files are never changed after
+# that. The folder is read by marketdata.load(), so it can be replayed with --backtest right away.
+class Recorder:
+
+    # Initialize recorder, flush is the maximum time in seconds records wait in memory
+    def __init__(self, folder, symbol, size=10000, flush=60):
+        self.folder  = folder
+        self.symbol  = symbol
+        self.flush   = flush
+        self.queue   = queue.Queue(maxsize=size)
+        self.rows    = {stream: [] for stream in marketdata.streams}
+        self.hours   = {stream: None for stream in marketdata.streams}
+        self.stats   = {'messages': 0, 'records': 0, 'chunks': 0, 'dropped': 0, 'errors': 0}
+        self.written = time.monotonic()
+        self.thread  = None
+
+    # Start writer thread
+    def start(self):
+        for stream in marketdata.streams:
+            os.makedirs(os.path.join(self.folder, stream), exist_ok=True)
+        self.thread = threading.Thread(target=self.run, name="recorder", daemon=True)
+        self.thread.start()
+
+    # Store instrument info with the streams, so a backtest uses the same precisions
+    def instrument(self, info):
+        keys = ('symbol', 'baseCoin', 'quoteCoin', 'basePrecision', 'quotePrecision', 'minOrderQty', 'maxOrderQty', 'minOrderAmt', 'maxOrderAmt', 'tickSize')
+        os.makedirs(self.folder, exist_ok=True)
+        with open(os.path.join(self.folder, marketdata.info_file), 'w', encoding='utf-8') as json_file:
+            json.dump({key: info[key] for key in keys}, json_file)
+
+    # Record message of stream, called by the websocket callbacks
+    def record(self, stream, message):
+        try:
+            self.queue.put_nowait((stream, message))
+        except queue.Full:
+            self.stats['dropped'] += 1
+
+    # Wrap callback, so the message is recorded before it is passed on
+    def wrap(self, stream, callback):
+        def recorded(message):
+            self.record(stream, message)
+            callback(message)
+        return recorded
+
+    # Write everything that is waiting and stop the writer thread
+    def close(self):
+        if self.thread is None:
+            return
+        self.queue.put((None, None))
+        self.thread.join()
+        self.thread = None
+
+    # Writer thread
+    def run(self):
+        while True:
+
+            # Get next message, wake up now and then to flush
+            try:
+                stream, message = self.queue.get(timeout=1)
+            except queue.Empty:
+                stream, message = "", None
+
+            # Stop
+            if stream is None:
+                self.write_all()
+                return
+
+            # Convert message
+            if message is not None:
+                try:
+                    self.convert(stream, message)
+                    self.stats['messages'] += 1
+                except (KeyError, IndexError, TypeError, ValueError):
+                    self.stats['errors'] += 1
+
+            # Flush records that waited long enough
+            if time.monotonic() - self.written > self.flush:
+                self.write_all()
+
+    # Turn message into rows of records
+    def convert(self, stream, message):
+
+        # Initialize variables
+        moment = int(message['ts'])
+        rows   = []
+
+        # Ticker, simulated tickers are not market data
+        if stream == 'ticker':
+            if 'simulated' in message['data']:
+                return
+            rows.append((moment, float(message['data']['lastPrice'])))
+
+        # Klines, the interval is part of the topic
+        elif stream == 'kline':
+            interval = int(message['topic'].split(".")[1])
+            for kline in message['data']:
+                rows.append((moment, interval, int(kline['start']), float(kline['open']), float(kline['high']), float(kline['low']),
+                             float(kline['close']), float(kline['volume']), float(kline['turnover']), bool(kline['confirm'])))
+
+        # Orderbook, one row per level
+        elif stream == 'orderbook':
+            update   = int(message['data']['u'])
+            snapshot = message['type'] == "snapshot"
+            for side, key in ((0, 'b'), (1, 'a')):
+                for price, qty in message['data'][key]:
+                    rows.append((moment, update, snapshot, side, float(price), float(qty)))
+
+        # Trades, one row per trade
+        elif stream == 'trade':
+            for trade in message['data']:
+                rows.append((int(trade['T']), 1 if trade['S'] == "Sell" else 0, float(trade['p']), float(trade['v'])))
+
+        # Records of a new hour go to a new chunk
+        if not rows:
+            return
+        hour = moment // 3600000
+        if self.hours[stream] is not None and hour != self.hours[stream]:
+            self.write(stream)
+        self.hours[stream] = hour
+        self.rows[stream].extend(rows)
+
+    # Write all streams
+    def write_all(self):
+        for stream in marketdata.streams:
+            self.write(stream)
+        self.written = time.monotonic()
+
+    # Write waiting records of stream as a new chunk
+    def write(self, stream):
+
+        # Anything to write?
+        rows = self.rows[stream]
+        if not rows:
+            return
+        self.rows[stream] = []
+
+        # Chunks are named after their hour and numbered within it, so sorting the names sorts them by time
+        hour   = datetime.fromtimestamp(self.hours[stream] * 3600, timezone.utc).strftime('%Y%m%d-%H')
+        folder = os.path.join(self.folder, stream)
+        number = len(glob.glob(os.path.join(folder, hour + "-*.npz")))
+        file   = os.path.join(folder, f"{hour}-{number:04d}.npz")
+
+        # Write to temporary file and rename when complete
+        records = np.array(rows, dtype=marketdata.streams[stream])
+        try:
+            with open(file + ".tmp", 'wb') as chunk:
+                np.savez_compressed(chunk, **{stream: records})
+            os.replace(file + ".tmp", file)
+        except OSError:
+            self.stats['errors'] += 1
+            return
+        self.stats['records'] += len(records)
+        self.stats['chunks']  += 1
+
+    # Report recorder
+    def report(self):
+        message = f"Recorder wrote {self.stats['records']} records in {self.stats['chunks']} chunks from {self.stats['messages']} messages, "
+        message = message + f"dropped {self.stats['dropped']} messages and had {self.stats['errors']} errors, {self.queue.qsize()} waiting"
+        return message
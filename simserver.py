@@ -0,0 +1,441 @@
+### Sunflow Cryptobot ###
+#
+# Simulated exchange server, a local stand-in for Bybit so Sunflow can be tested end to end without network
+#
+# Use with or without config file, Sunflow connects to it when exchange_url in its config is set to this server:
+# python simserver.py
+# python simserver.py -c {optional path/}your_config.py
+
+
+### Initialize ###
+
+# Load external libraries
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+import argparse, base64, hashlib, importlib, itertools, json, random, struct, sys, threading, time
+import numpy as np
+
+# Parse command line arguments
+parser = argparse.ArgumentParser(description="Run a simulated exchange for Sunflow with a specified config.")
+parser.add_argument('-c', '--config', default='config.py', help='Specify the config file (with .py extension).')
+args = parser.parse_args()
+
+# Resolve config file path
+config_path = Path(args.config).resolve()
+if not config_path.exists():
+    print(f"Config file not found at {config_path}, aborting...\n")
+    sys.exit()
+
+# Dynamically load the config module
+sys.path.append(str(config_path.parent))
+config_module_name = config_path.stem
+config = importlib.import_module(config_module_name)
+
+# Load internal libraries
+import backtest, clock, defs, loader, marketdata, simulator
+config = loader.defaults(config)
+
+# Endpoints of the HTTP API, private endpoints return rate limit headers
+routes = {
+    ('GET', "/v5/market/tickers")         : ('get_tickers', False),
+    ('GET', "/v5/market/kline")           : ('get_kline', False),
+    ('GET', "/v5/market/orderbook")       : ('get_orderbook', False),
+    ('GET', "/v5/market/instruments-info"): ('get_instruments_info', False),
+    ('GET', "/v5/market/time")            : ('get_server_time', False),
+    ('POST', "/v5/order/create")          : ('place_order', True),
+    ('POST', "/v5/order/amend")           : ('amend_order', True),
+    ('POST', "/v5/order/cancel")          : ('cancel_order', True),
+    ('GET', "/v5/order/realtime")         : ('get_open_orders', True),
+    ('GET', "/v5/order/history")          : ('get_order_history', True),
+    ('GET', "/v5/account/wallet-balance") : ('get_wallet_balance', True)
+}
+
+# Websocket handshake key
+websocket_guid = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+### Market data ###
+
+# Random walk of one price per second from start to end, with a trade per price and an orderbook snapshot around
+# the price every 10 seconds from now on
+def random_walk(start, end, now, info):
+
+    # Initialize variables
+    rng   = np.random.default_rng(config.simulator_seed)
+    tick  = info['tickSize']
+    times = np.arange(start - start % 1000, end, 1000, dtype=np.int64)
+
+    # Prices
+    steps  = rng.normal(0, config.simulator_volatility, len(times))
+    prices = np.round(np.round(config.simulator_price * np.exp(np.cumsum(steps)) / tick) * tick, 10)
+    ticker = np.zeros(len(times), dtype=marketdata.streams['ticker'])
+    ticker['time']  = times
+    ticker['price'] = prices
+
+    # Trades, a falling price is a sell
+    live  = times >= now
+    trade = np.zeros(int(live.sum()), dtype=marketdata.streams['trade'])
+    trade['time']  = times[live]
+    trade['side']  = np.diff(prices, prepend=prices[0])[live] < 0
+    trade['price'] = prices[live]
+    trade['size']  = np.round(rng.exponential(100, len(trade)), 2)
+
+    # Orderbook snapshots of 25 levels per side
+    levels    = 25
+    snapshots = times[live][::10]
+    mids      = prices[live][::10]
+    orderbook = np.zeros(len(snapshots) * 2 * levels, dtype=marketdata.streams['orderbook'])
+    depth     = np.tile(np.arange(1, levels + 1), 2)
+    sides     = np.repeat([0, 1], levels)
+    orderbook['time']     = np.repeat(snapshots, 2 * levels)
+    orderbook['update']   = np.repeat(np.arange(1, len(snapshots) + 1), 2 * levels)
+    orderbook['snapshot'] = True
+    orderbook['side']     = np.tile(sides, len(snapshots))
+    orderbook['price']    = np.round(np.repeat(mids, 2 * levels) + np.tile(np.where(sides, depth, -depth), len(snapshots)) * tick, 10)
+    orderbook['qty']      = np.round(rng.exponential(1000, len(orderbook)), 2)
+
+    # Return market data
+    return {'ticker': ticker, 'trade': trade, 'orderbook': orderbook}
+
+# Move recorded market data in time, so the moment replaying starts is now. The shift is a whole number of the
+# largest kline interval, so klines keep their start times.
+def shift(data, start, now):
+    step   = max(config.interval_1, config.interval_2, config.interval_3, 60) * 60 * 1000
+    offset = ((now - start) // step + 1) * step
+    moved  = {}
+    for stream, records in data.items():
+        moved[stream]          = np.array(records)
+        moved[stream]['time'] += offset
+        if stream == 'kline':
+            moved[stream]['start'] += offset
+    return moved, offset
+
+
+### Websocket ###
+
+# Websocket connection of a client, the server only sends messages of the topics the client subscribed to
+class Client:
+
+    # Initialize client on the connection of a request
+    def __init__(self, handler, private, number):
+        self.handler = handler
+        self.private = private
+        self.number  = number
+        self.topics  = set()
+        self.lock    = threading.Lock()
+        self.open    = True
+
+    # Read one frame, client frames are always masked
+    def receive(self):
+        head = self.handler.rfile.read(2)
+        if len(head) < 2:
+            return None, None
+        opcode = head[0] & 0x0f
+        length = head[1] & 0x7f
+        if length == 126:
+            length = struct.unpack(">H", self.handler.rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", self.handler.rfile.read(8))[0]
+        mask    = self.handler.rfile.read(4) if head[1] & 0x80 else b"\x00\x00\x00\x00"
+        payload = self.handler.rfile.read(length)
+        return opcode, bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+
+    # Send one frame, a client that can not keep up is closed
+    def send(self, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            head = struct.pack(">BB", 0x80 | opcode, length)
+        elif length < 65536:
+            head = struct.pack(">BBH", 0x80 | opcode, 126, length)
+        else:
+            head = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+        with self.lock:
+            if not self.open:
+                return
+            try:
+                self.handler.wfile.write(head + payload)
+            except OSError:
+                self.open = False
+
+    # Send message as JSON text
+    def send_json(self, message):
+        self.send(0x1, json.dumps(message).encode())
+
+    # Answer requests until the connection is closed
+    def serve(self, server):
+        while self.open:
+
+            # Next frame
+            try:
+                opcode, payload = self.receive()
+            except OSError:
+                break
+
+            # Closed, ping or text
+            if opcode is None or opcode == 0x8:
+                self.send(0x8, b"")
+                break
+            if opcode == 0x9:
+                self.send(0xa, payload)
+            if opcode != 0x1:
+                continue
+
+            # Requests of pybit, it stores a subscription after sending it, so answer no faster than a remote exchange
+            request = json.loads(payload)
+            if request.get('op') == "subscribe":
+                time.sleep(0.05)
+            answer  = {'success': True, 'ret_msg': "", 'conn_id': str(self.number), 'op': request.get('op')}
+            if 'req_id' in request:
+                answer['req_id'] = request['req_id']
+            if request.get('op') == "ping":
+                answer['ret_msg'] = "pong"
+            self.send_json(answer)
+            if request.get('op') == "subscribe":
+                for topic in request.get('args', []):
+                    self.topics.add(topic)
+                    server.subscribed(self, topic)
+
+        # Connection is done
+        self.open = False
+
+
+### Server ###
+
+# Simulated exchange with market data that is replayed in real time, answering the HTTP API and pushing the public
+# and private websocket topics. Every request can be delayed and can fail at random, private requests are rate
+# limited per endpoint like Bybit does.
+class Server:
+
+    # Initialize server
+    def __init__(self):
+
+        # Instrument info and start of replay
+        now  = clock.milliseconds()
+        info = marketdata.instrument(config.simulator_data) if config.simulator_data else None
+        info = info or dict(config.backtest_instrument)
+        info['symbol'] = config.symbol
+        warmup         = max(config.simulator_warmup, backtest.warmup(config))
+
+        # Market data, recorded or a random walk
+        if config.simulator_data:
+            data         = marketdata.load(config.simulator_data)
+            first, last  = int(data['ticker']['time'][0]), int(data['ticker']['time'][-1])
+            data, offset = shift(data, first + warmup, now)
+            self.end     = last + offset
+        else:
+            self.end = now + config.simulator_hours * 3600000
+            data     = random_walk(now - warmup, self.end, now, info)
+
+        # Exchange
+        self.market   = marketdata.Market(data, config.symbol, config.backtest_push)
+        self.exchange = simulator.Exchange(self.market, info, config.backtest_fee, config.backtest_balance)
+        self.exchange.changed = self.changed
+        self.exchange.tick(self.market.price(now))
+        self.start    = now
+
+        # Clients, rate limits and faults
+        self.clients  = []
+        self.numbers  = itertools.count(1)
+        self.windows  = {}
+        self.lock     = threading.Lock()
+        self.random   = random.Random(config.simulator_seed)
+        self.stats    = {'requests': 0, 'errors': 0, 'limited': 0, 'messages': 0}
+
+    # Streams that are replayed, klines of the config intervals
+    def streams(self):
+        names = ['ticker', 'orderbook', 'trade']
+        for interval in (config.interval_1, config.interval_2, config.interval_3):
+            if interval != 0 and f"kline.{interval}" not in names:
+                names.append(f"kline.{interval}")
+        return names
+
+    # Replay market data in real time
+    def feed(self):
+        for moment, name, message in self.market.messages(self.streams(), self.start):
+
+            # Wait for the moment of the message
+            delay = (moment - clock.milliseconds()) / 1000
+            if delay > 0:
+                time.sleep(delay)
+
+            # Exchange sees prices and orderbook first
+            if name == 'ticker':
+                self.exchange.tick(float(message['data']['lastPrice']))
+            if name == 'orderbook':
+                with self.exchange.lock:
+                    self.exchange.book.update(message)
+
+            # Push to subscribers
+            self.publish(message['topic'], message, False)
+
+        # Nothing left to replay
+        defs.announce("End of market data reached, prices stand still from now on")
+
+    # Send message to all clients that subscribed to topic
+    def publish(self, topic, message, private):
+        with self.lock:
+            self.clients = [client for client in self.clients if client.open]
+            clients      = [client for client in self.clients if client.private == private and topic in client.topics]
+        for client in clients:
+            client.send_json(message)
+            self.stats['messages'] += 1
+
+    # Client subscribed to topic, a new orderbook subscriber gets a snapshot first
+    def subscribed(self, client, topic):
+        if topic.startswith("orderbook."):
+            book     = self.exchange.get_orderbook(limit=200)[0]['result']
+            snapshot = {'topic': topic, 'ts': book['ts'], 'type': "snapshot", 'data': {'s': book['s'], 'b': book['b'], 'a': book['a'], 'u': book['u'], 'seq': book['u']}}
+            client.send_json(snapshot)
+
+    # Exchange changed an order, push wallet and execution of a fill before the order to the private stream, so a
+    # client that acts on the order already knows the new balance
+    def changed(self, order, filled):
+        now = clock.milliseconds()
+        if filled:
+            account   = self.exchange.account([self.exchange.info['baseCoin'], self.exchange.info['quoteCoin']])
+            execution = {'orderId': order['orderId'], 'symbol': order['symbol'], 'side': order['side'], 'execPrice': order['avgPrice'],
+                         'execQty': order['cumExecQty'], 'execValue': order['cumExecValue'], 'execFee': order['cumExecFee'], 'execTime': str(now)}
+            self.publish("wallet", {'topic': "wallet", 'id': str(now), 'creationTime': now, 'data': [account]}, True)
+            self.publish("execution", {'topic': "execution", 'id': str(now), 'creationTime': now, 'data': [execution]}, True)
+        self.publish("order", {'topic': "order", 'id': str(now), 'creationTime': now, 'data': [order]}, True)
+
+    # Count request of endpoint in the current second, returns rate limit headers and whether it is allowed
+    def limit(self, path):
+        second = clock.milliseconds() // 1000
+        with self.lock:
+            window = self.windows.get(path)
+            if window is None or window[0] != second:
+                window = self.windows[path] = [second, 0]
+            window[1] += 1
+            remaining = config.simulator_limit - window[1]
+        headers = {
+            'X-Bapi-Limit'                : str(config.simulator_limit),
+            'X-Bapi-Limit-Status'         : str(max(remaining, 0)),
+            'X-Bapi-Limit-Reset-Timestamp': str((second + 1) * 1000)
+        }
+        return headers, remaining >= 0
+
+    # Answer HTTP request
+    def request(self, method, path, params):
+
+        # Initialize variables
+        headers = {}
+        self.stats['requests'] += 1
+
+        # Latency
+        delay = config.simulator_latency + self.random.uniform(0, config.simulator_jitter)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+        # Unknown endpoint
+        route = routes.get((method, path))
+        if route is None:
+            return 404, {'retCode': 10404, 'retMsg': f"Unknown endpoint {method} {path}", 'result': {}}, headers
+        name, private = route
+
+        # Rate limit
+        if private:
+            headers, allowed = self.limit(path)
+            if not allowed:
+                self.stats['limited'] += 1
+                return 200, {'retCode': 10006, 'retMsg': "Too many visits!", 'result': {}}, headers
+
+        # Injected error
+        if self.random.random() < config.simulator_errors:
+            self.stats['errors'] += 1
+            return 200, {'retCode': 10016, 'retMsg': "Internal server error.", 'result': {}}, headers
+
+        # Exchange
+        try:
+            data = getattr(self.exchange, name)(**params)[0]
+        except simulator.RequestError as e:
+            return 200, {'retCode': e.code, 'retMsg': e.message, 'result': {}}, headers
+        except (KeyError, ValueError) as e:
+            return 200, {'retCode': 10001, 'retMsg': f"Parameter error: {e}", 'result': {}}, headers
+
+        # Return response
+        return 200, data, headers
+
+    # Report server
+    def report(self):
+        message = f"Served {self.stats['requests']} requests ({self.stats['errors']} injected errors, {self.stats['limited']} rate limited) "
+        message = message + f"and {self.stats['messages']} websocket messages, equity {self.exchange.equity():.6f} {self.exchange.info['quoteCoin']}"
+        return message
+
+# HTTP requests and websocket upgrades on the same port
+class Handler(BaseHTTPRequestHandler):
+
+    # Keep connections open like the exchange does, and send small responses right away, headers and body are
+    # written separately and would otherwise wait for the delayed acknowledgement of the client
+    protocol_version        = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    # Only log errors
+    def log_message(self, format, *args):
+        return
+
+    # Send JSON response
+    def respond(self, status, data, headers):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Get requests and websocket upgrades
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if self.headers.get("Upgrade", "").lower() == "websocket":
+            self.upgrade(url.path)
+            return
+        self.respond(*self.server.simulation.request("GET", url.path, dict(parse_qsl(url.query))))
+
+    # Post requests have a JSON body
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        params = json.loads(self.rfile.read(length) or b"{}")
+        self.respond(*self.server.simulation.request("POST", urlsplit(self.path).path, params))
+
+    # Switch to websocket and serve the client until it leaves
+    def upgrade(self, path):
+        simulation = self.server.simulation
+        accept     = base64.b64encode(hashlib.sha1((self.headers["Sec-WebSocket-Key"] + websocket_guid).encode()).digest()).decode()
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        client = Client(self, path.endswith("/private"), next(simulation.numbers))
+        with simulation.lock:
+            simulation.clients.append(client)
+        self.connection.settimeout(60)
+        client.serve(simulation)
+        self.close_connection = True
+
+# Run server
+def main():
+
+    # Create exchange and start replaying
+    simulation = Server()
+    threading.Thread(target=simulation.feed, name="feed", daemon=True).start()
+
+    # Serve requests
+    server = ThreadingHTTPServer(("127.0.0.1", config.simulator_port), Handler)
+    server.daemon_threads = True
+    server.simulation     = simulation
+    defs.announce(f"Simulated exchange for {config.symbol} at http://127.0.0.1:{config.simulator_port} until {simulation.end - simulation.start} ms of market data run out")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+    # Report
+    defs.announce(simulation.report())
+
+# Start
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+### Sunflow Cryptobot ###
+#
+# Simulated exchange with the same session interface as pybit
+
+# Load libraries
+from datetime import timedelta
+import itertools, threading
+import clock, defs, orderbook
+
+# Errors are raised with the message format of pybit, callers look for the error code in the message
+class RequestError(Exception):
+
+    # Initialize error with the message and code the exchange returns
+    def __init__(self, message, code):
+        super().__init__(f"{message} (ErrCode: {code}) (ErrTime: {clock.now().strftime('%H:%M:%S')}).")
+        self.message = message
+        self.code    = code
+
+# Spot exchange for one symbol that answers the HTTP calls Sunflow makes, with responses shaped like pybit returns
+# them when response headers are requested. Orders are trigger price market orders, an order is filled at the first
+# price that crosses its trigger price, with the fee in base coin for buys and in quote coin for sells. Prices and
+# quantities are rounded to tickSize and basePrecision like the exchange does. Prices come from recorded market
+# data via tick(), the time from the clock. Equity, exposure and drawdown are followed on every price.
+class Exchange:
+
+    # Initialize exchange, fee in percentage and starting balance in quote coin
+    def __init__(self, market, info, fee, balance):
+        self.market  = market
+        self.info    = info
+        self.fee     = fee / 100
+        self.coins   = {info['baseCoin']: 0.0, info['quoteCoin']: float(balance)}
+        self.orders  = {}
+        self.waiting = {}
+        self.ids     = itertools.count(1000000000000000001)
+        self.book    = orderbook.OrderBook()
+        self.price   = 0.0
+        self.lock    = threading.RLock()
+        self.stats   = {'start': float(balance), 'buys': 0, 'sells': 0, 'fees': 0.0, 'peak': float(balance), 'drawdown': 0.0, 'exposure': 0.0}
+        self.changed = None                      # Gets every changed order and whether it was filled, for example to push it to a private stream
+
+    # Pybit response with rate limit headers
+    def response(self, result):
+        data    = {'retCode': 0, 'retMsg': "OK", 'result': result, 'retExtInfo': {}, 'time': clock.milliseconds()}
+        headers = {'X-Bapi-Limit': "20", 'X-Bapi-Limit-Status': "20", 'X-Bapi-Limit-Reset-Timestamp': str(clock.milliseconds())}
+        return data, timedelta(0), headers
+
+    # Raise error like pybit does
+    def error(self, message, code):
+        raise RequestError(message, code)
+
+    # Report changed order
+    def change(self, order, filled=False):
+        if self.changed:
+            self.changed(dict(order), filled)
+
+    # Order that can still be changed
+    def find(self, kwargs):
+        order = self.waiting.get(str(kwargs.get('orderId', "")))
+        if order is None:
+            self.error("Order does not exist.", 170213)
+        return order
+
+    # Value of the wallet in quote coin
+    def equity(self):
+        return self.coins[self.info['quoteCoin']] + self.coins[self.info['baseCoin']] * self.price
+
+    # New price, fills all orders of which the trigger price was crossed
+    def tick(self, price):
+        with self.lock:
+
+            # Fill triggered orders
+            self.price = price
+            for orderid, order in list(self.waiting.items()):
+                trigger = float(order['triggerPrice'])
+                if (order['side'] == "Buy" and price >= trigger) or (order['side'] == "Sell" and price <= trigger):
+                    del self.waiting[orderid]
+                    self.fill(order, price)
+
+            # Follow equity, exposure and drawdown
+            equity = self.equity()
+            self.stats['peak']     = max(self.stats['peak'], equity)
+            self.stats['drawdown'] = max(self.stats['drawdown'], self.stats['peak'] - equity)
+            self.stats['exposure'] = max(self.stats['exposure'], self.coins[self.info['baseCoin']] * price)
+
+    # Fill a triggered order at price
+    def fill(self, order, price):
+
+        # Initialize variables
+        base  = self.info['baseCoin']
+        quote = self.info['quoteCoin']
+        qty   = float(order['qty'])
+
+        # Buy quantity is in quote coin, the fee is paid in base coin
+        if order['side'] == "Buy":
+            executed = defs.round_number(qty / price, self.info['basePrecision'], "down")
+            value    = executed * price
+            fee      = executed * self.fee
+            enough   = value <= self.coins[quote]
+            if enough:
+                self.coins[quote] -= value
+                self.coins[base]  += executed - fee
+                self.stats['buys'] += 1
+                self.stats['fees'] += fee * price
+
+        # Sell quantity is in base coin, the fee is paid in quote coin
+        else:
+            executed = qty
+            value    = executed * price
+            fee      = value * self.fee
+            enough   = executed <= self.coins[base] + self.info['basePrecision'] / 2
+            if enough:
+                self.coins[base]  = max(self.coins[base] - executed, 0.0)
+                self.coins[quote] += value - fee
+                self.stats['sells'] += 1
+                self.stats['fees']  += fee
+
+        # The exchange cancels a triggered order without enough balance
+        order['updatedTime'] = str(clock.milliseconds())
+        if not enough:
+            order['orderStatus'] = "Cancelled"
+            self.change(order)
+            return
+        order['orderStatus']  = "Filled"
+        order['avgPrice']     = str(price)
+        order['cumExecQty']   = str(executed)
+        order['cumExecValue'] = str(value)
+        order['cumExecFee']   = str(fee)
+        self.change(order, True)
+
+    # Get tickers
+    def get_tickers(self, **kwargs):
+        with self.lock:
+            item = {'symbol': self.info['symbol'], 'lastPrice': str(self.price)}
+            return self.response({'category': "spot", 'list': [item]})
+
+    # Get server time
+    def get_server_time(self, **kwargs):
+        now = clock.milliseconds()
+        return self.response({'timeSecond': str(now // 1000), 'timeNano': str(now * 1000000)})
+
+    # Get klines, newest first
+    def get_kline(self, **kwargs):
+        with self.lock:
+            klines = self.market.kline_list(int(kwargs['interval']), clock.milliseconds(), int(kwargs.get('limit', 200)))
+            items  = [[str(value) for value in kline] for kline in reversed(klines)]
+            return self.response({'category': "spot", 'symbol': self.info['symbol'], 'list': items})
+
+    # Get orderbook
+    def get_orderbook(self, **kwargs):
+        with self.lock:
+            limit  = int(kwargs.get('limit', 1))
+            bids   = self.book.sides['b']
+            asks   = self.book.sides['a']
+            result = {
+                's' : self.info['symbol'],
+                'b' : [[str(price), str(qty)] for price, qty in zip(reversed(bids['prices']), reversed(bids['qty']))][:limit],
+                'a' : [[str(price), str(qty)] for price, qty in zip(asks['prices'], asks['qty'])][:limit],
+                'ts': clock.milliseconds(),
+                'u' : self.book.update_id
+            }
+            return self.response(result)
+
+    # Get instrument info
+    def get_instruments_info(self, **kwargs):
+        with self.lock:
+            item = {
+                'symbol'       : self.info['symbol'],
+                'baseCoin'     : self.info['baseCoin'],
+                'quoteCoin'    : self.info['quoteCoin'],
+                'status'       : "Trading",
+                'lotSizeFilter': {key: defs.scientific_to_decimal_str(self.info[key]) for key in ('basePrecision', 'quotePrecision', 'minOrderQty', 'maxOrderQty', 'minOrderAmt', 'maxOrderAmt')},
+                'priceFilter'  : {'tickSize': defs.scientific_to_decimal_str(self.info['tickSize'])}
+            }
+            return self.response({'category': "spot", 'list': [item]})
+
+    # Place trigger price market order, buy quantity is in quote coin and sell quantity in base coin
+    def place_order(self, **kwargs):
+        with self.lock:
+
+            # Check order
+            side    = kwargs['side']
+            trigger = defs.round_number(float(kwargs['triggerPrice']), self.info['tickSize'])
+            if side == "Buy":
+                qty = defs.round_number(float(kwargs['qty']), self.info['quotePrecision'], "down")
+                if qty < self.info['minOrderAmt']:
+                    self.error("Order value exceeded lower limit.", 170140)
+                if qty > self.coins[self.info['quoteCoin']]:
+                    self.error("Insufficient balance.", 170131)
+            else:
+                qty = defs.round_number(float(kwargs['qty']), self.info['basePrecision'], "down")
+                if qty < self.info['minOrderQty']:
+                    self.error("Order quantity exceeded lower limit.", 170136)
+                if qty > self.coins[self.info['baseCoin']] + self.info['basePrecision'] / 2:
+                    self.error("Insufficient balance.", 170131)
+
+            # Store order
+            orderid = str(next(self.ids))
+            now     = str(clock.milliseconds())
+            order   = {
+                'orderId'     : orderid,
+                'orderLinkId' : orderid,
+                'symbol'      : kwargs['symbol'],
+                'side'        : side,
+                'orderType'   : kwargs.get('orderType', "Market"),
+                'orderFilter' : kwargs.get('orderFilter', "tpslOrder"),
+                'orderStatus' : "Untriggered",
+                'price'       : "0",
+                'avgPrice'    : "0",
+                'qty'         : str(qty),
+                'cumExecQty'  : "0",
+                'cumExecValue': "0",
+                'cumExecFee'  : "0",
+                'triggerPrice': str(trigger),
+                'createdTime' : now,
+                'updatedTime' : now
+            }
+            self.orders[orderid]  = order
+            self.waiting[orderid] = order
+            self.change(order)
+            return self.response({'orderId': orderid, 'orderLinkId': orderid})
+
+    # Amend trigger price or quantity of a waiting order
+    def amend_order(self, **kwargs):
+        with self.lock:
+            order = self.find(kwargs)
+            if 'triggerPrice' in kwargs:
+                order['triggerPrice'] = str(defs.round_number(float(kwargs['triggerPrice']), self.info['tickSize']))
+            if 'qty' in kwargs:
+                precision    = self.info['quotePrecision'] if order['side'] == "Buy" else self.info['basePrecision']
+                order['qty'] = str(defs.round_number(float(kwargs['qty']), precision, "down"))
+            order['updatedTime'] = str(clock.milliseconds())
+            self.change(order)
+            return self.response({'orderId': order['orderId'], 'orderLinkId': order['orderLinkId']})
+
+    # Cancel a waiting order
+    def cancel_order(self, **kwargs):
+        with self.lock:
+            order = self.find(kwargs)
+            del self.waiting[order['orderId']]
+            order['orderStatus'] = "Cancelled"
+            order['updatedTime'] = str(clock.milliseconds())
+            self.change(order)
+            return self.response({'orderId': order['orderId'], 'orderLinkId': order['orderLinkId']})
+
+    # Get orders that wait for their trigger price
+    def get_open_orders(self, **kwargs):
+        with self.lock:
+            orders = list(self.waiting.values())
+            if kwargs.get('orderId'):
+                orders = [order for order in orders if order['orderId'] == str(kwargs['orderId'])]
+            return self.response({'list': [dict(order) for order in orders]})
+
+    # Get any order, newest first
+    def get_order_history(self, **kwargs):
+        with self.lock:
+            if kwargs.get('orderId'):
+                orders = [self.orders[str(kwargs['orderId'])]] if str(kwargs['orderId']) in self.orders else []
+            else:
+                orders = list(reversed(self.orders.values()))[:int(kwargs.get('limit', 20))]
+            return self.response({'list': [dict(order) for order in orders]})
+
+    # Get wallet balance of comma separated coins
+    def get_wallet_balance(self, **kwargs):
+        with self.lock:
+            return self.response({'list': [self.account(kwargs.get('coin', "").split(","))]})
+
+    # Unified account with coins
+    def account(self, names):
+        coins = [{'coin': coin, 'equity': str(self.coins.get(coin, 0.0)), 'walletBalance': str(self.coins.get(coin, 0.0))} for coin in names]
+        return {'accountType': "UNIFIED", 'totalEquity': str(self.equity()), 'coin': coins}
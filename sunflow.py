@@ -5,881 +5,1205 @@
 # Load external libraries
 from time import sleep
 from pathlib import Path
+from pybit import unified_trading
 from pybit.unified_trading import WebSocket
 from requests.exceptions import ChunkedEncodingError
 from urllib3.exceptions import ProtocolError
 from http.client import RemoteDisconnected
-import argparse, importlib, pprint, sys, threading, traceback
+import argparse, os, pprint, signal, sys, threading, traceback
 import pandas as pd
 
 # Load internal libraries
-import database, defs, optimum, orders, preload, trailing
-
-# Parse command line arguments
-parser = argparse.ArgumentParser(description="Run the Sunflow Cryptobot with a specified config.")
-parser.add_argument('-c', '--config', default='config.py', help='Specify the config file (with .py extension).')
-args = parser.parse_args()
-
-# Resolve config file path
-config_path = Path(args.config).resolve()
-if not config_path.exists():
-    print(f"Config file not found at {config_path}, aborting...\n")
-    sys.exit()
-
-# Dynamically load the config module
-sys.path.append(str(config_path.parent))
-config_module_name = config_path.stem
-config = importlib.import_module(config_module_name)
-
-
-### Initialize variables ###
-
-# Set default values
-debug                                = config.debug                                # Debug
-symbol                               = config.symbol                               # Symbol bot used for trading
-klines                               = {}                                          # Klines for symbol
-intervals                            = {}                                          # Klines intervals
-intervals[0]                         = 0                                           # Average of all active intervals
-intervals[1]                         = config.interval_1                           # Klines timeframe interval 1
-intervals[2]                         = config.interval_2                           # Klines timeframe interval 2
-intervals[3]                         = config.interval_3                           # Klines timeframe interval 3
-limit                                = config.limit                                # Number of klines downloaded, used for calculcating technical indicators
-trades                               = {}                                          # Trades for symbol
-ticker                               = {}                                          # Ticker data, including lastPrice and time
-info                                 = {}                                          # Instrument info on symbol
-spot                                 = 0                                           # Spot price, always equal to lastPrice
-profit                               = config.profit                               # Minimum profit percentage
-depth                                = config.depth                                # Depth in percentages used to calculate market depth from orderbook
-multiplier                           = config.multiplier                           # Multiply minimum order quantity by this
-prices                               = {}                                          # Last {limit} prices based on ticker
-depth_data                           = {}                                          # Depth buy and sell percentage indexed by time
-
-# Optimize profit and trigger price distance
-optimizer                            = {}                                          # Profit and trigger price distance optimizer
-optimizer['enabled']                 = config.optimizer_enabled                    # Try to optimize the minimum profit and distance percentage
-optimizer['spread_enabled']          = config.optimizer_spread                     # If optimizer is active, also optimize spread
-optimizer['sides']                   = config.optimizer_sides                      # If optimizer is active, optimize both buy and sell, or only sell
-optimizer['profit']                  = config.profit                               # Initial profit percentage when Sunflow started, will never change
-optimizer['distance']                = config.distance                             # Initial trigger price distance percentage when Sunflow started, will never change
-optimizer['spread']                  = config.spread_distance                      # Initial minimum spread in percentages when Sunflow started, will never change
-optimizer['interval']                = config.optimizer_interval                   # Interval used for indicator KPI
-optimizer['limit_min']               = config.optimizer_limit_min                  # Minimum miliseconds of spot price data
-optimizer['limit_max']               = config.optimizer_limit_max                  # Maximum miliseconds of spot price data
-optimizer['adj_min']                 = config.optimizer_adj_min                    # Minimum profit and trigger price adjustment
-optimizer['adj_max']                 = config.optimizer_adj_max                    # Maximum profit and trigger price adjustment
-optimizer['scaler']                  = config.optimizer_scaler                     # Scales the final optimizer value by multiplying by this value
-optimizer['df']                      = pd.DataFrame()                              # Dataframe is empty at start
-
-# Minimum spread between historical buy orders
-use_spread                           = {}                                          # Spread
-use_spread['enabled']                = config.spread_enabled                       # Use spread as buy trigger
-use_spread['distance']               = config.spread_distance                      # Minimum spread in percentages
-
-# Technical indicators
-use_indicators                       = {}                                          # Technical indicators
-use_indicators['enabled']            = config.indicators_enabled                   # Use technical indicators as buy trigger
-use_indicators['minimum']            = config.indicators_minimum                   # Minimum advice value
-use_indicators['maximum']            = config.indicators_maximum                   # Maximum advice value
-
-# Orderbook
-use_orderbook                        = {}                                          # Orderbook
-use_orderbook['enabled']             = config.orderbook_enabled                    # Use orderbook as buy trigger
-use_orderbook['minimum']             = config.orderbook_minimum                    # Minimum orderbook buy percentage
-use_orderbook['maximum']             = config.orderbook_maximum                    # Maximum orderbook buy percentage
-use_orderbook['average']             = config.orderbook_average                    # Average out orderbook depth data or use last data point
-use_orderbook['limit']               = config.orderbook_limit                      # Number of orderbook data elements to keep in database
-use_orderbook['timeframe']           = config.orderbook_timeframe                  # Timeframe for averaging out
-
-# Trade
-use_trade                            = {}
-use_trade['enabled']                 = config.trade_enabled                        # Use realtime trades as buy trigger
-use_trade['minimum']                 = config.trade_minimum                        # Minimum trade buy ratio percentage
-use_trade['maximum']                 = config.trade_maximum                        # Maximum trade buy ratio percentage
-use_trade['limit']                   = config.trade_limit                          # Number of trade orders to keep in database
-use_trade['timeframe']               = config.trade_timeframe                      # Timeframe in ms to collect realtime trades
-
-# Price limits
-use_pricelimit                       = {}                                          # Use pricelimits to prevent buy or sell
-use_pricelimit['enabled']            = config.pricelimit_enabled                   # Set pricelimits functionality
-use_pricelimit['max_buy_enabled']    = False                                       # Set pricelimits maximum buy price toggle  
-use_pricelimit['min_sell_enabled']   = False                                       # Set pricelimits minimum sell price toggle
-use_pricelimit['max_sell_enabled']   = False                                       # Set pricelimits maximum sell price toggle
-use_pricelimit['max_buy']            = config.pricelimit_max_buy                   # Maximum buy price 
-use_pricelimit['min_sell']           = config.pricelimit_min_sell                  # Minimum sell price
-use_pricelimit['max_sell']           = config.pricelimit_max_sell                  # Maximum sell price
-if config.pricelimit_max_buy > 0     : use_pricelimit['max_buy_enabled'] = True    # Maximum buy price enabled
-if config.pricelimit_min_sell > 0    : use_pricelimit['min_sell_enabled'] = True   # Minimum sell price enabled
-if config.pricelimit_max_sell > 0    : use_pricelimit['max_sell_enabled'] = True   # Maximum sell price enabled
-
-# Trailing order
-active_order                         = {}                                          # Trailing order data
-active_order['side']                 = ""                                          # Trailing Buy or Sell
-active_order['active']               = False                                       # Trailing order active or not
-active_order['start']                = 0                                           # Start price when trailing order began     
-active_order['previous']             = 0                                           # Previous price
-active_order['current']              = 0                                           # Current price
-active_order['wiggle']               = config.wiggle                               # Method to use to calculate trigger price distance
-active_order['distance']             = config.distance                             # Trigger price distance percentage when set to default
-active_order['distance_ini']         = config.distance                             # Keep initial distance always stored
-active_order['fluctuation']          = config.distance                             # Trigger price distance percentage when set to wiggle
-active_order['wave']                 = config.distance                             # Trigger price distance percentage when set to wave
-active_order['orderid']              = 0                                           # Order ID
-active_order['trigger']              = 0                                           # Trigger price for order
-active_order['trigger_new']          = 0                                           # New trigger price when trailing 
-active_order['trigger_ini']          = 0                                           # Initial trigger price when trailing
-active_order['qty']                  = 0                                           # Order quantity
-active_order['qty_new']              = 0                                           # New order quantity when trailing
-
-# Databases for buy and sell orders
-all_buys                             = {}                                          # All buys retreived from database file buy orders
-all_sells                            = {}                                          # Sell order linked to database with all buys orders
-
-# Websockets to use
-ws_kline                             = False                                       # Initialize ws_kline
-ws_orderbook                         = False                                       # Initialize ws_orderbook
-ws_trade                             = False                                       # Initialize ws_trade
-if config.indicators_enabled         : ws_kline     = True                         # Use klines websocket
-if config.orderbook_enabled          : ws_orderbook = True                         # Use orderbook websocket
-if config.trade_enabled              : ws_trade     = True                         # Use trade websocker
-
-# Initialize indicator advice variable
-if not config.indicators_enabled:
-    intervals[1] = 0
-    intervals[2] = 0
-    intervals[3] = 0
-
-# Initialize indicators advice variable
-indicators_advice                    = {}
-indicators_advice[intervals[0]]      = {'result': False, 'value': 0, 'level': 'Neutral', 'filled': False}   # Average advice of all active intervals
-indicators_advice[intervals[1]]      = {'result': False, 'value': 0, 'level': 'Neutral', 'filled': False}   # Advice for interval 1
-indicators_advice[intervals[2]]      = {'result': False, 'value': 0, 'level': 'Neutral', 'filled': False}   # Advice for interval 2
-indicators_advice[intervals[3]]      = {'result': False, 'value': 0, 'level': 'Neutral', 'filled': False}   # Advice for interval 3
-
-# Initialize orderbook advice variable
-orderbook_advice                     = {}
-orderbook_advice['buy_perc']         = 0
-orderbook_advice['sell_perc']        = 0
-orderbook_advice['result']           = False
-
-# Initialize trade advice variable
-trade_advice                         = {}
-trade_advice['buy_ratio']            = 0
-trade_advice['sell_ratio']           = 0
-trade_advice['result']               = False
-
-# Initialize pricelimit advice variable
-pricelimit_advice                    = {}
-pricelimit_advice['buy_result']      = False
-pricelimit_advice['sell_result']     = False
-
-# Initialize trades variable
-trades                               = {'time': [], 'side': [], 'size': [], 'price': []}
-
-# Initialize depth variable
-depth_data                           = {'time': [], 'buy_perc': [], 'sell_perc': []}
-
-# Compounding
-compounding                          = {}
-compounding['enabled']               = config.compounding_enabled
-compounding['start']                 = config.compounding_start
-compounding['now']                   = config.compounding_start
-
-# Locking handle_ticker function to prevent race conditions
-lock_ticker                          = {}
-lock_ticker['time']                  = defs.now_utc()[4]
-lock_ticker['delay']                 = 10000
-lock_ticker['enabled']               = False
-
-# Uptime ping
-uptime_ping                          = {}
-uptime_ping['time']                  = defs.now_utc()[4]
-uptime_ping['record']                = defs.now_utc()[4]
-uptime_ping['delay']                 = 10000
-uptime_ping['expire']                = 1000000
-uptime_ping['enabled']               = True
-
-# Periodic tasks
-periodic                             = {}
-periodic['time']                     = defs.now_utc()[4]
-periodic['delay']                    = 3600000
-periodic['enabled']                  = True
-
-
-### Functions ###
-
-# Handle messages to keep tickers up to date
-def handle_ticker(message):
+import backtest, buffers, clock, context, database, defs, logs, eventloop, incremental, loader, metrics, orderbook, optimum, orders, preload, profiler, recorder, trailing
+
+
+### Bot ###
+
+# One bot trades one symbol. It owns the config and all state of the symbol and the handlers are its methods, the
+# modules keep their state in the context of the bot. Nothing is loaded when this file is imported, so one process
+# can create many bots, see multi.py and sweep.py.
+class SunflowBot:
+
+    # Initialize bot with config, backtest is recorded market data to replay against a simulated exchange
+    def __init__(self, config, backtest_path=""):
+
+        # Config and context of the bot, the modules use the context of the thread they run on
+        self.config                               = config                                      # Config module
+        self.context                              = context.BotContext(config)                  # Exchange session, order worker, order cache and module state
+        self.context.activate()
+
+        # Replay recorded market data against a simulated exchange instead of trading, time is now virtual
+        self.simulation                           = None
+        if backtest_path:
+            self.simulation = backtest.setup(self.context, backtest_path)
+
+        # Connect websockets to the simulated exchange instead of Bybit
+        if config.exchange_url:
+            unified_trading.PUBLIC_WSS  = config.exchange_url.replace("http", "ws", 1) + "/v5/public/{CHANNEL_TYPE}"
+            unified_trading.PRIVATE_WSS = config.exchange_url.replace("http", "ws", 1) + "/v5/private"
+
+        # Set default values
+        self.debug                                = config.debug                                # Debug
+        self.symbol                               = config.symbol                               # Symbol bot used for trading
+        self.klines                               = {}                                          # Klines for symbol
+        self.streams                              = {}                                          # Running state of technical indicators per interval
+        self.intervals                            = {}                                          # Klines intervals
+        self.intervals[0]                         = 0                                           # Average of all active intervals
+        self.intervals[1]                         = config.interval_1                           # Klines timeframe interval 1
+        self.intervals[2]                         = config.interval_2                           # Klines timeframe interval 2
+        self.intervals[3]                         = config.interval_3                           # Klines timeframe interval 3
+        self.limit                                = config.limit                                # Number of klines downloaded, used for calculcating technical indicators
+        self.trades                               = {}                                          # Trades for symbol
+        self.ticker                               = {}                                          # Ticker data, including lastPrice and time
+        self.info                                 = {}                                          # Instrument info on symbol
+        self.spot                                 = 0                                           # Spot price, always equal to lastPrice
+        self.profit                               = config.profit                               # Minimum profit percentage
+        self.depth                                = config.depth                                # Depth in percentages used to calculate market depth from orderbook
+        self.multiplier                           = config.multiplier                           # Multiply minimum order quantity by this
+        self.prices                               = buffers.PriceBuffer()                       # Last {limit} prices based on ticker
+        self.depth_data                           = {}                                          # Depth buy and sell percentage indexed by time
+        self.orderbook_local                      = orderbook.OrderBook()                       # Local orderbook from snapshots and deltas
+
+        # Optimize profit and trigger price distance
+        self.optimizer                            = {}                                          # Profit and trigger price distance optimizer
+        self.optimizer['enabled']                 = config.optimizer_enabled                    # Try to optimize the minimum profit and distance percentage
+        self.optimizer['spread_enabled']          = config.optimizer_spread                     # If optimizer is active, also optimize spread
+        self.optimizer['sides']                   = config.optimizer_sides                      # If optimizer is active, optimize both buy and sell, or only sell
+        self.optimizer['profit']                  = config.profit                               # Initial profit percentage when Sunflow started, will never change
+        self.optimizer['distance']                = config.distance                             # Initial trigger price distance percentage when Sunflow started, will never change
+        self.optimizer['spread']                  = config.spread_distance                      # Initial minimum spread in percentages when Sunflow started, will never change
+        self.optimizer['interval']                = config.optimizer_interval                   # Interval used for indicator KPI
+        self.optimizer['limit_min']               = config.optimizer_limit_min                  # Minimum miliseconds of spot price data
+        self.optimizer['limit_max']               = config.optimizer_limit_max                  # Maximum miliseconds of spot price data
+        self.optimizer['adj_min']                 = config.optimizer_adj_min                    # Minimum profit and trigger price adjustment
+        self.optimizer['adj_max']                 = config.optimizer_adj_max                    # Maximum profit and trigger price adjustment
+        self.optimizer['scaler']                  = config.optimizer_scaler                     # Scales the final optimizer value by multiplying by this value
+        self.optimizer['df']                      = pd.DataFrame()                              # Dataframe is empty at start
+
+        # Minimum spread between historical buy orders
+        self.use_spread                           = {}                                          # Spread
+        self.use_spread['enabled']                = config.spread_enabled                       # Use spread as buy trigger
+        self.use_spread['distance']               = config.spread_distance                      # Minimum spread in percentages
+
+        # Technical indicators
+        self.use_indicators                       = {}                                          # Technical indicators
+        self.use_indicators['enabled']            = config.indicators_enabled                   # Use technical indicators as buy trigger
+        self.use_indicators['minimum']            = config.indicators_minimum                   # Minimum advice value
+        self.use_indicators['maximum']            = config.indicators_maximum                   # Maximum advice value
+
+        # Orderbook
+        self.use_orderbook                        = {}                                          # Orderbook
+        self.use_orderbook['enabled']             = config.orderbook_enabled                    # Use orderbook as buy trigger
+        self.use_orderbook['minimum']             = config.orderbook_minimum                    # Minimum orderbook buy percentage
+        self.use_orderbook['maximum']             = config.orderbook_maximum                    # Maximum orderbook buy percentage
+        self.use_orderbook['average']             = config.orderbook_average                    # Average out orderbook depth data or use last data point
+        self.use_orderbook['limit']               = config.orderbook_limit                      # Number of orderbook data elements to keep in database
+        self.use_orderbook['timeframe']           = config.orderbook_timeframe                  # Timeframe for averaging out
+
+        # Trade
+        self.use_trade                            = {}
+        self.use_trade['enabled']                 = config.trade_enabled                        # Use realtime trades as buy trigger
+        self.use_trade['minimum']                 = config.trade_minimum                        # Minimum trade buy ratio percentage
+        self.use_trade['maximum']                 = config.trade_maximum                        # Maximum trade buy ratio percentage
+        self.use_trade['limit']                   = config.trade_limit                          # Not used anymore, all trades within timeframe are used
+        self.use_trade['timeframe']               = config.trade_timeframe                      # Timeframe in ms to collect realtime trades
+
+        # Price limits
+        self.use_pricelimit                       = {}                                          # Use pricelimits to prevent buy or sell
+        self.use_pricelimit['enabled']            = config.pricelimit_enabled                   # Set pricelimits functionality
+        self.use_pricelimit['max_buy_enabled']    = False                                       # Set pricelimits maximum buy price toggle  
+        self.use_pricelimit['min_sell_enabled']   = False                                       # Set pricelimits minimum sell price toggle
+        self.use_pricelimit['max_sell_enabled']   = False                                       # Set pricelimits maximum sell price toggle
+        self.use_pricelimit['max_buy']            = config.pricelimit_max_buy                   # Maximum buy price 
+        self.use_pricelimit['min_sell']           = config.pricelimit_min_sell                  # Minimum sell price
+        self.use_pricelimit['max_sell']           = config.pricelimit_max_sell                  # Maximum sell price
+        if config.pricelimit_max_buy > 0     : self.use_pricelimit['max_buy_enabled'] = True    # Maximum buy price enabled
+        if config.pricelimit_min_sell > 0    : self.use_pricelimit['min_sell_enabled'] = True   # Minimum sell price enabled
+        if config.pricelimit_max_sell > 0    : self.use_pricelimit['max_sell_enabled'] = True   # Maximum sell price enabled
+
+        # Trailing order
+        self.active_order                         = {}                                          # Trailing order data
+        self.active_order['side']                 = ""                                          # Trailing Buy or Sell
+        self.active_order['active']               = False                                       # Trailing order active or not
+        self.active_order['start']                = 0                                           # Start price when trailing order began     
+        self.active_order['previous']             = 0                                           # Previous price
+        self.active_order['current']              = 0                                           # Current price
+        self.active_order['wiggle']               = config.wiggle                               # Method to use to calculate trigger price distance
+        self.active_order['distance']             = config.distance                             # Trigger price distance percentage when set to default
+        self.active_order['distance_ini']         = config.distance                             # Keep initial distance always stored
+        self.active_order['fluctuation']          = config.distance                             # Trigger price distance percentage when set to wiggle
+        self.active_order['wave']                 = config.distance                             # Trigger price distance percentage when set to wave
+        self.active_order['orderid']              = 0                                           # Order ID
+        self.active_order['trigger']              = 0                                           # Trigger price for order
+        self.active_order['trigger_new']          = 0                                           # New trigger price when trailing 
+        self.active_order['trigger_ini']          = 0                                           # Initial trigger price when trailing
+        self.active_order['trigger_amend']        = 0                                           # Last trigger price sent to the exchange, maybe not yet confirmed
+        self.active_order['qty']                  = 0                                           # Order quantity
+        self.active_order['qty_new']              = 0                                           # New order quantity when trailing
+
+        # Databases for buy and sell orders
+        self.all_buys                             = {}                                          # All buys retreived from database file buy orders
+        self.all_sells                            = {}                                          # Sell order linked to database with all buys orders
+
+        # Websockets to use
+        self.ws_kline                             = False                                       # Initialize ws_kline
+        self.ws_orderbook                         = False                                       # Initialize ws_orderbook
+        self.ws_trade                             = False                                       # Initialize ws_trade
+        if config.indicators_enabled         : self.ws_kline     = True                         # Use klines websocket
+        if config.orderbook_enabled          : self.ws_orderbook = True                         # Use orderbook websocket
+        if config.trade_enabled              : self.ws_trade     = True                         # Use trade websocker
+
+        # Initialize indicator advice variable
+        if not config.indicators_enabled:
+            self.intervals[1] = 0
+            self.intervals[2] = 0
+            self.intervals[3] = 0
+
+        # Initialize indicators advice variable
+        self.indicators_advice                    = {}
+        self.indicators_advice[self.intervals[0]] = {'result': False, 'value': 0, 'level': 'Neutral', 'filled': False}   # Average advice of all active intervals
+        self.indicators_advice[self.intervals[1]] = {'result': False, 'value': 0, 'level': 'Neutral', 'filled': False}   # Advice for interval 1
+        self.indicators_advice[self.intervals[2]] = {'result': False, 'value': 0, 'level': 'Neutral', 'filled': False}   # Advice for interval 2
+        self.indicators_advice[self.intervals[3]] = {'result': False, 'value': 0, 'level': 'Neutral', 'filled': False}   # Advice for interval 3
+
+        # Initialize orderbook advice variable
+        self.orderbook_advice                     = {}
+        self.orderbook_advice['buy_perc']         = 0
+        self.orderbook_advice['sell_perc']        = 0
+        self.orderbook_advice['result']           = False
+
+        # Initialize trade advice variable
+        self.trade_advice                         = {}
+        self.trade_advice['buy_ratio']            = 0
+        self.trade_advice['sell_ratio']           = 0
+        self.trade_advice['result']               = False
+
+        # Initialize pricelimit advice variable
+        self.pricelimit_advice                    = {}
+        self.pricelimit_advice['buy_result']      = False
+        self.pricelimit_advice['sell_result']     = False
+
+        # Initialize trades variable
+        self.trades                               = buffers.TradeWindow(self.use_trade['timeframe'])
+
+        # Initialize depth variable
+        self.depth_data                           = {'time': [], 'buy_perc': [], 'sell_perc': []}
+
+        # Compounding
+        self.compounding                          = {}
+        self.compounding['enabled']               = config.compounding_enabled
+        self.compounding['start']                 = config.compounding_start
+        self.compounding['now']                   = config.compounding_start
+
+        # Simulate a ticker when there was no ticker for {delay} ms
+        self.lock_ticker                          = {}
+        self.lock_ticker['time']                  = clock.milliseconds()
+        self.lock_ticker['delay']                 = 10000
+
+        # Uptime ping
+        self.uptime_ping                          = {}
+        self.uptime_ping['time']                  = clock.milliseconds()
+        self.uptime_ping['record']                = clock.milliseconds()
+        self.uptime_ping['delay']                 = 10000
+        self.uptime_ping['expire']                = 1000000
+        self.uptime_ping['enabled']               = True
+        self.uptime_ping['latency']               = clock.milliseconds()
+
+        # Periodic tasks
+        self.periodic                             = {}
+        self.periodic['time']                     = clock.milliseconds()
+        self.periodic['delay']                    = 3600000
+        self.periodic['enabled']                  = True
+
+        # Runtime that feeds websocket messages one by one to the handlers
+        self.runtime                              = eventloop.Runtime(initializer=self.context.activate, stages=self.context.stages)
+        self.ws                                   = None
+        self.ws_private                           = None
+        self.reconnects                           = 0
+        self.reconnecting                         = False
+
+        # Market data recorder, records the websocket streams when enabled
+        self.record                               = {}
+        self.record['enabled']                    = config.record_enabled and not self.simulation
+        self.record['folder']                     = os.path.join(config.record_folder, self.symbol)
+        self.recording                            = None
+
+
+    ### Handlers ###
+
+    # Handle messages to keep tickers up to date
+    def handle_ticker(self, message):
     
-    # Debug and speed
-    debug = False
-    speed = False
-    stime = defs.now_utc()[4]
+        # Debug and speed
+        debug = False
+        speed = False
+        stime = clock.monotonic()
        
-    # Errors are not reported within websocket
-    try:
+        # Errors are not reported within websocket
+        try:
    
-        # Declare some variables global
-        global spot, ticker, profit, active_order, all_buys, all_sells, prices, indicators_advice, lock_ticker, use_spread, optimizer, compounding, uptime_ping, info
-
-        # Initialize variables
-        ticker              = {}
-        result              = ()
-        current_time        = defs.now_utc()[4]
-        lock_ticker['time'] = current_time
+            # Initialize variables
+            self.ticker              = {}
+            current_time             = clock.milliseconds()
+            self.lock_ticker['time'] = current_time
         
-        # Get ticker update
-        ticker['time']      = int(message['ts'])
-        ticker['lastPrice'] = float(message['data']['lastPrice'])
-        ticker['simulated'] = False
-        if message['data'].get('simulated', False):
-            ticker['simulated'] = True
-
-        # Popup new price
-        prices['time'].append(ticker['time'])
-        prices['price'].append(ticker['lastPrice'])
+            # Get ticker update
+            self.ticker['time']      = int(message['ts'])
+            self.ticker['lastPrice'] = float(message['data']['lastPrice'])
+            self.ticker['simulated'] = False
+            if message['data'].get('simulated', False):
+                self.ticker['simulated'] = True
+
+            # Popup new price
+            self.prices.append(self.ticker['time'], self.ticker['lastPrice'])
         
-        # Remove last price if necessary
-        if current_time - prices['time'][0] > optimizer['limit_max']:
-            prices['time'].pop(0)
-            prices['price'].pop(0)
-
-        # Show incoming message
-        if debug: defs.announce(f"*** Incoming ticker with price {ticker['lastPrice']} {info['baseCoin']}, simulated = {ticker['simulated']} ***")
-
-        # Prevent race conditions
-        if lock_ticker['enabled']:
-            spot = ticker['lastPrice']
-            defs.announce("Function is busy, Sunflow will catch up with next tick")
-            if speed: defs.announce(defs.report_exec(stime, "function busy"))
-            return
-        
-        # Lock handle_ticker function
-        lock_ticker['enabled'] = True
-
-        # Run trailing if active
-        if active_order['active']:
-            active_order['current'] = ticker['lastPrice']
-            result       = trailing.trail(symbol, ticker['lastPrice'], compounding, active_order, info, all_buys, all_sells, prices)
-            active_order = result[0]
-            all_buys     = result[1]
-            compounding  = result[2]
-            info         = result[3]
+            # Remove prices older than the optimizer needs
+            self.prices.evict_before(current_time - self.optimizer['limit_max'])
+
+            # Show incoming message
+            if debug: defs.announce(f"*** Incoming ticker with price {self.ticker['lastPrice']} {self.info['baseCoin']}, simulated = {self.ticker['simulated']} ***")
+
+            # Trailing and orders, unless an order flow still waits for the exchange
+            if not self.context.worker.flow:
+                self.context.worker.begin(self.trade_ticker(self.spot, self.ticker['lastPrice'], current_time))
+
+        # Report error
+        except Exception as e:
+            tb_info = traceback.extract_tb(e.__traceback__)
+            frame_summary = tb_info[-1]
+            line = frame_summary.lineno
+            defs.announce(f"*** Error: Failure at line {line}: {e} ***")
+
+        # Always set new spot price
+        self.spot = self.ticker['lastPrice']
+    
+        # Report execution time
+        if speed: defs.announce(defs.report_exec(stime))
+    
+        # Close function
+        return
+
+    # Trailing and orders on a new price, an order flow that continues when the exchange has answered, see execution.py
+    def trade_ticker(self, previous, spot, current_time):
+
+        # Errors are not reported within websocket
+        try:
+
+            # Initialize variables
+            result = ()
+
+            # Run trailing if active, amends are timed from when this ticker was received
+            if self.active_order['active']:
+                self.context.worker.tick     = self.runtime.received
+                self.active_order['current'] = spot
+                result                       = yield from trailing.trail(self.symbol, spot, self.compounding, self.active_order, self.info, self.all_buys, self.all_sells, self.prices)
+                self.active_order            = result[0]
+                self.all_buys                = result[1]
+                self.compounding             = result[2]
+                self.info                    = result[3]
          
-        # Has price changed, then run all kinds of actions
-        if spot != ticker['lastPrice']:
-
-            # Store new spot price
-            new_spot = ticker['lastPrice']
-
-            # Optimize profit and distance percentages
-            if optimizer['enabled']:
-                result       = optimum.optimize(prices, profit, active_order, use_spread, optimizer)
-                profit       = result[0]
-                active_order = result[1]
-                use_spread   = result[2]
-                optimizer    = result[3]
-
-            # Check if and how much we can sell
-            result                  = orders.check_sell(new_spot, profit, active_order, all_buys, use_pricelimit, pricelimit_advice, info)
-            all_sells_new           = result[0]
-            active_order['qty_new'] = result[1]
-            can_sell                = result[2]
-            rise_to                 = result[3]
-
-            # Reset uptime notice
-            uptime_ping['time']   = current_time
-            uptime_ping['record'] = current_time
+            # Has price changed, then run all kinds of actions
+            if previous != spot:
+
+                # Store new spot price
+                new_spot = spot
+
+                # Optimize profit and distance percentages
+                if self.optimizer['enabled']:
+                    result            = optimum.optimize(self.prices, self.profit, self.active_order, self.use_spread, self.optimizer)
+                    self.profit       = result[0]
+                    self.active_order = result[1]
+                    self.use_spread   = result[2]
+                    self.optimizer    = result[3]
+
+                # Check if and how much we can sell
+                result                       = orders.check_sell(new_spot, self.profit, self.active_order, self.all_buys, self.use_pricelimit, self.pricelimit_advice, self.info)
+                all_sells_new                = result[0]
+                self.active_order['qty_new'] = result[1]
+                can_sell                     = result[2]
+                rise_to                      = result[3]
+
+                # Reset uptime notice
+                self.uptime_ping['time']   = current_time
+                self.uptime_ping['record'] = current_time
             
-            # Output to stdout "Price went up/down from ..."
-            message = defs.report_ticker(spot, new_spot, rise_to, active_order, all_buys, info)
-            defs.announce(message)
+                # Output to stdout "Price went up/down from ..."
+                message = defs.report_ticker(previous, new_spot, rise_to, self.active_order, self.all_buys, self.info)
+                defs.announce(message)
             
-            # If trailing buy is already running while we can sell
-            if active_order['active'] and active_order['side'] == "Buy" and can_sell:
+                # If trailing buy is already running while we can sell
+                if self.active_order['active'] and self.active_order['side'] == "Buy" and can_sell:
                 
-                # Output to stdout and Apprise
-                defs.announce("*** Warning: Buying while selling is possible, trying to cancel buy order! ***", True, 1)
+                    # Output to stdout and Apprise
+                    defs.announce("*** Warning: Buying while selling is possible, trying to cancel buy order! ***", True, 1)
                 
-                # Cancel trailing buy, remove from all_buys database
-                active_order['active'] = False
-                result                 = orders.cancel(symbol, active_order['orderid'])
-                error_code             = result[0]
+                    # Cancel trailing buy, remove from all_buys database
+                    self.active_order['active'] = False
+                    result                      = yield from orders.cancel(self.symbol, self.active_order['orderid'])
+                    error_code                  = result[0]
                 
-                if error_code == 0:
-                    # Situation normal, just remove the order
-                    defs.announce("Buy order cancelled successfully", True, 1)
-                    all_buys = database.remove(active_order['orderid'], all_buys, info)
-
-                if error_code == 1:
-                    # Trailing buy was bought
-                    defs.announce("Buy order could not be cancelled, closing trailing buy", True, 1)
-                    result       = trailing.close_trail(active_order, all_buys, all_sells, spot, info)
-                    active_order = result[0]
-                    all_buys     = result[1]
-                    all_sells    = result[2]
+                    if error_code == 0:
+                        # Situation normal, just remove the order
+                        defs.announce("Buy order cancelled successfully", True, 1)
+                        self.all_buys = database.remove(self.active_order['orderid'], self.all_buys, self.info)
+
+                    if error_code == 1:
+                        # Trailing buy was bought
+                        defs.announce("Buy order could not be cancelled, closing trailing buy", True, 1)
+                        result            = yield from trailing.close_trail(self.active_order, self.all_buys, self.all_sells, previous, self.info)
+                        self.active_order = result[0]
+                        self.all_buys     = result[1]
+                        self.all_sells    = result[2]
                     
-                if error_code == 100:
-                    # Something went very wrong
-                    defs.log_error(result[1])
+                    if error_code == 100:
+                        # Something went very wrong
+                        defs.log_error(result[1])
                 
-            # Initiate sell
-            if not active_order['active'] and can_sell:
-                # There is no old quantity on first sell
-                active_order['qty'] = active_order['qty_new']
-                # Fill all_sells for the first time
-                all_sells = all_sells_new                
-                # Place the first sell order
-                active_order = orders.sell(symbol, new_spot, active_order, prices, info)
+                # Initiate sell
+                if not self.active_order['active'] and can_sell:
+                    # There is no old quantity on first sell
+                    self.active_order['qty'] = self.active_order['qty_new']
+                    # Fill all_sells for the first time
+                    self.all_sells = all_sells_new                
+                    # Place the first sell order
+                    self.active_order = yield from orders.sell(self.symbol, new_spot, self.active_order, self.prices, self.info)
               
-            # Amend existing sell trailing order if required
-            if active_order['active'] and active_order['side'] == "Sell":
-
-                # Only amend order if the quantity to be sold has changed
-                if active_order['qty_new'] != active_order['qty'] and active_order['qty_new'] > 0:
-
-                    # Amend order quantity
-                    result        = trailing.aqs_helper(symbol, active_order, info, all_sells, all_sells_new)
-                    active_order  = result[0]
-                    all_sells     = result[1]
-                    all_sells_new = result[2]
-
-            # Work as a true gridbot when only spread is used
-            if use_spread['enabled'] and not use_indicators['enabled'] and not active_order['active']:
-                active_order = buy_matrix(new_spot, active_order, all_buys, intervals[1])
-
-    # Report error
-    except Exception as e:
-        tb_info = traceback.extract_tb(e.__traceback__)
-        frame_summary = tb_info[-1]
-        line = frame_summary.lineno
-        defs.announce(f"*** Error: Failure at line {line}: {e} ***")
-
-    # Always set new spot price and unlock function
-    spot = ticker['lastPrice']
-    lock_ticker['enabled'] = False
-    
-    # Report execution time
-    if speed: defs.announce(defs.report_exec(stime))
-    
-    # Close function
-    return
-
-def handle_kline_1(message):
-    handle_kline(message, intervals[1])
-    return
-
-def handle_kline_2(message):
-    handle_kline(message, intervals[2])
-    return
-
-def handle_kline_3(message):
-    handle_kline(message, intervals[3])
-    return
-
-# Handle messages to keep klines up to date
-def handle_kline(message, interval):
-
-    # Debug and speed
-    debug = False
-    speed = False
-    stime = defs.now_utc()[4]
-
-    # Errors are not reported within websocket
-    try:
+                # Amend existing sell trailing order if required
+                if self.active_order['active'] and self.active_order['side'] == "Sell":
+
+                    # Only amend order if the quantity to be sold has changed
+                    if self.active_order['qty_new'] != self.active_order['qty'] and self.active_order['qty_new'] > 0:
+
+                        # Amend order quantity
+                        result            = yield from trailing.aqs_helper(self.symbol, self.active_order, self.info, self.all_sells, all_sells_new)
+                        self.active_order = result[0]
+                        self.all_sells    = result[1]
+                        all_sells_new     = result[2]
+
+                # Work as a true gridbot when only spread is used
+                if self.use_spread['enabled'] and not self.use_indicators['enabled'] and not self.active_order['active']:
+                    self.active_order = yield from self.buy_matrix(new_spot, self.active_order, self.all_buys, self.intervals[1])
+
+        # Report error
+        except Exception as e:
+            tb_info = traceback.extract_tb(e.__traceback__)
+            frame_summary = tb_info[-1]
+            line = frame_summary.lineno
+            defs.announce(f"*** Error: Failure at line {line}: {e} ***")
+
+        # Close function
+        return
+
+    # Handle orders the order worker has finished
+    def handle_order(self, command):
+
+        # Request of an order flow, continue the flow
+        if command['flow']:
+            self.context.worker.resume(command)
+            return
 
-        # Declare some variables global
-        global klines, active_order, all_buys, indicators_advice
+        # Amended trigger price
+        if command['name'] == "amend_trigger":
+            result            = trailing.atp_result(self.active_order, self.info, command)
+            self.active_order = result[0]
+            do_check          = result[1]
+
+            # Double check the order, unless an order flow already does
+            if do_check and not self.context.worker.flow:
+                self.context.worker.begin(self.check_order())
+
+        # Close function
+        return
+
+    # Check the trailing order, an order flow
+    def check_order(self):
+        result            = yield from trailing.check_order(self.symbol, self.spot, self.compounding, self.active_order, self.all_buys, self.all_sells, self.info)
+        self.active_order = result[0]
+        self.all_buys     = result[1]
+        self.compounding  = result[2]
+        self.info         = result[3]
+        return
+
+    # Handle order, execution and wallet updates from the private websocket
+    def handle_private(self, message):
+
+        # Update cache
+        changed = self.context.cache.update(message)
+
+        # Trailing order changed, check right away instead of waiting for the price to cross the trigger price, unless an
+        # order flow already does
+        if self.active_order['active'] and str(self.active_order['orderid']) in changed:
+            if message['topic'] == "execution":
+                defs.announce(f"Execution reported for {self.active_order['side'].lower()} order {self.active_order['orderid']}")
+            if not self.context.worker.flow:
+                self.context.worker.begin(self.check_order())
+
+        # Close function
+        return
+
+    # Record price of a ticker that was skipped because a newer ticker was already waiting
+    def record_ticker(self, message):
+        self.prices.append(int(message['ts']), float(message['data']['lastPrice']))
+        return
+
+    def handle_kline_1(self, message):
+        self.handle_kline(message, self.intervals[1])
+        return
+
+    def handle_kline_2(self, message):
+        self.handle_kline(message, self.intervals[2])
+        return
+
+    def handle_kline_3(self, message):
+        self.handle_kline(message, self.intervals[3])
+        return
+
+    # Handle messages to keep klines up to date
+    def handle_kline(self, message, interval):
+
+        # Debug and speed
+        debug = False
+        speed = False
+        stime = clock.monotonic()
+
+        # Errors are not reported within websocket
+        try:
 
-        # Initialize variables
-        kline = {}
+            # Initialize variables
+            kline = {}
      
-        # Show incoming message
-        if debug: defs.announce(f"*** Incoming kline with interval {interval}m ***")
-
-        # Get newest kline
-        kline['time']     = int(message['data'][0]['start'])
-        kline['open']     = float(message['data'][0]['open'])
-        kline['high']     = float(message['data'][0]['high'])
-        kline['low']      = float(message['data'][0]['low'])
-        kline['close']    = float(message['data'][0]['close'])
-        kline['volume']   = float(message['data'][0]['volume'])
-        kline['turnover'] = float(message['data'][0]['turnover'])
-
-        # Check if we have a finished kline
-        if message['data'][0]['confirm'] == True:
-
-            # Check if the number of klines still matches the config and report
-            klines_count = len(klines[interval]['close'])
-            if klines_count != limit:
-                klines[interval] = preload.get_klines(symbol, interval, limit)
-            defs.announce(f"Added new {interval}m interval onto existing {klines_count} klines")
-            klines[interval] = defs.new_kline(kline, klines[interval])
+            # Show incoming message
+            if debug: defs.announce(f"*** Incoming kline with interval {interval}m ***")
+
+            # Get newest kline
+            kline['time']     = int(message['data'][0]['start'])
+            kline['open']     = float(message['data'][0]['open'])
+            kline['high']     = float(message['data'][0]['high'])
+            kline['low']      = float(message['data'][0]['low'])
+            kline['close']    = float(message['data'][0]['close'])
+            kline['volume']   = float(message['data'][0]['volume'])
+            kline['turnover'] = float(message['data'][0]['turnover'])
+
+            # Check if we have a finished kline
+            if message['data'][0]['confirm'] == True:
+
+                # Check if the number of klines still matches the config and report
+                klines_count = len(self.klines[interval])
+                if klines_count != self.limit:
+                    self.klines[interval]  = preload.get_klines(self.symbol, interval, self.limit)
+                    self.streams[interval] = incremental.Indicators(self.klines[interval])
+                defs.announce(f"Added new {interval}m interval onto existing {klines_count} klines")
+                self.klines[interval] = defs.new_kline(kline, self.klines[interval], self.streams[interval])
       
-        else:            
-            # Remove the first kline and replace with fresh kline
-            klines[interval] = defs.update_kline(kline, klines[interval])
+            else:            
+                # Remove the last kline and replace with fresh kline
+                self.klines[interval] = defs.update_kline(kline, self.klines[interval], self.streams[interval])
         
-        # Run buy matrix
-        active_order = buy_matrix(spot, active_order, all_buys, interval)
-
-    # Report error
-    except Exception as e:
-        tb_info = traceback.extract_tb(e.__traceback__)
-        frame_summary = tb_info[-1]
-        line = frame_summary.lineno
-        defs.announce(f"*** Error: Failure at line {line}: {e} ***")
-
-    # Report execution time
-    if speed: defs.announce(defs.report_exec(stime))
+            # Run buy matrix, unless an order flow still waits for the exchange
+            if not self.context.worker.flow:
+                self.context.worker.begin(self.buy_kline(interval))
+
+        # Report error
+        except Exception as e:
+            tb_info = traceback.extract_tb(e.__traceback__)
+            frame_summary = tb_info[-1]
+            line = frame_summary.lineno
+            defs.announce(f"*** Error: Failure at line {line}: {e} ***")
+
+        # Report execution time
+        if speed: defs.announce(defs.report_exec(stime))
     
-    # Close function
-    return
+        # Close function
+        return
 
-# Handle messages to keep orderbook up to date
-def handle_orderbook(message):
+    # Handle messages to keep orderbook up to date
+    def handle_orderbook(self, message):
     
-    # Debug and speed
-    debug_1 = False    # Show orderbook
-    debug_2 = False    # Show buy and sell depth percentages
-    speed   = False
-    stime   = defs.now_utc()[4]
+        # Debug and speed
+        debug_1 = False    # Show orderbook
+        debug_2 = False    # Show buy and sell depth percentages
+        speed   = False
+        stime   = clock.monotonic()
 
-    # Errors are not reported within websocket
-    try:
+        # Errors are not reported within websocket
+        try:
 
-        # Declare some variables global
-        global orderbook_advice, depth_data
-        
-        # Initialize variables
-        total_buy_within_depth  = 0
-        total_sell_within_depth = 0
+            # Initialize variables
+            total_buy_within_depth  = 0
+            total_sell_within_depth = 0
           
-        # Show incoming message
-        if debug: defs.announce("*** Incoming orderbook ***")
+            # Show incoming message
+            if self.debug: defs.announce("*** Incoming orderbook ***")
         
-        # Recalculate depth to numerical value
-        depthN = ((2 * depth) / 100) * spot
+            # Recalculate depth to numerical value
+            depthN = ((2 * self.depth) / 100) * self.spot
         
-        # Extracting bid (buy) and ask (sell) arrays
-        bids = message['data']['b']
-        asks = message['data']['a']
-
-        # Calculate total buy quantity within depth
-        for bid in bids:
-            price, quantity = float(bid[0]), float(bid[1])
-            if (spot - depthN) <= price <= spot:
-                total_buy_within_depth += quantity
-
-        # Calculate total sell quantity within depth
-        for ask in asks:
-            price, quantity = float(ask[0]), float(ask[1])
-            if spot <= price <= (spot + depthN):
-                total_sell_within_depth += quantity
-
-        # Calculate total quantity (buy + sell)
-        total_quantity_within_depth = total_buy_within_depth + total_sell_within_depth
-
-        # Calculate percentages
-        buy_percentage  = (total_buy_within_depth / total_quantity_within_depth) * 100 if total_quantity_within_depth > 0 else 0
-        sell_percentage = (total_sell_within_depth / total_quantity_within_depth) * 100 if total_quantity_within_depth > 0 else 0
-
-        # Output the stdout
-        if debug_1:        
-            defs.announce("Orderbook")
-            print(f"Spot price        : {spot}")
-            print(f"Lower depth       : {spot - depth}")
-            print(f"Upper depth       : {spot + depth}\n")
-
-            print(f"Total Buy quantity : {total_buy_within_depth}")
-            print(f"Total Sell quantity: {total_sell_within_depth}")
-            print(f"Total quantity     : {total_quantity_within_depth}\n")
-
-            print(f"Buy within depth  : {buy_percentage:.2f} %")
-            print(f"Sell within depth : {sell_percentage:.2f} %")
-
-        # Announce message only if it changed and debug
-        if debug_2:
-            if (buy_percentage != orderbook_advice['buy_perc']) or (sell_percentage != orderbook_advice['sell_perc']):
-                message = f"Orderbook information (Buy / Sell | Depth): {buy_percentage:.2f} % / {sell_percentage:.2f} % | {depth} % "
-                defs.announce(message)
+            # Keep local orderbook up to date, load a new snapshot when an update was missed
+            if not self.orderbook_local.update(message):
+                defs.announce("Orderbook missed an update, loading new snapshot")
+                self.load_orderbook()
+
+            # Keep the advice until the book is in sync again
+            if not self.orderbook_local.synced:
+                return
+
+            # Calculate total buy and sell quantity within depth
+            total_buy_within_depth  = self.orderbook_local.depth('b', self.spot - depthN, self.spot)
+            total_sell_within_depth = self.orderbook_local.depth('a', self.spot, self.spot + depthN)
+
+            # Calculate total quantity (buy + sell)
+            total_quantity_within_depth = total_buy_within_depth + total_sell_within_depth
+
+            # Calculate percentages
+            buy_percentage  = (total_buy_within_depth / total_quantity_within_depth) * 100 if total_quantity_within_depth > 0 else 0
+            sell_percentage = (total_sell_within_depth / total_quantity_within_depth) * 100 if total_quantity_within_depth > 0 else 0
+
+            # Output the stdout
+            if debug_1:        
+                defs.announce("Orderbook")
+                print(f"Spot price        : {self.spot}")
+                print(f"Lower depth       : {self.spot - self.depth}")
+                print(f"Upper depth       : {self.spot + self.depth}\n")
+
+                print(f"Total Buy quantity : {total_buy_within_depth}")
+                print(f"Total Sell quantity: {total_sell_within_depth}")
+                print(f"Total quantity     : {total_quantity_within_depth}\n")
+
+                print(f"Buy within depth  : {buy_percentage:.2f} %")
+                print(f"Sell within depth : {sell_percentage:.2f} %")
+
+            # Announce message only if it changed and debug
+            if debug_2:
+                if (buy_percentage != self.orderbook_advice['buy_perc']) or (sell_percentage != self.orderbook_advice['sell_perc']):
+                    message = f"Orderbook information (Buy / Sell | Depth): {buy_percentage:.2f} % / {sell_percentage:.2f} % | {self.depth} % "
+                    defs.announce(message)
         
-        # Popup new depth data
-        depth_data['time'].append(defs.now_utc()[4])
-        depth_data['buy_perc'].append(buy_percentage)
-        depth_data['sell_perc'].append(sell_percentage)
-        if len(depth_data['time']) > use_orderbook['limit']:
-            depth_data['time'].pop(0)
-            depth_data['buy_perc'].pop(0)        
-            depth_data['sell_perc'].pop(0)
-
-        # Get average buy and sell percentage for timeframe
-        new_buy_percentage  = buy_percentage
-        new_sell_percentage = sell_percentage
-        if use_orderbook['average']:
-            result              = defs.average_depth(depth_data, use_orderbook, buy_percentage, sell_percentage)
-            new_buy_percentage  = result[0]
-            new_sell_percentage = result[1]
+            # Popup new depth data
+            self.depth_data['time'].append(clock.milliseconds())
+            self.depth_data['buy_perc'].append(buy_percentage)
+            self.depth_data['sell_perc'].append(sell_percentage)
+            if len(self.depth_data['time']) > self.use_orderbook['limit']:
+                self.depth_data['time'].pop(0)
+                self.depth_data['buy_perc'].pop(0)        
+                self.depth_data['sell_perc'].pop(0)
+
+            # Get average buy and sell percentage for timeframe
+            new_buy_percentage  = buy_percentage
+            new_sell_percentage = sell_percentage
+            if self.use_orderbook['average']:
+                result              = defs.average_depth(self.depth_data, self.use_orderbook, buy_percentage, sell_percentage)
+                new_buy_percentage  = result[0]
+                new_sell_percentage = result[1]
         
-        # Set orderbook_advice
-        orderbook_advice['buy_perc']  = new_buy_percentage
-        orderbook_advice['sell_perc'] = new_sell_percentage
-
-    # Report error
-    except Exception as e:
-        tb_info = traceback.extract_tb(e.__traceback__)
-        frame_summary = tb_info[-1]
-        line = frame_summary.lineno
-        defs.announce(f"*** Error: Failure at line {line}: {e} ***")
+            # Set orderbook_advice
+            self.orderbook_advice['buy_perc']  = new_buy_percentage
+            self.orderbook_advice['sell_perc'] = new_sell_percentage
+
+        # Report error
+        except Exception as e:
+            tb_info = traceback.extract_tb(e.__traceback__)
+            frame_summary = tb_info[-1]
+            line = frame_summary.lineno
+            defs.announce(f"*** Error: Failure at line {line}: {e} ***")
     
-    # Report execution time
-    if speed: defs.announce(defs.report_exec(stime))
-
-    # Close function
-    return
-
-# Handle messages to keep trades up to date
-def handle_trade(message):
+        # Report execution time
+        if speed: defs.announce(defs.report_exec(stime))
+
+        # Close function
+        return
+
+    # Load an orderbook snapshot on a thread of its own and hand it to the orderbook stream, deltas wait in the book
+    # meanwhile, right away when backtesting
+    def load_orderbook(self):
+        self.orderbook_local.loading = True
+        def load():
+            try:
+                return preload.get_orderbook(self.symbol, 200)
+            except Exception as e:
+                defs.announce(f"*** Warning: Loading orderbook snapshot failed: {e} ***")
+                return None
+        if self.context.worker.inline:
+            self.orderbook_local.update({'type': "resync", 'data': load()})
+            return
+        def run():
+            self.context.activate()
+            data = load()
+            if data is None:
+                sleep(5)
+            self.runtime.post('orderbook', {'type': "resync", 'data': data})
+        threading.Thread(target=run, name="orderbook", daemon=True).start()
+
+    # Handle messages to keep trades up to date
+    def handle_trade(self, message):
     
-    # Debug
-    debug_1 = False   # Show incoming trade
-    debug_2 = False   # Show datapoints
-    speed   = False
-    stime   = defs.now_utc()[4]
+        # Debug
+        debug_1 = False   # Show incoming trade
+        debug_2 = False   # Show datapoints
+        speed   = False
+        stime   = clock.monotonic()
    
-    # Errors are not reported within websocket
-    try:
+        # Errors are not reported within websocket
+        try:
 
-        # Declare some variables global
-        global trade_advice, trades
-        
-        # Initialize variables
-        result     = ()
-        datapoints = {}
-        compare    = {'time': [], 'side': [], 'size': [], 'price': []}
-
-        # Show incoming message
-        if debug_1: 
-            defs.announce("*** Incoming trade ***")
-            print(f"{message}\n")
+            # Initialize variables
+            result = ()
+
+            # Show incoming message
+            if debug_1: 
+                defs.announce("*** Incoming trade ***")
+                print(f"{message}\n")
                         
-        # Combine the trades
-        for trade in message['data']:
-            trades['time'].append(trade['T'])      # T: Timestamp
-            trades['side'].append(trade['S'])      # S: Side
-            trades['size'].append(trade['v'])      # v: Trade size
-            trades['price'].append(trade['p'])     # p: Trade price
+            # Add the trades, T: Timestamp, S: Side, p: Trade price, v: Trade size
+            for trade in message['data']:
+                self.trades.add(int(trade['T']), trade['S'], trade['p'], trade['v'])
     
-        # Limit number of trades
-        if len(trades['time']) > use_trade['limit']:
-            trades['time']  = trades['time'][-use_trade['limit']:]
-            trades['side']  = trades['side'][-use_trade['limit']:]
-            trades['size']  = trades['size'][-use_trade['limit']:]
-            trades['price'] = trades['price'][-use_trade['limit']:]
+            # Only keep trades of the timeframe
+            self.trades.evict()
     
-        # Number of trades to use for timeframe
-        number = defs.get_index_number(trades, use_trade['timeframe'], use_trade['limit'])
-        compare['time']  = trades['time'][-number:]
-        compare['side']  = trades['side'][-number:]
-        compare['size']  = trades['size'][-number:]
-        compare['price'] = trades['price'][-number:]        
-    
-        # Get trade_advice
-        result = defs.calculate_total_values(compare)        
-        trade_advice['buy_ratio']  = result[3]
-        trade_advice['sell_ratio'] = result[4]
-        
-        # Validate data
-        datapoints['trade']   = len(trades['time'])
-        datapoints['compare'] = len(compare['time'])
-        datapoints['limit']   = use_trade['limit']
-        if (datapoints['compare'] >= datapoints['trade']) and (datapoints['trade'] >= datapoints['limit']):
-            defs.announce("*** Warning: Increase trade_limit variable in config file! ***", True, 1)
+            # Get trade_advice
+            result = self.trades.totals()
+            self.trade_advice['buy_ratio']  = result[3]
+            self.trade_advice['sell_ratio'] = result[4]
         
-        # Debug
-        if debug_2:
-            message = f"There are {datapoints['trade']} / {datapoints['limit']} data points, "
-            message = message + f"using the last {datapoints['compare']} points and "
-            message = message + f"buy ratio is {trade_advice['buy_ratio']:.2f} %"
-            defs.announce(message)
+            # Debug
+            if debug_2:
+                message = f"There are {len(self.trades)} trades in the last {self.use_trade['timeframe']} ms and "
+                message = message + f"buy ratio is {self.trade_advice['buy_ratio']:.2f} %"
+                defs.announce(message)
     
-    # Report error
-    except Exception as e:
-        tb_info = traceback.extract_tb(e.__traceback__)
-        frame_summary = tb_info[-1]
-        line = frame_summary.lineno
-        defs.announce(f"*** Error: Failure at line {line}: {e} ***")
+        # Report error
+        except Exception as e:
+            tb_info = traceback.extract_tb(e.__traceback__)
+            frame_summary = tb_info[-1]
+            line = frame_summary.lineno
+            defs.announce(f"*** Error: Failure at line {line}: {e} ***")
        
-    # Report execution time
-    if speed: defs.announce(defs.report_exec(stime))
+        # Report execution time
+        if speed: defs.announce(defs.report_exec(stime))
 
-    # Close function
-    return
+        # Close function
+        return
 
-# Check if we can buy the based on signals
-def buy_matrix(spot, active_order, all_buys, interval):
+    # Buy matrix on a kline, an order flow
+    def buy_kline(self, interval):
+        self.active_order = yield from self.buy_matrix(self.spot, self.active_order, self.all_buys, interval)
+        return
 
-    # Declare some variables global
-    global indicators_advice, orderbook_advice, trade_advice, pricelimit_advice, info
-    
-    # Initialize variables
-    can_buy       = False
-    spread_advice = {}
-    result        = ()
-    speed         = False
-    stime         = defs.now_utc()[4]
+    # Check if we can buy the based on signals, an order flow
+    def buy_matrix(self, spot, active_order, all_buys, interval):
+
+        # Initialize variables
+        can_buy       = False
+        spread_advice = {}
+        result        = ()
+        speed         = False
+        stime         = clock.monotonic()
               
-    # Only initiate buy and do complex calculations when not already trailing
-    if not active_order['active']:
+        # Only initiate buy and do complex calculations when not already trailing
+        if not active_order['active']:
         
-        # Get buy advice
-        result            = defs.advice_buy(indicators_advice, orderbook_advice, trade_advice, pricelimit_advice, use_indicators, use_spread, use_orderbook, use_trade, use_pricelimit, spot, klines, all_buys, interval)
-        indicators_advice = result[0]
-        spread_advice     = result[1]
-        orderbook_advice  = result[2]
-        trade_advice      = result[3]
-        pricelimit_advice = result[4]
+            # Get buy advice
+            result                 = defs.advice_buy(self.indicators_advice, self.orderbook_advice, self.trade_advice, self.pricelimit_advice, self.use_indicators, self.use_spread, self.use_orderbook, self.use_trade, self.use_pricelimit, spot, self.klines, self.streams, all_buys, interval)
+            self.indicators_advice = result[0]
+            spread_advice          = result[1]
+            self.orderbook_advice  = result[2]
+            self.trade_advice      = result[3]
+            self.pricelimit_advice = result[4]
                     
-        # Get buy decission and report
-        result            = defs.decide_buy(indicators_advice, use_indicators, spread_advice, use_spread, orderbook_advice, use_orderbook, trade_advice, use_trade, pricelimit_advice, use_pricelimit, interval, intervals, info)
-        can_buy           = result[0]
-        message           = result[1]
-        indicators_advice = result[2]
-        defs.announce(message)
-
-        # Determine distance of trigger price and execute buy decission
-        if can_buy:
-            result       = orders.buy(symbol, spot, compounding, active_order, all_buys, prices, info)
-            active_order = result[0]
-            all_buys     = result[1]
-            info         = result[2]
+            # Get buy decission and report
+            result                 = defs.decide_buy(self.indicators_advice, self.use_indicators, spread_advice, self.use_spread, self.orderbook_advice, self.use_orderbook, self.trade_advice, self.use_trade, self.pricelimit_advice, self.use_pricelimit, interval, self.intervals, self.info)
+            can_buy                = result[0]
+            message                = result[1]
+            self.indicators_advice = result[2]
+            defs.announce(message)
+
+            # Determine distance of trigger price and execute buy decission
+            if can_buy:
+                result       = yield from orders.buy(self.symbol, spot, self.compounding, active_order, all_buys, self.prices, self.info)
+                active_order = result[0]
+                all_buys     = result[1]
+                self.info    = result[2]
     
-    # Report execution time
-    if speed: defs.announce(defs.report_exec(stime))
+        # Report execution time
+        if speed: defs.announce(defs.report_exec(stime))
 
-    # Return active_order
-    return active_order
+        # Return active_order
+        return active_order
 
-# Prechecks to see if we can start sunflow
-def prechecks():
-    
-    # Declare some variables global
-    global symbol
+    # Prechecks to see if we can start sunflow
+    def prechecks(self):
     
-    # Initialize variables
-    goahead = True
+        # Initialize variables
+        goahead = True
     
-    # Do checks
-    if intervals[3] != 0 and intervals[2] == 0:
-        goahead = False
-        defs.announce("Interval 2 must be set if you use interval 3 for confirmation!")
+        # Do checks
+        if self.intervals[3] != 0 and self.intervals[2] == 0:
+            goahead = False
+            defs.announce("Interval 2 must be set if you use interval 3 for confirmation!")
         
-    if not use_spread['enabled'] and not use_indicators['enabled']:
-        goahead = False
-        defs.announce("Need at least either Technical Indicators enabled or Spread to determine buy action!")
+        if not self.use_spread['enabled'] and not self.use_indicators['enabled']:
+            goahead = False
+            defs.announce("Need at least either Technical Indicators enabled or Spread to determine buy action!")
     
-    if compounding['enabled'] and not config.wallet_report:
-        goahead = False
-        defs.announce("When compounding set wallet_report to True to use compounding!")
+        if self.compounding['enabled'] and not self.config.wallet_report:
+            goahead = False
+            defs.announce("When compounding set wallet_report to True to use compounding!")
     
-    # Return result
-    return goahead
-
-
-### Start main program ###
-
-## Check if we can start
-if not prechecks():
-    defs.announce("*** NO START ***", True, 1)
-    exit()
-
-## Display welcome screen
-print("\n*************************")
-print("*** Sunflow Cryptobot ***")
-print("*************************\n")
-print(f"Symbol    : {symbol}")
-if use_indicators['enabled']:
-    print(f"Interval 1: {intervals[1]}m")
-    print(f"Interval 2: {intervals[2]}m")
-    print(f"Interval 3: {intervals[3]}m")
-if use_spread['enabled']:
-    print(f"Spread    : {use_spread['distance']} %")
-print(f"Profit    : {profit} %")
-print(f"Limit     : {limit}\n")
-
-
-## Preload all requirements
-print("\n*** Preloading ***\n")
-preload.check_files()
-if intervals[1] !=0  : klines[intervals[1]] = preload.get_klines(symbol, intervals[1], limit)
-if intervals[2] !=0  : klines[intervals[2]] = preload.get_klines(symbol, intervals[2], limit)
-if intervals[3] !=0  : klines[intervals[3]] = preload.get_klines(symbol, intervals[3], limit)
-ticker               = preload.get_ticker(symbol)
-spot                 = ticker['lastPrice']
-info                 = preload.get_info(symbol, spot, multiplier, compounding)
-all_buys             = database.load(config.dbase_file, info)
-all_buys             = preload.check_orders(all_buys, info)
-prices               = preload.get_prices(symbol, 1, 1000)
-
-# Preload optimizer and load prices
-if optimizer['enabled']:
-
-    # Get historical prices and combine with current prices
-    prices_old   = preload.get_prices(symbol, optimizer['interval'], 1000)
-    prices       = preload.combine_prices(prices_old, prices)
+        # Return result
+        return goahead
+
+    ### Start ###
+
+    # Check, welcome and preload, returns False when the bot can't start
+    def prepare(self):
+
+        # Modules use the context of this bot on this thread, output goes in order with the announcements
+        self.context.activate()
+        write = self.context.notifier.write
+
+        ## Check if we can start
+        if not self.prechecks():
+            defs.announce("*** NO START ***", True, 1)
+            return False
+
+        ## Display welcome screen
+        write("\n*************************")
+        write("*** Sunflow Cryptobot ***")
+        write("*************************\n")
+        write(f"Symbol    : {self.symbol}")
+        if self.use_indicators['enabled']:
+            write(f"Interval 1: {self.intervals[1]}m")
+            write(f"Interval 2: {self.intervals[2]}m")
+            write(f"Interval 3: {self.intervals[3]}m")
+        if self.use_spread['enabled']:
+            write(f"Spread    : {self.use_spread['distance']} %")
+        write(f"Profit    : {self.profit} %")
+        write(f"Limit     : {self.limit}\n")
+
+
+        ## Preload all requirements
+        write("\n*** Preloading ***\n")
+        if not self.simulation and self.config.http_warm:
+            warmed = self.context.session.warm(self.config.http_warm, self.config.http_keepalive)
+            if warmed:
+                defs.announce(f"Opened {self.config.http_warm} connections to the exchange in {warmed * 1000:.0f} ms")
+        preload.check_files()
+        if self.intervals[1] !=0  : self.klines[self.intervals[1]] = preload.get_klines(self.symbol, self.intervals[1], self.limit)
+        if self.intervals[2] !=0  : self.klines[self.intervals[2]] = preload.get_klines(self.symbol, self.intervals[2], self.limit)
+        if self.intervals[3] !=0  : self.klines[self.intervals[3]] = preload.get_klines(self.symbol, self.intervals[3], self.limit)
+        for interval in self.klines: self.streams[interval] = incremental.Indicators(self.klines[interval])
+        if self.simulation    : self.streams = backtest.reuse_indicators(self.simulation, self.streams, self.limit)
+        self.ticker   = preload.get_ticker(self.symbol)
+        self.spot     = self.ticker['lastPrice']
+        self.info     = preload.get_info(self.symbol, self.spot, self.multiplier, self.compounding)
+        self.all_buys = database.load(self.config.dbase_file, self.info)
+        database.compact(self.config.dbase_file, self.all_buys)
+        self.all_buys = preload.check_orders(self.all_buys, self.info)
+        self.prices   = preload.get_prices(self.symbol, 1, 1000)
+
+        # Preload optimizer and load prices
+        if self.optimizer['enabled']:
+
+            # Get historical prices from recorded market data or else from the exchange and combine with current prices
+            prices_old   = None
+            if self.record['enabled']:
+                prices_old = preload.get_recorded_prices(self.record['folder'], clock.milliseconds() - self.optimizer['limit_max'], self.optimizer['limit_min'])
+            if not prices_old:
+                prices_old = preload.get_prices(self.symbol, self.optimizer['interval'], 1000)
+            self.prices       = preload.combine_prices(prices_old, self.prices)
     
-    # Calulcate optimized data
-    result       = optimum.optimize(prices, profit, active_order, use_spread, optimizer)
-    profit       = result[0]
-    active_order = result[1]
-    use_spread   = result[2]
-    optimizer    = result[3]
-
-# Preload database inconsistencies
-if config.database_rebalance: 
-    all_buys = orders.rebalance(all_buys, info)
-
-# Preload wallet, quote and base currency to stdout
-if config.wallet_report:
-    compounding['now'] = orders.report_wallet(spot, all_buys, info)[0]
-
-# Preload compounding
-if compounding['enabled']:
-    info = defs.calc_compounding(info, spot, compounding)
-
-
-## Announce start
-print("\n*** Starting ***\n")
-if config.timeutc_std:
-    time_output = defs.now_utc()[0] + " UTC time"
-else:
-    time_output = defs.now_utc()[5] + " " + config.timezone_str + " time"
-defs.announce(f"Sunflow started at {time_output}", True, 1)
+            # Calulcate optimized data
+            result            = optimum.optimize(self.prices, self.profit, self.active_order, self.use_spread, self.optimizer)
+            self.profit       = result[0]
+            self.active_order = result[1]
+            self.use_spread   = result[2]
+            self.optimizer    = result[3]
+
+        # Start recording market data with its instrument info
+        if self.record['enabled']:
+            self.recording = recorder.Recorder(self.record['folder'], self.symbol, self.config.record_queue, self.config.record_flush)
+            self.recording.instrument(self.info)
+            self.recording.start()
+
+        # Preload database inconsistencies
+        if self.config.database_rebalance: 
+            self.all_buys = self.context.worker.complete(orders.rebalance(self.all_buys, self.info))
+
+        # Preload wallet, quote and base currency to stdout
+        if self.config.wallet_report:
+            self.compounding['now'] = orders.report_wallet(self.spot, self.all_buys, self.info)[0]
+
+        # Preload compounding
+        if self.compounding['enabled']:
+            self.info = defs.calc_compounding(self.info, self.spot, self.compounding)
+
+
+        ## Announce start
+        write("\n*** Starting ***\n")
+        if self.config.timeutc_std:
+            time_output = clock.utc() + " UTC time"
+        else:
+            time_output = clock.local(self.config.timezone_str) + " " + self.config.timezone_str + " time"
+        defs.announce(f"Sunflow started at {time_output}", True, 1)
+        return True
 
 
-### Tasks and pings ###
+    ### Tasks and pings ###
 
-# Run tasks periodically
-def periodic_tasks(current_time):
+    # Run tasks periodically
+    def periodic_tasks(self, current_time):
     
-    # Debug
-    debug = False
+        # Debug
+        debug = False
     
-    # Pass
-    pass
+        # Report ticker to amend latency, use of order cache, notifications, logs and waits for the rate limits
+        defs.announce(self.context.worker.report())
+        defs.announce(self.context.cache.report())
+        defs.announce(self.context.notifier.report())
+        defs.announce(logs.report())
+        if not self.simulation:
+            defs.announce(self.context.session.report())
+        if self.recording:
+            defs.announce(self.recording.report())
     
-    # Return
-    return
+        # Return
+        return
 
-# Run tasks periodically
-def ping_message(current_time):
+    # Run tasks periodically
+    def ping_message(self, current_time):
     
-    # Debug
-    debug = False
+        # Debug
+        debug = False
     
-    # Initialize variables
-    expire        = uptime_ping['expire']
-    delay_ping    = current_time - uptime_ping['time']
-    delay_tickers = current_time - uptime_ping['record']
+        # Initialize variables
+        expire        = self.uptime_ping['expire']
+        delay_ping    = current_time - self.uptime_ping['time']
+        delay_tickers = current_time - self.uptime_ping['record']
     
-    # Check for to little action
-    if delay_tickers > expire:
-        message = f"*** Error: Ping, last ticker update of {delay_tickers} ms ago is larger than {expire} ms maximum! ***"
-        defs.log_error(message)
-
-    # Output to stdout
-    if uptime_ping['enabled']:
-        if delay_ping == delay_tickers:
-            defs.announce(f"Ping, {delay_ping} ms since last message and ticker update")
-        else:
-            defs.announce(f"Ping, {delay_ping} ms since last message and last ticker update was {delay_tickers} ms ago")
+        # Check for to little action
+        if delay_tickers > expire:
+            message = f"*** Error: Ping, last ticker update of {delay_tickers} ms ago is larger than {expire} ms maximum! ***"
+            defs.log_error(message)
+
+        # Output to stdout
+        if self.uptime_ping['enabled']:
+            if delay_ping == delay_tickers:
+                defs.announce(f"Ping, {delay_ping} ms since last message and ticker update")
+            else:
+                defs.announce(f"Ping, {delay_ping} ms since last message and last ticker update was {delay_tickers} ms ago")
     
-    # Return
-    return
-
-### Websockets ###
-
-# Connect websocket
-def connect_websocket():
-    ws = WebSocket(testnet=False, channel_type="spot")
-    return ws
-
-# Continuously get tickers from websocket
-def subscribe_streams(ws):
+        # Return
+        return
+
+    # Report latency of the hot path and of the exchange endpoints, also on demand
+    def latency_report(self):
+        message = self.context.stages.report(f"Latency of {self.symbol}")
+        if not self.simulation:
+            message = message + "\n" + self.context.session.latency.report("Exchange latency by endpoint")
+        return message
+
+    # Register the metrics of the bot and its exchange session, and serve them when enabled, when several symbols run in
+    # one process every symbol is served by the first one that enabled it
+    def serve_metrics(self):
+        metrics.register(self.symbol, self.metrics)
+        metrics.register("session", self.context.session.metrics)
+        metrics.start(self.config.metrics_port, self.config.metrics_host, self.config.metrics_file, self.config.metrics_interval)
+
+    # Metric families of the bot, read from the counters it keeps anyway, runs on the thread of the request
+    def metrics(self):
+        self.context.activate()
+        symbol  = (self.symbol,)
+        worker  = self.context.worker
+        buys    = database.order_count(self.all_buys, self.info)
+        streams = {}
+        for name, stream in self.runtime.streams.items():
+            for state in ('handled', 'skipped', 'dropped'):
+                streams[(self.symbol, name, state)] = stream[state]
+        with worker.condition:
+            commands = {(self.symbol, name, result): count for (name, result), count in worker.counts.items()}
+            replaced = worker.replaced
+        sockets = {}
+        for name, ws in (("public", self.ws), ("private", self.ws_private)):
+            if ws is not None:
+                sockets[(self.symbol, name)] = ws.is_connected()
+        return [
+            metrics.simple("sunflow_messages_total", "counter", "Websocket messages by stream that were handled, skipped for a newer ticker or dropped when the queue was full", ("symbol", "stream", "state"), streams),
+            metrics.simple("sunflow_commands_total", "counter", "Order commands by name and result, amend_trigger are the trailing amends", ("symbol", "command", "result"), commands),
+            metrics.simple("sunflow_amends_replaced_total", "counter", "Trailing amends that were replaced by a newer trigger price before they were sent", ("symbol",), {symbol: replaced}),
+            metrics.simple("sunflow_open_buys", "gauge", "Buys in the database", ("symbol",), {symbol: buys[0]}),
+            metrics.simple("sunflow_open_buys_quantity", "gauge", "Base asset of the buys in the database", ("symbol",), {symbol: buys[1]}),
+            metrics.simple("sunflow_spot_price", "gauge", "Last price", ("symbol",), {symbol: self.spot}),
+            metrics.simple("sunflow_trailing", "gauge", "Trailing an order", ("symbol",), {symbol: self.active_order['active']}),
+            metrics.simple("sunflow_halted", "gauge", "Sunflow halted", ("symbol",), {symbol: self.context.halt_sunflow}),
+            metrics.simple("sunflow_websocket_connected", "gauge", "Websocket connected", ("symbol", "socket"), sockets),
+            metrics.simple("sunflow_websocket_reconnects_total", "counter", "Reconnects of the public websocket after the exchange connection was lost", ("symbol",), {symbol: self.reconnects}),
+            metrics.latencies("sunflow_latency_seconds", "Latency of the hot path by stage", [({'symbol': self.symbol, 'stage': name}, stats) for name, stats in self.context.stages.summary().items()])
+        ]
+
+    ### Websockets ###
+
+    # Callback of a stream, the message is recorded first when recording
+    def stream_callback(self, stream, name):
+        callback = self.runtime.callback(name)
+        if self.recording:
+            callback = self.recording.wrap(stream, callback)
+        return callback
+
+    # Connect websocket
+    def connect_websocket(self):
+        ws = WebSocket(testnet=False, channel_type="spot")
+        return ws
+
+    # Connect private websocket for orders, executions and wallet
+    def connect_private(self):
+        ws_private = WebSocket(testnet=False, channel_type="private", api_key=self.config.api_key, api_secret=self.config.api_secret)
+        ws_private.order_stream(callback=self.runtime.callback('private'))
+        ws_private.execution_stream(callback=self.runtime.callback('private'))
+        ws_private.wallet_stream(callback=self.runtime.callback('private'))
+        self.context.cache.live = True
+        return ws_private
+
+    # Continuously get tickers from websocket, messages are queued and handled by the runtime
+    def subscribe_streams(self, ws):
     
-    # Always stream ticker information
-    ws.ticker_stream(symbol=symbol, callback=handle_ticker)
-
-    # At request get klines from websocket
-    if ws_kline:
-        ws.kline_stream(interval=intervals[1], symbol=symbol, callback=handle_kline_1)
-        # Use second interval as confirmation
-        if intervals[2] != 0:
-            ws.kline_stream(interval=intervals[2], symbol=symbol, callback=handle_kline_2)
-        # Use third interval as confirmation
-        if intervals[3] != 0:
-            ws.kline_stream(interval=intervals[3], symbol=symbol, callback=handle_kline_3)
-
-    # At request get orderbook from websocket
-    if ws_orderbook:
-        ws.orderbook_stream(depth=200, symbol=symbol, callback=handle_orderbook)
+        # Always stream ticker information
+        ws.ticker_stream(symbol=self.symbol, callback=self.stream_callback('ticker', 'ticker'))
+
+        # At request get klines from websocket
+        if self.ws_kline:
+            ws.kline_stream(interval=self.intervals[1], symbol=self.symbol, callback=self.stream_callback('kline', 'kline_1'))
+            # Use second interval as confirmation
+            if self.intervals[2] != 0:
+                ws.kline_stream(interval=self.intervals[2], symbol=self.symbol, callback=self.stream_callback('kline', 'kline_2'))
+            # Use third interval as confirmation
+            if self.intervals[3] != 0:
+                ws.kline_stream(interval=self.intervals[3], symbol=self.symbol, callback=self.stream_callback('kline', 'kline_3'))
+
+        # At request get orderbook from websocket
+        if self.ws_orderbook:
+            ws.orderbook_stream(depth=200, symbol=self.symbol, callback=self.stream_callback('orderbook', 'orderbook'))
         
-    # At request get trades from websocket
-    if ws_trade:
-        ws.trade_stream(symbol=symbol, callback=handle_trade)
-
-# Fire ticker at least everysecond
-def simulated_ticker():
-    return {
-        'ts': defs.now_utc()[4],
-        'data': {
-            'lastPrice': str(spot),
-            'simulated': "True"
+        # At request get trades from websocket
+        if self.ws_trade:
+            ws.trade_stream(symbol=self.symbol, callback=self.stream_callback('trade', 'trade'))
+
+    # Register handlers, only the newest waiting ticker is handled, older ones only add their price
+    def register_streams(self):
+        self.runtime.stream('ticker', self.handle_ticker, coalesce=True, skip=self.record_ticker)
+        self.runtime.stream('kline_1', self.handle_kline_1)
+        self.runtime.stream('kline_2', self.handle_kline_2)
+        self.runtime.stream('kline_3', self.handle_kline_3)
+        self.runtime.stream('orderbook', self.handle_orderbook)
+        self.runtime.stream('trade', self.handle_trade)
+        self.runtime.stream('orders', self.handle_order)
+        self.runtime.stream('private', self.handle_private)
+        self.context.worker.post = self.runtime.callback('orders')
+
+    # Replay the same streams subscribe_streams() subscribes to
+    def replay_streams(self):
+
+        # Always replay ticker information
+        handlers = {'ticker': self.handle_ticker}
+
+        # Klines per interval, orderbook and trades
+        if self.ws_kline:
+            handlers[f"kline.{self.intervals[1]}"] = self.handle_kline_1
+            if self.intervals[2] != 0:
+                handlers[f"kline.{self.intervals[2]}"] = self.handle_kline_2
+            if self.intervals[3] != 0:
+                handlers[f"kline.{self.intervals[3]}"] = self.handle_kline_3
+        if self.ws_orderbook:
+            handlers['orderbook'] = self.handle_orderbook
+        if self.ws_trade:
+            handlers['trade'] = self.handle_trade
+
+        # Replay and report
+        result = backtest.run(self.simulation, handlers, self.handle_order)
+        backtest.report(result, self.info)
+        return result
+
+    # Fire ticker at least everysecond
+    def simulated_ticker(self):
+        return {
+            'ts': clock.milliseconds(),
+            'data': {
+                'lastPrice': str(self.spot),
+                'simulated': "True"
+            }
         }
-    }
 
-# Main
-def main():
-    ws = connect_websocket()
-    subscribe_streams(ws)
+    # Connect and subscribe, runs when the runtime has started
+    def start(self):
+        self.ws = self.connect_websocket()
+        self.subscribe_streams(self.ws)
+        if self.config.private_stream:
+            self.ws_private = self.connect_private()
 
-    while not defs.halt_sunflow:
-        try:
-            # Simulate or fetch the latest ticker message
-            current_time = defs.now_utc()[4]
-            simulated    = simulated_ticker()
+    # Simulated ticker, pings and periodic tasks, runs every second in between messages
+    def timers(self):
 
-            # Send simulate ticker message
-            if current_time - lock_ticker['time'] > lock_ticker['delay']:
-                handle_ticker(simulated)
+        try:
+            # Stop when requested
+            current_time = clock.milliseconds()
+            if self.context.halt_sunflow:
+                self.runtime.stop()
+                return
+
+            # Private websocket state, while it is disconnected the order cache is not used as it misses changes
+            if self.ws_private is not None:
+                connected = self.ws_private.is_connected()
+                if self.context.cache.live and not connected:
+                    self.context.cache.lost()
+                    defs.announce("*** Warning: Private websocket disconnected, orders are checked via the exchange until it is back! ***")
+                elif not self.context.cache.live and connected:
+                    self.context.cache.live = True
+
+            # Send simulated ticker message, queued behind real tickers
+            if current_time - self.lock_ticker['time'] > self.lock_ticker['delay']:
+                self.lock_ticker['time'] = current_time
+                self.runtime.post('ticker', self.simulated_ticker())
 
             # Uptime ping
-            if current_time - uptime_ping['time'] > uptime_ping['delay']:
-                ping_message(current_time)
-                uptime_ping['time'] = current_time
+            if current_time - self.uptime_ping['time'] > self.uptime_ping['delay']:
+                self.ping_message(current_time)
+                self.uptime_ping['time'] = current_time
+
+            # Latency report, also when tickers keep the uptime ping from firing
+            if self.config.latency_report and current_time - self.uptime_ping['latency'] > self.config.latency_report * 1000:
+                defs.announce(self.latency_report())
+                self.uptime_ping['latency'] = current_time
 
             # Periodic tasks
-            if current_time - periodic['time'] > periodic['delay']:
-                periodic_tasks(current_time)
-                periodic['time'] = current_time
+            if current_time - self.periodic['time'] > self.periodic['delay']:
+                self.periodic_tasks(current_time)
+                self.periodic['time'] = current_time
 
-            # Sleep to prevent CPU overloading
-            sleep(1)
         except (RemoteDisconnected, ProtocolError, ChunkedEncodingError) as e:
             exception = str(e)
             message   = f"Exchange connection lost. Reconnecting due to: {exception}"
             defs.announce(message, True, 1)
-            sleep(5)
-            ws = connect_websocket()
-            subscribe_streams(ws)
+            self.reconnects += 1
+            self.reconnect()
 
-# Start
-if __name__ == "__main__" and not defs.halt_sunflow:
-    main()
+    # Reconnect the public websocket after 5 s on a thread of its own, so messages and timers are not held up, the old
+    # websocket is closed first so its subscriptions do not feed the streams twice, multi.py replaces this when shared
+    def reconnect(self):
+        if self.reconnecting:
+            return
+        self.reconnecting = True
+        def run():
+            self.context.activate()
+            try:
+                sleep(5)
+                if self.ws is not None:
+                    self.ws.exit()
+                self.ws = self.connect_websocket()
+                self.subscribe_streams(self.ws)
+            except Exception as e:
+                defs.announce(f"*** Warning: Reconnecting websocket failed: {e} ***", True, 1)
+            finally:
+                self.reconnecting = False
+        threading.Thread(target=run, name="reconnect", daemon=True).start()
+
+    # Trade on live market data until stopped
+    def run(self):
+        self.context.activate()
+        self.register_streams()
+        self.serve_metrics()
+        self.runtime.every(1, self.timers)
+        self.runtime.run(self.start)
+        if self.recording:
+            self.recording.close()
+
+    # Trade, or replay recorded market data when backtesting
+    def trade(self):
+        self.context.activate()
+        if self.simulation:
+            return self.replay_streams()
+        self.run()
+
+    # Say goodbye
+    def goodbye(self):
+        self.context.activate()
+        defs.announce(self.context.worker.report())
+        defs.announce(self.latency_report())
+        if self.config.timeutc_std:
+            time_output = clock.utc() + " UTC time"
+        else:
+            time_output = clock.local(self.config.timezone_str) + " " + self.config.timezone_str + " time"
+        defs.announce(f"*** Sunflow terminated at {time_output} ***", True, 1)
+        self.context.notifier.flush()
+        logs.flush()
+
+
+### Start main program ###
+
+# Announce the latency reports of bots on a thread of their own, so it can be asked for with a signal
+def report_latency(bots):
+    def report():
+        for bot in bots:
+            bot.context.activate()
+            defs.announce(bot.latency_report())
+    threading.Thread(target=report, name="latency", daemon=True).start()
+
+# Sample all threads for seconds on a thread of their own, the first bot announces the profile, or prints it when it
+# is quiet like when backtesting
+def profile(bots, seconds):
+    config = bots[0].config
+    def done(message):
+        bots[0].context.activate()
+        if bots[0].context.quiet:
+            print(message)
+        else:
+            defs.announce(message)
+    def start():
+        bots[0].context.activate()
+        if profiler.sample(seconds, config.profile_interval, config.profile_folder, done):
+            defs.announce(f"Profiling all threads for {seconds} s")
+        else:
+            defs.announce("Profiler is running already")
+    threading.Thread(target=start, name="profile", daemon=True).start()
 
+# Report latency on demand with kill -USR2 {pid} and profile with kill -USR1 {pid}
+def on_demand(bots):
+    if hasattr(signal, 'SIGUSR2'):
+        signal.signal(signal.SIGUSR2, lambda signum, frame: report_latency(bots))
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: profile(bots, bots[0].config.profile_seconds))
 
-### Say goodbye ###
-if config.timeutc_std:
-    time_output = defs.now_utc()[0] + " UTC time"
-else:
-    time_output = defs.now_utc()[5] + " " + config.timezone_str + " time"
-defs.announce(f"*** Sunflow terminated at {time_output} ***", True, 1)
+# Parse command line arguments, load config and trade
+def main():
+
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description="Run the Sunflow Cryptobot with a specified config.")
+    parser.add_argument('-c', '--config', default='config.py', help='Specify the config file (with .py extension).')
+    parser.add_argument('-b', '--backtest', default='', help='Replay recorded market data from this file or folder against a simulated exchange.')
+    parser.add_argument('--profile', type=float, default=0, help='Sample all threads for this many seconds from the start.')
+    parser.add_argument('--cprofile', action='store_true', help='Run under cProfile, for example a backtest, and write the statistics to the profile folder.')
+    args = parser.parse_args()
+
+    # Resolve config file path
+    config_path = Path(args.config).resolve()
+    if not config_path.exists():
+        print(f"Config file not found at {config_path}, aborting...\n")
+        sys.exit()
+
+    # Create bot and check if we can start
+    bot = SunflowBot(loader.load_file(config_path), args.backtest)
+    if not bot.prepare():
+        sys.exit()
+
+    # Trade until stopped and say goodbye, profile when asked for
+    on_demand([bot])
+    if args.profile:
+        profile([bot], args.profile)
+    if not bot.context.halt_sunflow:
+        if args.cprofile:
+            print(profiler.deterministic(bot.trade, bot.config.profile_folder)[1])
+        else:
+            bot.trade()
+    bot.goodbye()
+
+# Start
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+### Sunflow Cryptobot ###
+#
+# Parameter sweep, runs many backtests of the same market data with different config values on all cores
+#
+# Use with or without config file, the search space is set in the config file:
+# python sweep.py --backtest data.parquet
+# python sweep.py -c {optional path/}your_config.py --backtest data.parquet
+
+
+### Initialize ###
+
+# Load external libraries
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import argparse, contextlib, importlib, io, itertools, json, multiprocessing, os, random, shutil, sys, types
+import pandas as pd
+
+# Load internal libraries, every run loads its own config
+import backtest, loader, marketdata, sunflow
+
+
+### Search space ###
+
+# All combinations of the values, ranges are not allowed
+def grid(space):
+    for key, values in space.items():
+        if not isinstance(values, list):
+            raise ValueError(f"Grid search needs a list of values for {key}, not {values}")
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*space.values())]
+
+# Value of a list or (minimum, maximum) range at fraction between 0 and 1, ranges of integers give integers
+def draw(values, fraction):
+    if isinstance(values, list):
+        return values[min(int(fraction * len(values)), len(values) - 1)]
+    low, high = values
+    value     = low + fraction * (high - low)
+    if isinstance(low, int) and isinstance(high, int):
+        return int(round(value))
+    return round(value, 6)
+
+# Random samples
+def random_search(space, samples, rng):
+    return [{key: draw(values, rng.random()) for key, values in space.items()} for _ in range(samples)]
+
+# Latin hypercube samples, every key is sampled once in each of the samples equal strata
+def latin_hypercube(space, samples, rng):
+    strata = {}
+    for key in space:
+        order       = list(range(samples))
+        rng.shuffle(order)
+        strata[key] = [(stratum + rng.random()) / samples for stratum in order]
+    return [{key: draw(values, strata[key][index]) for key, values in space.items()} for index in range(samples)]
+
+# Config values of a run, the config with the overrides
+def settings(config, overrides):
+    values = {key: getattr(config, key) for key in dir(config) if not key.startswith("__")}
+    values.update(overrides)
+    return types.SimpleNamespace(**values)
+
+# Intervals with klines in a run, like sunflow.py does
+def intervals(values):
+    if not values.indicators_enabled:
+        return []
+    return [interval for interval in (values.interval_1, values.interval_2, values.interval_3) if interval != 0]
+
+
+### Work done by the processes ###
+
+# Calculate indicator values of klines that are replayed by more than one run
+def indicators(shared, symbol, interval, limit, start, push):
+    market      = marketdata.Market(marketdata.load(shared), symbol, push)
+    names, rows = market.indicators(interval, limit, start)
+    marketdata.save_indicators(marketdata.indicator_file(shared, interval, limit, start, push), names, rows)
+    return interval, limit, start, push
+
+# Run one backtest on its own bot, the config is the base config with the overrides at the end
+def run(number, overrides, config_file, shared, folder):
+
+    # Write config of this run
+    name   = f"sweep_{number:05d}"
+    config = os.path.join(folder, name + ".py")
+    output = os.path.join(folder, name) + os.sep
+    with open(config_file, 'r', encoding='utf-8') as file:
+        text = file.read()
+    with open(config, 'w', encoding='utf-8') as file:
+        file.write(text + "\n\n# Parameter sweep\n")
+        for key, value in overrides.items():
+            file.write(f"{key} = {value!r}\n")
+        file.write(f"backtest_folder = {output!r}\n")
+
+    # Run Sunflow in backtest mode, quietly
+    result = {'run': number, **overrides}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            bot = sunflow.SunflowBot(loader.load_file(config), shared)
+            if not bot.prepare():
+                raise ValueError("Config can't start")
+            bot.trade()
+        with open(os.path.join(output, "results.json"), 'r', encoding='utf-8') as file:
+            result.update(json.load(file))
+    except (Exception, SystemExit) as e:
+        result['error'] = str(e) or type(e).__name__
+
+    # Return result
+    return result
+
+
+### Sweep ###
+
+# File that marks a folder as made by a sweep, only such a folder or an empty one is emptied before a sweep
+marker = ".sweep"
+
+# Empty the folder of an earlier sweep and mark it, returns False when the folder holds something else
+def prepare_folder(folder):
+    if os.path.isdir(folder) and os.listdir(folder):
+        if not os.path.isfile(os.path.join(folder, marker)):
+            return False
+        shutil.rmtree(folder)
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, marker), 'w', encoding='utf-8'):
+        pass
+    return True
+
+# Run sweep
+def main():
+
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description="Run a parameter sweep of backtests with a specified config.")
+    parser.add_argument('-c', '--config', default='config.py', help='Specify the config file (with .py extension).')
+    parser.add_argument('-b', '--backtest', required=True, help='Recorded market data file or folder to replay.')
+    args = parser.parse_args()
+
+    # Resolve config file path
+    config_path = Path(args.config).resolve()
+    if not config_path.exists():
+        print(f"Config file not found at {config_path}, aborting...\n")
+        sys.exit()
+
+    # Dynamically load the config module
+    sys.path.append(str(config_path.parent))
+    config = loader.defaults(importlib.import_module(config_path.stem))
+
+    # Initialize variables
+    rng     = random.Random(config.sweep_seed)
+    workers = config.sweep_workers or os.cpu_count()
+    folder  = os.path.abspath(config.sweep_folder)
+    shared  = os.path.join(folder, "market")
+
+    # Runs to do
+    if config.sweep_search == "grid":
+        runs = grid(config.sweep_space)
+    elif config.sweep_search == "random":
+        runs = random_search(config.sweep_space, config.sweep_samples, rng)
+    elif config.sweep_search == "lhs":
+        runs = latin_hypercube(config.sweep_space, config.sweep_samples, rng)
+    else:
+        raise ValueError(f"Unknown sweep_search {config.sweep_search}, use grid, random or lhs")
+
+    # Store market data once, all processes memory map the same files
+    if not prepare_folder(folder):
+        print(f"Sweep folder {folder} is not empty and not made by a sweep, set sweep_folder to a new folder, aborting...\n")
+        sys.exit()
+    data = marketdata.load(args.backtest)
+    info = marketdata.instrument(args.backtest) if os.path.isdir(args.backtest) else None
+    marketdata.save(data, shared, info)
+    first, last = int(data['ticker']['time'][0]), int(data['ticker']['time'][-1])
+    del data
+    print(f"Sweep of {len(runs)} backtests with {config.sweep_search} search on {workers} processes, market data in {shared}\n")
+
+    # Klines replayed by more than one run get their indicator values calculated once
+    replays = {}
+    for overrides in runs:
+        values = settings(config, overrides)
+        start  = first + backtest.warmup(values)
+        for interval in intervals(values):
+            key          = (interval, values.limit, start, values.backtest_push)
+            replays[key] = replays.get(key, 0) + 1
+    shared_replays = [key for key, count in replays.items() if count > 1 and key[2] < last]
+
+    # Every run has its own bot, so a process runs one backtest after the other and loads the libraries only once
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+
+        # Indicators first
+        futures = [executor.submit(indicators, shared, config.symbol, *key) for key in shared_replays]
+        for future in as_completed(futures):
+            interval, limit, start, push = future.result()
+            print(f"Calculated indicators of {interval}m klines with limit {limit} for all runs that share them")
+
+        # Backtests
+        results = []
+        futures = [executor.submit(run, number, overrides, str(config_path), shared, folder) for number, overrides in enumerate(runs, 1)]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if 'error' in result:
+                print(f"Run {result['run']} of {len(runs)} failed: {result['error']}")
+            else:
+                print(f"Run {result['run']} of {len(runs)} done in {result['seconds']:.0f} s, revenue {result['revenue']:.6f}")
+
+    # Rank by revenue
+    table = pd.DataFrame(results)
+    for column in ('revenue', 'buys', 'sells', 'exposure', 'drawdown', 'equity', 'fees', 'seconds', 'error'):
+        if column not in table:
+            table[column] = None
+    table = table[['run', *config.sweep_space, 'revenue', 'buys', 'sells', 'exposure', 'drawdown', 'equity', 'fees', 'seconds', 'error']]
+    table = table.sort_values('revenue', ascending=False, na_position='last').reset_index(drop=True)
+    table.index = table.index + 1
+    table.index.name = 'rank'
+    table.to_csv(config.sweep_file)
+
+    # Report
+    print(f"\n*** Best runs of {len(runs)}, all results in {config.sweep_file} ***\n")
+    print(table.head(10).drop(columns=['error']).to_string())
+
+# Start
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+### Sunflow Cryptobot ###
+#
+# Test the running state of the incremental indicators against straightforward calculations over all values
+#
+# Run with:
+# python -m pytest test_incremental.py
+
+# Load libraries
+import math, random
+import incremental
+
+# Settings
+tolerance  = 1e-9       # Relative difference allowed, absolute for values below 1
+values     = 80         # Committed values per test
+updates    = 3          # Provisional values before every committed one
+seed       = 7          # Random walk of the values
+
+# Are two values the same within tolerance, missing values only match missing values
+def same(value, reference):
+    if math.isnan(reference) or math.isnan(value):
+        return math.isnan(reference) and math.isnan(value)
+    return abs(value - reference) / max(1, abs(reference)) <= tolerance
+
+# Wilder smoothing over all values, weights decay over missing values too and length values are needed
+def rma(history, length):
+    decay = 1 - (1 / length)
+    valid = [(index, value) for index, value in enumerate(history) if not math.isnan(value)]
+    if len(valid) < length:
+        return math.nan
+    last = len(history) - 1
+    return sum(decay ** (last - index) * value for index, value in valid) / sum(decay ** (last - index) for index, _ in valid)
+
+# Exponential moving average seeded with the average of the first length values, leading missing values are skipped
+def ema(history, length):
+    history = [value for value in history if not math.isnan(value)]
+    if len(history) < length:
+        return math.nan
+    alpha = 2 / (length + 1)
+    value = sum(history[:length]) / length
+    for x in history[length:]:
+        value = alpha * x + (1 - alpha) * value
+    return value
+
+# Window of the last length values, None when it is not complete or has a missing value
+def window(history, length):
+    last = history[-length:]
+    if len(last) < length or any(math.isnan(value) for value in last):
+        return None
+    return last
+
+# Feed a random walk, every value is first sent a few times as provisional value and then committed. Check gets the
+# provisional or committed value, all values up to it and commit, and returns pairs of a value and its reference.
+def walk(check, leading=0):
+    generator = random.Random(seed)
+    history   = [math.nan] * leading
+    price     = 100.0
+    for _ in range(values):
+        for update in range(updates + 1):
+            price  = price * (1 + generator.gauss(0, 0.01))
+            commit = update == updates
+            for value, reference in check(price, history + [price], commit):
+                assert same(value, reference), f"{value} instead of {reference} after {len(history)} values, {'committed' if commit else 'provisional'}"
+        history.append(price)
+
+# Wilder smoothing, after a leading missing value like the first change of RSI
+def test_rma():
+    state = incremental.Rma(14)
+    state.step(math.nan, True)
+    walk(lambda x, history, commit: [(state.step(x, commit), rma(history, 14))], leading=1)
+
+# Exponential moving average, after a leading missing value like the signal line of MACD
+def test_ema():
+    state = incremental.Ema(9)
+    state.step(math.nan, True)
+    walk(lambda x, history, commit: [(state.step(x, commit), ema(history, 9))], leading=1)
+
+# Exponential moving average over the last window values only, long enough to slide and rebuild several times
+def test_window_ema():
+    state = incremental.WindowEma(5, 12)
+    walk(lambda x, history, commit: [(state.step(x, commit), ema(history[-12:], 5) if len(history) >= 12 else math.nan)])
+
+# Sum, average, maximum and minimum of a window including the provisional value, stored when committed
+def test_window():
+    state = incremental.Window(10)
+    def check(x, history, commit):
+        last      = window(history, 10) or [math.nan] * 10
+        result    = [state.sum(x), state.mean(x), state.max(x), state.min(x)]
+        reference = [sum(last), sum(last) / 10, max(last), min(last)]
+        if commit:
+            state.push(x)
+        return zip(result, reference)
+    walk(check)
+
+# A missing value in the window makes it invalid until it has left the window
+def test_window_missing():
+    state   = incremental.Window(3)
+    history = [1.0, math.nan, 2.0, 3.0, 4.0]
+    for index, x in enumerate(history):
+        last = window(history[:index + 1], 3)
+        assert same(state.sum(x), sum(last) if last else math.nan)
+        state.push(x)
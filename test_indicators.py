@@ -0,0 +1,95 @@
+### Sunflow Cryptobot ###
+#
+# Test that the incremental indicators give the same values and advice as pandas_ta
+#
+# Run with:
+# python -m pytest test_indicators.py
+
+# Load libraries
+import math, random, shutil
+from pathlib import Path
+import pytest
+
+# The reference is pandas_ta, without it there is nothing to compare to
+pytest.importorskip("pandas_ta")
+import buffers, context, defs, incremental, indicators, loader
+
+# Settings
+tolerance  = 1e-6       # Relative difference allowed, absolute for values below 1
+intervals  = 40         # Kline intervals to stream after the preload
+updates    = 5          # Unconfirmed klines per interval before it is confirmed
+seed       = 42         # Random walk of the klines
+
+# Context with the example config, calculate() records its latency in the context of the thread
+@pytest.fixture(scope="module")
+def bot(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("config")
+    shutil.copy(Path(__file__).parent / "config.py.txt", folder / "config.py")
+    bot = context.BotContext(loader.load_file(folder / "config.py"))
+    bot.quiet = True
+    bot.activate()
+    yield bot
+    del context.local.context
+
+# Kline of interval with a price
+def kline(index, price, spread):
+    return {'time': index * 60000, 'open': price, 'high': price + spread, 'low': price - spread, 'close': price, 'volume': 1000.0, 'turnover': 1000.0 * price}
+
+# Klines as the exchange sends them, a random walk with every interval updated a few times and then confirmed
+def messages(generator, start):
+    price = 1.0
+    for index in range(start, start + intervals):
+        for update in range(updates + 1):
+            price = price * (1 + generator.gauss(0, 0.002))
+            yield kline(index, price, price * generator.uniform(0, 0.003)), update == updates
+
+# Are two indicator values the same within tolerance, missing values only match missing values
+def same(value, reference):
+    if math.isnan(reference) or math.isnan(value):
+        return math.isnan(reference) and math.isnan(value)
+    return abs(value - reference) / max(1, abs(reference)) <= tolerance
+
+# Values of an advice entry, a single value or a set of them
+def numbers(entry):
+    return sorted(entry) if isinstance(entry, set) else [entry]
+
+# Compare the indicators and the advice of the running state with pandas_ta on the same klines
+def check(klines, stream, spot, moment):
+    values    = stream.values()
+    reference = indicators.calculate_pandas(klines)
+    for key, value in reference.items():
+        assert same(values[key], value), f"{key} is {values[key]} instead of {value} at {moment}"
+    advice   = indicators.calculate(klines, spot, stream)
+    expected = indicators.calculate(klines, spot)
+    assert advice.keys() == expected.keys()
+    for key, entry in expected.items():
+        assert advice[key][1:] == entry[1:], f"Advice of {key} is {advice[key][1]} instead of {entry[1]} at {moment}"
+        assert all(same(value, reference) for value, reference in zip(numbers(advice[key][0]), numbers(entry[0]))), f"{key} is {advice[key][0]} instead of {entry[0]} at {moment}"
+
+# Stream confirmed and provisional klines like the kline handler does and compare after every message
+def test_incremental_matches_pandas_ta(bot):
+
+    # Preload the klines, the last one is provisional
+    generator = random.Random(seed)
+    limit     = bot.config.limit
+    klines    = buffers.KlineBuffer(limit)
+    price     = 1.0
+    for index in range(limit):
+        price = price * (1 + generator.gauss(0, 0.002))
+        klines.append(kline(index, price, price * generator.uniform(0, 0.003)))
+    stream = incremental.Indicators(klines)
+    check(klines, stream, price, "preload")
+
+    # Stream messages, also on the provisional kline right after a confirmed one
+    confirmed = provisional = 0
+    for message, confirm in messages(generator, limit):
+        if confirm:
+            klines     = defs.new_kline(message, klines, stream)
+            confirmed += 1
+        else:
+            klines       = defs.update_kline(message, klines, stream)
+            provisional += 1
+        check(klines, stream, message['close'], f"{'confirmed' if confirm else 'provisional'} kline {message['time']}")
+
+    # Both kinds were compared
+    assert confirmed == intervals and provisional == intervals * updates
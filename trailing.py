@@ -3,37 +3,22 @@
 # Traling buy and sell
 
 # Load libraries
-from loader import load_config
-from pybit.unified_trading import HTTP
-import database, defs, distance, orders, pprint, threading
-
-# Load config
-config = load_config()
-
-# Connect to exchange
-session = HTTP(
-    testnet                 = False,
-    api_key                 = config.api_key,
-    api_secret              = config.api_secret,
-    return_response_headers = True
-)
-
-# Initialize stuck variable
-stuck             = {}
-stuck['check']    = True
-stuck['time']     = defs.now_utc()[4]
-stuck['interval'] = 20000
+import clock, context, database, defs, distance, execution, orders, pprint, threading
+
+# Config and exchange session of the bot
+config  = context.config
+session = context.session
    
-# Check if we can do trailing buy or sell
+# Check if we can do trailing buy or sell, an order flow, see execution.py
 def check_order(symbol, spot, compounding, active_order, all_buys, all_sells, info):
 
     # Debug and speed
     debug = False
     speed = False
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
     
-    # Declare stuck variable global
-    global stuck
+    # Stuck order check is kept in the context of the bot
+    stuck = context.current().stuck
     
     # Initialize variables
     result         = ()
@@ -50,14 +35,22 @@ def check_order(symbol, spot, compounding, active_order, all_buys, all_sells, in
             type_check     = "a regular"
             do_check_order = True
 
-    # Check every interval, sometimes orders get stuck
-    current_time = defs.now_utc()[4]
+    # Private websocket reported that the order is filled
+    if context.cache.status(active_order['orderid']) == "Filled":
+        type_check     = "a reported"
+        do_check_order = True
+
+    # Check every interval, sometimes orders get stuck, this safety net always asks the exchange
+    current_time = clock.milliseconds()
+    interval     = stuck['live'] if context.cache.live else stuck['interval']
+    safety_net   = False
     if stuck['check']:
         stuck['check'] = False
-        stuck['time']  = defs.now_utc()[4]
-    if current_time - stuck['time'] > stuck['interval']:
+        stuck['time']  = clock.milliseconds()
+    if current_time - stuck['time'] > interval:
         type_check = "an additional"
         do_check_order = True
+        safety_net     = True
 
     # Current price crossed trigger price
     if do_check_order:
@@ -68,22 +61,24 @@ def check_order(symbol, spot, compounding, active_order, all_buys, all_sells, in
         # Reset stuck
         stuck['check'] = True
         
-        # Has trailing endend, check if order does still exist
-        order   = {}
-        message = defs.announce("session: get_open_orders")
-        try:
-            order = session.get_open_orders(
-                category = "spot",
-                symbol   = symbol,
-                orderID  = str(active_order['orderid'])
-            )
-        except Exception as e:
-            defs.log_error(e)
-
-        # Check API rate limit and log data if possible
-        if order:
-            order = defs.rate_limit(order)
-            defs.log_exchange(order, message)
+        # Has trailing endend, check if order does still exist, first from the private websocket
+        order = None if safety_net else context.cache.order(active_order['orderid'])
+        if not order:
+            message = defs.announce("session: get_open_orders")
+            try:
+                order = yield from execution.request("query", session.get_open_orders,
+                    category = "spot",
+                    symbol   = symbol,
+                    orderID  = str(active_order['orderid'])
+                )
+            except Exception as e:
+                defs.log_error(e)
+
+            # Check API rate limit and log data if possible
+            if order:
+                order = defs.rate_limit(order)
+                defs.log_exchange(order, message)
+                context.cache.store_orders(order)
 
         # Check if trailing order is filled, if so reset counters and close trailing process
         if order['result']['list'] == [] or order['result']['list'][0]['orderStatus'] == "Filled":  # *** CHECK *** Odd behavior from exchange, sometimes the realtime table is not cleared
@@ -100,7 +95,7 @@ def check_order(symbol, spot, compounding, active_order, all_buys, all_sells, in
             message_1 = message_1 + f"at trigger price {defs.format_number(active_order['trigger'], info['tickSize'])} {info['quoteCoin']}"
             
             # Close trailing process
-            result       = close_trail(active_order, all_buys, all_sells, spot, info)
+            result       = yield from close_trail(active_order, all_buys, all_sells, spot, info)
             active_order = result[0]
             all_buys     = result[1]
             all_sells    = result[2]
@@ -121,13 +116,17 @@ def check_order(symbol, spot, compounding, active_order, all_buys, all_sells, in
             # Send message to group 1
             defs.announce(message_1, True, 1)
 
-            # Report wallet, quote and base currency to stdout and adjust compounding (task)
+            # Report wallet, quote and base currency to stdout and adjust compounding (task), in the context of this bot
+            bot = context.current()
             def report_wallet_task():
+                bot.activate()
                 compounding['now'] = orders.report_wallet(spot, all_buys, info)[0]
             
-            # Report wallet, quote and base currency to stdout and adjust compounding (threat)
-            if config.wallet_report:
-                wallet_thread = threading.Thread(target=report_wallet_task)
+            # Report wallet, quote and base currency to stdout and adjust compounding (threat), right away when backtesting
+            if config.wallet_report and context.worker.inline:
+                report_wallet_task()
+            elif config.wallet_report:
+                wallet_thread = threading.Thread(target=report_wallet_task, name="wallet")
                 wallet_thread.start()
                             
             # Report compounding, only possible when wallet reporting is active, see config file
@@ -140,7 +139,7 @@ def check_order(symbol, spot, compounding, active_order, all_buys, all_sells, in
             
         # Check if symbol is spiking
         else:
-            result       = check_spike(symbol, spot, active_order, order, all_buys, info)
+            result       = yield from check_spike(symbol, spot, active_order, order, all_buys, info)
             active_order = result[0]
             all_buys     = result[1]
 
@@ -150,13 +149,13 @@ def check_order(symbol, spot, compounding, active_order, all_buys, all_sells, in
     # Return modified data
     return active_order, all_buys, compounding, info
 
-# Checks if the trailing error spiked
+# Checks if the trailing error spiked, an order flow
 def check_spike(symbol, spot, active_order, order, all_buys, info):
 
     # Debug and speed
     debug = False
     speed = True
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
 
     # Initialize variables
     error_code = 0
@@ -171,9 +170,9 @@ def check_spike(symbol, spot, active_order, order, all_buys, info):
             # Reset trailing sell
             active_order['active'] = False
             # Remove order from exchange
-            orders.cancel(symbol, active_order['orderid'])
+            yield from orders.cancel(symbol, active_order['orderid'])
             # Rebalance to be safe
-            all_buys = orders.rebalance(all_buys, info)
+            all_buys = yield from orders.rebalance(all_buys, info)
 
     else:
 
@@ -185,9 +184,9 @@ def check_spike(symbol, spot, active_order, order, all_buys, info):
             # Remove order from all buys
             all_buys = database.remove(active_order['orderid'], all_buys, info)
             # Remove order from exchange
-            orders.cancel(symbol, active_order['orderid'])
+            yield from orders.cancel(symbol, active_order['orderid'])
             # Rebalance to be safe
-            all_buys = orders.rebalance(all_buys, info)
+            all_buys = yield from orders.rebalance(all_buys, info)
     
     if error_code == 1:
         defs.announce(f"Although order {active_order['orderid']} spiked, this order was not found at the exchange", True, 1)
@@ -204,7 +203,7 @@ def calculate_revenue(transaction, all_sells, spot, info):
     # Debug and speed
     debug = False
     speed = True
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
     
     # Initialize variables
     sells         = 0
@@ -236,13 +235,13 @@ def calculate_revenue(transaction, all_sells, spot, info):
     # Return revenue
     return revenue
     
-# Trailing order does not exist anymore, close it
+# Trailing order does not exist anymore, close it, an order flow
 def close_trail(active_order, all_buys, all_sells, spot, info):
 
     # Debug and speed
     debug = False
     speed = True
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
     
     # Initialize variables
     revenue = 0
@@ -251,7 +250,7 @@ def close_trail(active_order, all_buys, all_sells, spot, info):
     active_order['active'] = False
     
     # Close the transaction on either buy or sell trailing order
-    transaction = orders.transaction_from_id(active_order['orderid'])
+    transaction = yield from orders.transaction_from_id(active_order['orderid'])
     transaction['status'] = "Closed"
     if debug:
         defs.announce(f"{active_order['side']} order")
@@ -282,7 +281,7 @@ def close_trail(active_order, all_buys, all_sells, spot, info):
 
     # Rebalance new database
     if config.database_rebalance:
-        all_buys = orders.rebalance(all_buys, info)
+        all_buys = yield from orders.rebalance(all_buys, info)
 
     # Output to stdout
     defs.announce(f"Closed trailing {active_order['side'].lower()} order")
@@ -293,25 +292,24 @@ def close_trail(active_order, all_buys, all_sells, spot, info):
     # Return modified data
     return active_order, all_buys, all_sells, transaction, revenue
 
-# Trailing buy or sell
+# Trailing buy or sell, an order flow
 def trail(symbol, spot, compounding, active_order, info, all_buys, all_sells, prices):
 
     # Debug and speed
     debug = False
     speed = False
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
     
     # Initialize variables
     result   = ()
     do_amend = False
-    do_check = False
 
     # Output trailing to stdout
     if debug:
         defs.announce(f"Trailing {active_order['side']}: Checking if we can do trailing")
 
     # Check if the order still exists
-    result       = check_order(symbol, spot, compounding, active_order, all_buys, all_sells, info)
+    result       = yield from check_order(symbol, spot, compounding, active_order, all_buys, all_sells, info)
     active_order = result[0]
     all_buys     = result[1]
     compounding  = result[2]
@@ -332,27 +330,17 @@ def trail(symbol, spot, compounding, active_order, info, all_buys, all_sells, pr
         else:
             active_order['trigger_new'] = defs.round_number(active_order['current'] * (1 + (active_order['fluctuation'] / 100)), info['tickSize'], "up")
 
-        # Check if we can amend trigger price
+        # Check if we can amend trigger price, compared to the last amend that was sent
         if active_order['side'] == "Sell":
-            if active_order['trigger_new'] > active_order['trigger']:
+            if active_order['trigger_new'] > active_order['trigger_amend']:
                 do_amend = True
         else:
-            if active_order['trigger_new'] < active_order['trigger']:
+            if active_order['trigger_new'] < active_order['trigger_amend']:
                 do_amend = True
 
-        # Amend trigger price
+        # Amend trigger price, the result is handled by atp_result()
         if do_amend:
-            result       = atp_helper(symbol, active_order, info)
-            active_order = result[0]
-            do_check     = result[1]
-            
-        # Double check the order
-        if do_check:
-            result       = check_order(symbol, spot, compounding, active_order, all_buys, all_sells, info)
-            active_order = result[0]
-            all_buys     = result[1]
-            compounding  = result[2]
-            info         = result[3]
+            active_order = atp_helper(symbol, active_order, info)
         
     # Report execution time
     if speed: defs.announce(defs.report_exec(stime))
@@ -360,7 +348,7 @@ def trail(symbol, spot, compounding, active_order, info, all_buys, all_sells, pr
     # Return modified data
     return active_order, all_buys, compounding, info
 
-# Change trigger price current trailing sell helper
+# Change trigger price current trailing sell helper, an order flow
 def aqs_helper(symbol, active_order, info, all_sells, all_sells_new):
 
     # Initialize variables
@@ -370,7 +358,7 @@ def aqs_helper(symbol, active_order, info, all_sells, all_sells_new):
     amend_error = ""
 
     # Amend order quantity
-    result      = amend_quantity_sell(symbol, active_order, info)
+    result      = yield from amend_quantity_sell(symbol, active_order, info)
     amend_code  = result[0]
     amend_error = result[1]
 
@@ -406,13 +394,13 @@ def aqs_helper(symbol, active_order, info, all_sells, all_sells_new):
     # Return data
     return active_order, all_sells, all_sells_new
 
-# Change the quantity of the current trailing sell
+# Change the quantity of the current trailing sell, an order flow
 def amend_quantity_sell(symbol, active_order, info):
 
     # Debug and speed
     debug = False
     speed = True
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
 
     # Initialize variables
     order      = {}
@@ -428,7 +416,7 @@ def amend_quantity_sell(symbol, active_order, info):
     order = {}
     message = defs.announce("session: amend_order")
     try:
-        order = session.amend_order(
+        order = yield from execution.request("amend_qty", session.amend_order,
             category = "spot",
             symbol   = symbol,
             orderId  = str(active_order['orderid']),
@@ -459,28 +447,48 @@ def amend_quantity_sell(symbol, active_order, info):
     # Return error code 
     return error_code, exception
 
-# Change quantity trailing sell helper
+# Change trigger price helper, the amend is sent by the order worker and only the latest amend is sent
 def atp_helper(symbol, active_order, info):
 
+    # Remember what was sent
+    active_order['trigger_amend'] = active_order['trigger_new']
+
+    # Amend trigger price with a copy of the order as it is now
+    key = (active_order['orderid'], "trigger")
+    context.worker.submit("amend_trigger", amend_trigger_price, symbol, dict(active_order), info, key=key)
+
+    # Return active_order
+    return active_order
+
+# Change trigger price helper, handles the result of the amend when the order worker is done
+def atp_result(active_order, info, command):
+
     # Initialize variables
-    debug      = False
-    result     = ()
-    amend_code = 0
-    amend_error = ""
+    debug       = False
+    amended     = command['args'][1]
+    amend_code  = 100
+    amend_error = command['error']
     do_check    = False
-    
-    # Amend trigger price
-    result      = amend_trigger_price(symbol, active_order, info)
-    amend_code  = result[0]
-    amend_error = result[1]
+
+    # The order was closed or replaced in the meantime
+    if not active_order['active'] or amended['orderid'] != active_order['orderid']:
+        return active_order, do_check
+
+    # Get result of amend
+    if command['error'] is None:
+        amend_code  = command['result'][0]
+        amend_error = command['result'][1]
 
     # Determine what to do based on error code of amend result
     if amend_code == 0:
         # Everything went fine, we can continue trailing
         message = f"Adjusted trigger price from {defs.format_number(active_order['trigger'], info['tickSize'])} to "
-        message = message + f"{defs.format_number(active_order['trigger_new'], info['tickSize'])} {info['quoteCoin']} in {active_order['side'].lower()} order"
+        message = message + f"{defs.format_number(amended['trigger_new'], info['tickSize'])} {info['quoteCoin']} in {active_order['side'].lower()} order"
         defs.announce(message, True, 0)
-        active_order['trigger'] = active_order['trigger_new']
+        active_order['trigger'] = amended['trigger_new']
+    else:
+        # Amend failed, next amend compares to the trigger price at the exchange again
+        active_order['trigger_amend'] = active_order['trigger']
 
     if amend_code == 1:
         # Order does not exist, trailing order sold or bought in between
@@ -506,7 +514,7 @@ def amend_trigger_price(symbol, active_order, info):
     # Debug and speed
     debug = False
     speed = True
-    stime = defs.now_utc()[4]
+    stime = clock.monotonic()
 
     # Initialize variables
     order      = {}
@@ -0,0 +1,339 @@
+### Sunflow Cryptobot ###
+#
+# Exchange session shared by all modules and all symbols in a process
+
+# Load external libraries
+from collections import deque
+from pybit.unified_trading import HTTP
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+import itertools, socket, threading, time
+
+# Load internal libraries
+import latency, metrics
+
+# Sessions by API key and exchange, so every module gets the same session and its connections
+sessions = {}
+lock     = threading.Lock()
+
+# Kind of every request, Bybit limits requests per kind of endpoint, so each kind has its own token bucket
+kinds = {
+    'cancel_order'        : 'trade',
+    'amend_order'         : 'trade',
+    'place_order'         : 'trade',
+    'get_open_orders'     : 'query',
+    'get_order_history'   : 'query',
+    'get_wallet_balance'  : 'account',
+    'get_tickers'         : 'market',
+    'get_kline'           : 'market',
+    'get_orderbook'       : 'market',
+    'get_instruments_info': 'market',
+    'get_server_time'     : 'market'
+}
+
+# Priority of every request, lower goes first, unknown requests go last
+priorities = {
+    'cancel_order'        : 0,
+    'amend_order'         : 0,
+    'place_order'         : 1,
+    'get_open_orders'     : 2,
+    'get_order_history'   : 2,
+    'get_tickers'         : 2,
+    'get_kline'           : 2,
+    'get_orderbook'       : 2,
+    'get_instruments_info': 2,
+    'get_server_time'     : 2,
+    'get_wallet_balance'  : 3
+}
+
+# Token bucket, holds up to burst tokens and gets rate tokens per second, 0 is no limit
+class Bucket:
+
+    # Initialize full bucket
+    def __init__(self, rate, burst=0):
+        self.rate   = rate
+        self.burst  = burst or max(rate, 1)
+        self.tokens = self.burst
+        self.time   = time.monotonic()
+        self.paused = 0.0
+
+    # Seconds until a token is available
+    def delay(self, now):
+        if now < self.paused:
+            return self.paused - now
+        if not self.rate:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.time) * self.rate)
+        self.time   = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    # Take a token
+    def take(self):
+        if self.rate:
+            self.tokens -= 1
+
+    # No tokens until moment, when the exchange reports the limit is used up
+    def pause(self, moment):
+        self.paused = max(self.paused, moment)
+        self.tokens = 0
+        self.time   = self.paused
+
+# HTTP session with proactive rate limits. A request needs a token of its kind and a token of the session, which
+# holds the limit of the API key. Requests that wait get the tokens in order of priority, so a cancel or amend never
+# waits behind a wallet report. A request waits on the thread that makes it, orders are made on the order worker
+# thread and the websocket threads never make requests. The same query made again while it is running gets the
+# result of the running one instead of a request of its own. When the exchange reports that the limit of a kind is
+# used up, the kind gets no tokens until the limit is reset.
+class Session:
+
+    # Initialize session, rate is the maximum number of requests per second, limits are the rates per kind
+    def __init__(self, http, rate, limits=None):
+        self.http      = http
+        self.bucket    = Bucket(rate)
+        self.buckets   = {kind: Bucket(limit) for kind, limit in (limits or {}).items()}
+        self.condition = threading.Condition()
+        self.waiting   = []
+        self.sequence  = itertools.count()
+        self.running   = {}
+        self.stats     = {}
+        self.coalesced = 0
+        self.calls     = {}
+        self.usage     = {}
+        self.last      = 0.0
+        self.warmed    = False
+        self.latency   = latency.Stages()             # Latency of every endpoint, retries included
+
+    # Statistics of kind
+    def kind_stats(self, kind):
+        if kind not in self.stats:
+            self.stats[kind] = {'requests': 0, 'waited': 0.0, 'depth': 0, 'max_depth': 0, 'waits': deque(maxlen=1000)}
+        return self.stats[kind]
+
+    # Bucket of kind
+    def kind_bucket(self, kind):
+        if kind not in self.buckets:
+            self.buckets[kind] = Bucket(0)
+        return self.buckets[kind]
+
+    # Wait until request of kind gets its tokens
+    def acquire(self, kind, priority):
+        with self.condition:
+
+            # Join the queue
+            start  = time.monotonic()
+            ticket = (priority, next(self.sequence), kind)
+            stats  = self.kind_stats(kind)
+            self.waiting.append(ticket)
+            stats['depth']    += 1
+            stats['max_depth'] = max(stats['max_depth'], stats['depth'])
+
+            # Go when no request before this one can go and both buckets have a token
+            while True:
+                now     = time.monotonic()
+                blocked = {}
+                for waiting in sorted(self.waiting):
+                    if waiting[2] not in blocked:
+                        blocked[waiting[2]] = self.kind_bucket(waiting[2]).delay(now)
+                    if waiting == ticket or not blocked[waiting[2]]:
+                        break
+                delay = max(self.kind_bucket(kind).delay(now), self.bucket.delay(now))
+                if waiting == ticket and not delay:
+                    break
+                self.condition.wait(delay or None)
+
+            # Take the tokens and leave the queue
+            self.waiting.remove(ticket)
+            self.kind_bucket(kind).take()
+            self.bucket.take()
+            waited             = time.monotonic() - start
+            stats['depth']    -= 1
+            stats['requests'] += 1
+            stats['waited']   += waited
+            stats['waits'].append(waited)
+            self.condition.notify_all()
+
+    # Use limit status the exchange sent with a response, and keep the part of the limit of the endpoint that is used
+    def feedback(self, name, kind, response):
+        try:
+            headers   = response[2]
+            remaining = int(headers['X-Bapi-Limit-Status'])
+            reset     = int(headers['X-Bapi-Limit-Reset-Timestamp'])
+            limit     = int(headers['X-Bapi-Limit'])
+        except (IndexError, KeyError, TypeError, ValueError):
+            return
+        if limit > 0:
+            self.usage[(name,)] = (limit - remaining) / limit
+        if remaining < 1:
+            with self.condition:
+                self.kind_bucket(kind).pause(time.monotonic() + max(reset / 1000 - time.time(), 0))
+                self.condition.notify_all()
+
+    # Make request, the same query that is running already gets its result
+    def request(self, name, function, *args, **kwargs):
+
+        # Queries that are running
+        key = None
+        if name.startswith("get_") and not args:
+            try:
+                key = (name, frozenset(kwargs.items()))
+                hash(key)
+            except TypeError:
+                key = None
+        if key is not None:
+            with self.condition:
+                running = self.running.get(key)
+                if running is None:
+                    self.running[key] = {'done': threading.Event(), 'result': None, 'error': None}
+                else:
+                    self.coalesced += 1
+            if running is not None:
+                running['done'].wait()
+                if running['error'] is not None:
+                    raise running['error']
+                return running['result']
+
+        # Make request
+        kind = kinds.get(name, 'other')
+        result, error = None, None
+        try:
+            self.acquire(kind, priorities.get(name, 4))
+            self.last = time.monotonic()
+            with self.latency.time(name):
+                result = function(*args, **kwargs)
+            self.feedback(name, kind, result)
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.count(name, result, error)
+            if key is not None:
+                with self.condition:
+                    running = self.running.pop(key)
+                running['result'] = result
+                running['error']  = error
+                running['done'].set()
+
+    # Count request by endpoint and return code, errors without a return code are counted by their type
+    def count(self, name, result, error):
+        if error is not None:
+            code = getattr(error, 'status_code', None) or type(error).__name__
+        else:
+            try:
+                code = result[0]['retCode']
+            except (IndexError, KeyError, TypeError):
+                code = "unknown"
+        with self.condition:
+            self.calls[(name, code)] = self.calls.get((name, code), 0) + 1
+
+    # Open connections at startup, so the first order does not wait for TCP and TLS handshakes, and when keepalive is
+    # set ping the exchange after that many idle seconds, so the connections are still open when an order comes
+    def warm(self, connections, keepalive=0):
+        with self.condition:
+            if self.warmed:
+                return 0.0
+            self.warmed = True
+        start   = time.monotonic()
+        threads = [threading.Thread(target=self.ping, name="warm") for _ in range(connections)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if keepalive:
+            threading.Thread(target=self.keep_alive, args=(keepalive,), name="keepalive", daemon=True).start()
+        return time.monotonic() - start
+
+    # Cheap request that opens or uses a connection, never coalesced so every ping gets its own connection
+    def ping(self):
+        try:
+            self.acquire('market', priorities['get_server_time'])
+            self.last = time.monotonic()
+            self.http.get_server_time()
+        except Exception:
+            pass
+
+    # Ping when the session was idle for keepalive seconds
+    def keep_alive(self, keepalive):
+        while True:
+            time.sleep(max(self.last + keepalive - time.monotonic(), 1))
+            if time.monotonic() - self.last >= keepalive:
+                self.ping()
+
+    # Requests go through the rate limits, other attributes are those of the pybit session
+    def __getattr__(self, name):
+        attribute = getattr(self.http, name)
+        if not callable(attribute):
+            return attribute
+        def request(*args, **kwargs):
+            return self.request(name, attribute, *args, **kwargs)
+        return request
+
+    # Metric families of the session
+    def metrics(self):
+        with self.condition:
+            calls = dict(self.calls)
+            usage = dict(self.usage)
+            waits = {(kind,): stats['waited'] for kind, stats in self.stats.items()}
+            depth = {(kind,): stats['depth'] for kind, stats in self.stats.items()}
+            saved = self.coalesced
+        return [
+            metrics.simple("sunflow_requests_total", "counter", "Requests to the exchange by endpoint and return code", ("endpoint", "code"), calls),
+            metrics.simple("sunflow_requests_coalesced_total", "counter", "Queries that got the result of the same query that was running", (), {(): saved}),
+            metrics.simple("sunflow_rate_limit_used_ratio", "gauge", "Part of the rate limit of the endpoint used, from X-Bapi-Limit-Status of the last response", ("endpoint",), usage),
+            metrics.simple("sunflow_rate_limit_wait_seconds_total", "counter", "Time requests waited for the rate limit by kind", ("kind",), waits),
+            metrics.simple("sunflow_rate_limit_queue", "gauge", "Requests waiting for the rate limit by kind", ("kind",), depth),
+            metrics.latencies("sunflow_exchange_latency_seconds", "Latency of the exchange by endpoint, retries included", [({'endpoint': name}, stats) for name, stats in self.latency.summary().items()])
+        ]
+
+    # Report use of session, wait times per kind
+    def report(self):
+        with self.condition:
+            total   = sum(stats['requests'] for stats in self.stats.values())
+            waited  = sum(stats['waited'] for stats in self.stats.values())
+            message = f"Exchange session made {total} requests, coalesced {self.coalesced} and waited {waited:.1f} s in total for the rate limits"
+            for kind, stats in sorted(self.stats.items()):
+                waits   = sorted(stats['waits']) or [0.0]
+                message = message + f"\n{kind}: {stats['requests']} requests, wait p50 {waits[len(waits) // 2] * 1000:.0f} ms, "
+                message = message + f"max {waits[-1] * 1000:.0f} ms, queue {stats['depth']} now and {stats['max_depth']} at most"
+        return message
+
+# Connection pool of the session. Connections stay open between requests, so the TCP and TLS handshakes are only
+# made once per connection, requests already shares one SSL context over all connections. TCP keepalive notices a
+# connection the exchange dropped. Failed connects are retried for every request, as nothing was sent yet, read
+# errors only for GET requests, so an order is never sent twice. Errors of the exchange are retried by pybit.
+def adapter(pool, retries):
+    retry = Retry(
+        total            = retries,
+        connect          = retries,
+        read             = retries,
+        status           = 0,
+        other            = 0,
+        allowed_methods  = frozenset({"GET"}),
+        backoff_factor   = 0.2,
+        raise_on_status  = False
+    )
+    options = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool, max_retries=retry)
+    adapter.init_poolmanager(1, pool, block=False, socket_options=options)
+    return adapter
+
+# Get the session of API key, created at first use, url is the simulated exchange or empty for Bybit, pool is the
+# number of connections kept open, timeout the seconds to connect and to wait for a response
+def session(api_key, api_secret, url="", rate=0, limits=None, pool=10, timeout=(3, 10), retries=2):
+    key = (api_key, api_secret, url)
+    with lock:
+        if key not in sessions:
+            http = HTTP(
+                testnet                 = False,
+                api_key                 = api_key,
+                api_secret              = api_secret,
+                return_response_headers = True,
+                timeout                 = timeout
+            )
+            if url:
+                http.endpoint = url
+            http.client.mount("https://", adapter(pool, retries))
+            http.client.mount("http://", adapter(pool, retries))
+            sessions[key] = Session(http, rate, limits)
+        return sessions[key]